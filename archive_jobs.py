@@ -0,0 +1,553 @@
+import ntpath
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+import storage
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import ArchiveBlob, ArchiveFileState, ArchiveJob, ArchiveJobFile, ArchiveJobStatus, ArchivePack
+from catalog import remove_path, scan_catalog
+from compression import choose_compression
+from netapp_btc import (
+    access_CIFS_share,
+    filter_files,
+    get_first_ip_address,
+    get_svm_data_volumes,
+    normalize_path,
+    scan_volume,
+)
+from netapp_interfaces import (
+    build_file_movement,
+    copy_to_archive,
+    delete_source,
+    finalize_archive,
+    find_duplicate_blob,
+    get_destination_path,
+    is_content_addressed,
+    locate_staged_copy,
+    store_archive_blob,
+    verify_archive_copy,
+)
+from placement import finish_placement, place_file
+from profiling import memory_stage, profiled_job_entry
+from snapshot_scan import sync_share_snapshot
+from restore_history import apply_restore_history, record_skipped
+from transfer_scheduler import BULK, prioritized
+from packing import ARCHIVE_PACK_MAX_FILE_SIZE, drop_pack_member, group_pack_members, remove_pack, verify_pack_member, write_pack
+from work_queue import SCAN_DIRECTORY, LeaseHeartbeat, enqueue_task
+
+
+RUNNER_ID = os.getenv("RUNNER_ID", f"{socket.gethostname()}-{os.getpid()}")
+# A job is claimed by one process at a time; the claim is renewed while it runs and
+# another process may take the job over once it has lapsed
+ARCHIVE_JOB_LEASE_SECONDS = int(os.getenv("ARCHIVE_JOB_LEASE_SECONDS", 120))
+
+
+def job_file_to_file_info(job_file: ArchiveJobFile):
+    return {
+        'full_path': job_file.full_path,
+        'creation_time': job_file.creation_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'last_access_time': job_file.last_access_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'last_modified_time': job_file.last_modified_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'file_size': job_file.file_size,
+    }
+
+
+def create_archive_job(db: Session, filters: dict, blacklist: list, share_name: str, source: str = "scan",
+                       pack_small_files: bool = False):
+    job = ArchiveJob(
+        share_name=share_name,
+        filters=filters,
+        blacklist=blacklist,
+        source=source,
+        pack_small_files=pack_small_files,
+        status=ArchiveJobStatus.scanning
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def add_job_candidates(db: Session, job_id: int, candidates: list):
+    job_files = [
+        ArchiveJobFile(
+            job_id=job_id,
+            full_path=normalize_path(file_info['full_path']),
+            creation_time=datetime.strptime(file_info['creation_time'], '%Y-%m-%d %H:%M:%S'),
+            last_access_time=datetime.strptime(file_info['last_access_time'], '%Y-%m-%d %H:%M:%S'),
+            last_modified_time=datetime.strptime(file_info['last_modified_time'], '%Y-%m-%d %H:%M:%S'),
+            file_size=file_info['file_size'],
+            state=ArchiveFileState.pending
+        )
+        for file_info in candidates
+    ]
+    db.add_all(job_files)
+    return job_files
+
+
+def checkpoint_candidates(db: Session, job: ArchiveJob, candidates: list):
+    """
+    Stores the filtered candidate list so a restarted job never has to rescan the share.
+    """
+    add_job_candidates(db, job.id, candidates)
+    job.status = ArchiveJobStatus.running
+    db.commit()
+
+
+def scan_job_candidates(db: Session, job: ArchiveJob):
+    with memory_stage("scan", job.id):
+        if job.source == "catalog":
+            # Metadata kept current by watcher.py, no crawl of the share needed
+            all_files = scan_catalog(db, job.share_name)
+        elif job.source == "snapshot":
+            # Only directories changed since the last snapshot are listed into the catalog
+            scan = sync_share_snapshot(db, job.share_name)
+            if scan.status != ArchiveJobStatus.completed:
+                return f"Snapshot scan failed: {scan.error}"
+            all_files = scan_catalog(db, job.share_name)
+        else:
+            svm_data = get_svm_data_volumes()
+            if not svm_data:
+                return "No SVM volumes found"
+            all_files = scan_volume(svm_data)
+
+    if not all_files or job.share_name not in all_files:
+        return f"No files found in {job.share_name}"
+
+    with memory_stage("filter", job.id):
+        filtered = filter_files(all_files, job.filters or {}, job.blacklist or [], job.share_name)
+    skipped = []
+    candidates = apply_restore_history(db, filtered.get(job.share_name, []), skipped)
+    record_skipped(skipped, job.id)
+    checkpoint_candidates(db, job, candidates)
+    return None
+
+
+def fail_job_file(db: Session, job_file: ArchiveJobFile, reason: str):
+    print(f"❌ Archive job {job_file.job_id}: {job_file.full_path} failed: {reason}")
+    job_file.state = ArchiveFileState.failed
+    job_file.error = reason
+    db.commit()
+
+
+def pack_small_files(db: Session, job: ArchiveJob, job_files: list):
+    """
+    Bundles pending small files into one pack per directory group and marks them copied.
+    A pack and its members' state are committed together; an interrupted pack is simply
+    rewritten under the same name.
+    """
+    candidates = [
+        job_file for job_file in job_files
+        if job_file.state == ArchiveFileState.pending
+        and not job_file.destination_path
+        and (job_file.file_size or 0) <= ARCHIVE_PACK_MAX_FILE_SIZE
+    ]
+
+    for group in group_pack_members(candidates):
+        group_size = sum(job_file.file_size or 0 for job_file in group)
+        dest_folder = place_file(group_size)
+        if not dest_folder:
+            # Left pending, the per-file step reports the invalid destination
+            continue
+
+        pack_path = normalize_path(f"{dest_folder}\\.packs\\job{job.id}_{group[0].id}.tar")
+        started = time.monotonic()
+        try:
+            storage.makedirs(ntpath.dirname(pack_path), exist_ok=True)
+            index = write_pack(pack_path, [job_file.full_path for job_file in group])
+        finally:
+            finish_placement(dest_folder, group_size, started)
+
+        pack = db.query(ArchivePack).filter(ArchivePack.archive_path == pack_path).first()
+        if not pack:
+            pack = ArchivePack(archive_path=pack_path)
+            db.add(pack)
+        pack.source_dir = ntpath.dirname(group[0].full_path)
+        pack.member_count = len(index)
+        pack.live_members = len(index)
+        pack.total_size = sum(entry["size"] for entry in index)
+        db.flush()
+
+        for job_file, entry in zip(group, index):
+            job_file.destination_path = pack_path
+            job_file.pack_id = pack.id
+            job_file.pack_offset = entry["offset"]
+            job_file.stored_size = entry["size"]
+            job_file.bytes_copied = entry["size"]
+            job_file.content_hash = entry["content_hash"]
+            job_file.state = ArchiveFileState.copied
+
+        job.bytes_in += pack.total_size
+        job.bytes_stored += pack.total_size
+        db.commit()
+        print(f"📦 Packed {len(index)} file(s) into {pack_path}")
+
+
+def advance_job_file(db: Session, job_file: ArchiveJobFile):
+    """
+    Moves a single file through pending → copied → verified → source_deleted → logged,
+    committing after every step so an interrupted job continues where it stopped.
+    """
+    src_path = job_file.full_path
+    file_info = job_file_to_file_info(job_file)
+
+    if job_file.state == ArchiveFileState.pending and is_content_addressed() and not job_file.bytes_copied:
+        blob, content_hash = find_duplicate_blob(db, src_path, job_file.file_size)
+        if blob:
+            # Identical content is already archived, reference it instead of copying
+            print(f"Identical content already archived: {blob.archive_path}")
+            blob.ref_count += 1
+            job_file.destination_path = blob.archive_path
+            job_file.content_hash = content_hash
+            job_file.compression = blob.compression
+            job_file.stored_size = 0
+            job_file.job.bytes_in += job_file.file_size or 0
+            job_file.state = ArchiveFileState.verified
+            db.commit()
+
+    if job_file.state == ArchiveFileState.pending:
+        # A resumed file keeps the target it was placed on
+        dest_folder = None
+        if not job_file.destination_path:
+            dest_folder = place_file(job_file.file_size)
+            if not dest_folder:
+                return fail_job_file(db, job_file, "Invalid archive destination")
+            job_file.compression = choose_compression(src_path, job_file.file_size)
+            job_file.destination_path = get_destination_path(src_path, dest_folder, job_file.compression)
+            db.commit()
+
+        def checkpoint(offset):
+            job_file.bytes_copied = offset
+            db.commit()
+
+        started = time.monotonic()
+        try:
+            result = copy_to_archive(
+                src_path,
+                job_file.destination_path,
+                file_size=job_file.file_size,
+                start_offset=job_file.bytes_copied or 0,
+                progress_callback=checkpoint,
+                compression=job_file.compression
+            )
+        finally:
+            if dest_folder:
+                finish_placement(dest_folder, job_file.file_size, started)
+        job_file.content_hash = result["content_hash"]
+        job_file.stored_size = result["stored_size"]
+        job_file.job.bytes_in += job_file.file_size or 0
+        job_file.job.bytes_stored += result["stored_size"]
+        job_file.job.compression_cpu_seconds += result["cpu_seconds"]
+        job_file.state = ArchiveFileState.copied
+        db.commit()
+
+    if job_file.state == ArchiveFileState.copied and job_file.pack_id:
+        if not verify_pack_member(job_file.destination_path, job_file.pack_offset, job_file.stored_size, job_file.content_hash):
+            # The source stays, the bad member no longer keeps the pack alive
+            empty_pack = drop_pack_member(db, job_file.pack_id, job_file.pack_offset)
+            fail_job_file(db, job_file, "Pack member could not be verified")
+            if empty_pack:
+                remove_pack(empty_pack)
+            return None
+        job_file.state = ArchiveFileState.verified
+        db.commit()
+
+    if job_file.state == ArchiveFileState.copied:
+        if is_content_addressed():
+            # Accept a copy an interrupted attempt already moved to its blob path
+            job_file.destination_path = locate_staged_copy(job_file.destination_path, job_file.content_hash, job_file.compression)
+        if not verify_archive_copy(job_file.destination_path, job_file.file_size, job_file.content_hash, job_file.compression):
+            return fail_job_file(db, job_file, "Archive copy could not be verified")
+        if is_content_addressed():
+            deduplicated = db.query(ArchiveBlob).filter(ArchiveBlob.content_hash == job_file.content_hash).first() is not None
+            job_file.destination_path = store_archive_blob(
+                db, job_file.destination_path, job_file.content_hash, job_file.file_size,
+                job_file.compression, job_file.stored_size
+            )
+            if deduplicated:
+                # The staged copy was dropped, this file takes no extra archive space
+                job_file.job.bytes_stored -= job_file.stored_size or 0
+                job_file.stored_size = 0
+        job_file.state = ArchiveFileState.verified
+        db.commit()
+
+    if job_file.state == ArchiveFileState.verified:
+        delete_source(src_path)
+        # Catalog reads (and snapshot scans reusing a snapshot) must not plan it again
+        remove_path(db, src_path)
+        job_file.state = ArchiveFileState.source_deleted
+        db.commit()
+
+    if job_file.state == ArchiveFileState.source_deleted:
+        finalize_archive(src_path, job_file.destination_path, file_info, set_times=not job_file.pack_id)
+        # The movement record and the final state are committed together
+        db.add(build_file_movement(
+            src_path, job_file.destination_path, file_info,
+            job_file.content_hash, job_file.compression, job_file.stored_size,
+            job_file.pack_id, job_file.pack_offset
+        ))
+        job_file.state = ArchiveFileState.logged
+        db.commit()
+
+
+def job_summary(db: Session, job: ArchiveJob):
+    logged = db.query(ArchiveJobFile)\
+        .filter(ArchiveJobFile.job_id == job.id)\
+        .filter(ArchiveJobFile.state == ArchiveFileState.logged)\
+        .all()
+
+    return {
+        "job_id": job.id,
+        "status": "success" if logged else "no_matches",
+        "archived_count": len(logged),
+        "bytes_in": job.bytes_in,
+        "bytes_stored": job.bytes_stored,
+        "compression_cpu_seconds": round(job.compression_cpu_seconds, 3),
+        "files": [
+            {
+                "filename": os.path.basename(job_file.full_path),
+                "original_path": job_file.full_path,
+                "archived_path": job_file.destination_path
+            }
+            for job_file in logged
+        ]
+    }
+
+
+def claim_job(job_id: int):
+    """
+    Claims a job for this process unless another one holds a live claim. Returns None when
+    claimed, otherwise the result to report ("not_found" or "already_running").
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        claimed = db.execute(
+            update(ArchiveJob)
+            .where(ArchiveJob.id == job_id)
+            .where(or_(ArchiveJob.lease_expires_at.is_(None), ArchiveJob.lease_expires_at < now))
+            # Claims aren't progress, updated_at is left alone
+            .values(runner_id=RUNNER_ID, lease_expires_at=now + timedelta(seconds=ARCHIVE_JOB_LEASE_SECONDS), updated_at=ArchiveJob.updated_at)
+            .returning(ArchiveJob.id)
+        ).first()
+        db.commit()
+        if claimed:
+            return None
+        if not db.query(ArchiveJob.id).filter(ArchiveJob.id == job_id).first():
+            return {"job_id": job_id, "status": "not_found"}
+        return {"job_id": job_id, "status": "already_running"}
+    finally:
+        db.close()
+
+
+def _update_claim(job_id: int, runner_id: str, values: dict):
+    db = SessionLocal()
+    try:
+        updated = db.query(ArchiveJob)\
+            .filter(ArchiveJob.id == job_id)\
+            .filter(ArchiveJob.runner_id == runner_id)\
+            .update({**values, ArchiveJob.updated_at: ArchiveJob.updated_at}, synchronize_session=False)
+        db.commit()
+        return updated == 1
+    finally:
+        db.close()
+
+
+def renew_job_claim(job_id: int, runner_id: str):
+    """
+    Extends a claim this process still holds. Returns False if the job was taken over.
+    """
+    expires = datetime.utcnow() + timedelta(seconds=ARCHIVE_JOB_LEASE_SECONDS)
+    return _update_claim(job_id, runner_id, {ArchiveJob.lease_expires_at: expires})
+
+
+def release_job(job_id: int):
+    _update_claim(job_id, RUNNER_ID, {ArchiveJob.runner_id: None, ArchiveJob.lease_expires_at: None})
+
+
+def run_archive_job(job_id: int, before_file=None):
+    """
+    Runs (or resumes) an archive job from its last checkpoint and returns a summary.
+    before_file(job_file) may return False to pause the job; it stays running and the
+    next resume continues with that file. A job running in any process isn't run twice.
+    """
+    result = claim_job(job_id)
+    if result:
+        return result
+    return run_claimed_job(job_id, before_file)
+
+
+def start_archive_job(job_id: int):
+    """
+    Claims a job and runs it in a background thread. Returns the claim's outcome.
+    """
+    result = claim_job(job_id)
+    if result:
+        return result
+    threading.Thread(target=run_claimed_job, args=(job_id,), daemon=True).start()
+    return {"job_id": job_id, "status": "resuming"}
+
+
+@prioritized(BULK)
+@profiled_job_entry
+def run_claimed_job(job_id: int, before_file=None):
+    """
+    Runs a job claimed by claim_job(), keeping the claim alive and releasing it at the end.
+    """
+    try:
+        with LeaseHeartbeat(job_id, RUNNER_ID, ARCHIVE_JOB_LEASE_SECONDS / 3, renew=renew_job_claim) as heartbeat:
+            return _run_job(job_id, before_file, heartbeat)
+    finally:
+        release_job(job_id)
+
+
+def _run_job(job_id: int, before_file, heartbeat):
+    db = SessionLocal()
+    try:
+        job = db.query(ArchiveJob).filter(ArchiveJob.id == job_id).first()
+        if not job:
+            return {"job_id": job_id, "status": "not_found"}
+
+        if job.status == ArchiveJobStatus.scanning:
+            print(f"🔍 Archive job {job.id}: scanning share {job.share_name}")
+            reason = scan_job_candidates(db, job)
+            if reason:
+                job.status = ArchiveJobStatus.failed
+                job.error = reason
+                db.commit()
+                return {"job_id": job.id, "status": "no_files", "reason": reason}
+        else:
+            print(f"🔁 Archive job {job.id}: resuming from checkpoint")
+
+        remaining = db.query(ArchiveJobFile)\
+            .filter(ArchiveJobFile.job_id == job.id)\
+            .filter(ArchiveJobFile.state.notin_([ArchiveFileState.logged, ArchiveFileState.failed]))\
+            .order_by(ArchiveJobFile.id)\
+            .all()
+
+        if job.pack_small_files:
+            try:
+                pack_small_files(db, job, remaining)
+            except Exception as e:
+                # Unpacked files fall through to being archived one by one
+                db.rollback()
+                print(f"⚠️ Archive job {job.id}: packing failed: {e}")
+
+        interrupted = 0
+        paused = False
+        for job_file in remaining:
+            if heartbeat.lost:
+                # Another process took the job over, it continues from the last checkpoint
+                return {"job_id": job.id, "status": "taken_over"}
+            if before_file and not before_file(job_file):
+                paused = True
+                break
+            try:
+                advance_job_file(db, job_file)
+            except Exception as e:
+                # Keep the state and checkpoint so the next resume picks the file up again
+                db.rollback()
+                print(f"⚠️ Archive job {job.id}: {job_file.full_path} interrupted: {e}")
+                job_file.error = str(e)
+                db.commit()
+                interrupted += 1
+
+        if paused:
+            job.error = "Paused, resume the job to continue"
+        elif interrupted:
+            job.error = f"{interrupted} file(s) interrupted, resume the job to retry"
+        else:
+            job.status = ArchiveJobStatus.completed
+            job.error = None
+        db.commit()
+        return job_summary(db, job)
+
+    except Exception as e:
+        print(f"❌ Archive job {job_id} failed: {e}")
+        db.rollback()
+        return {"job_id": job_id, "status": "failed", "reason": str(e)}
+    finally:
+        db.close()
+
+
+def resume_incomplete_jobs():
+    db = SessionLocal()
+    try:
+        # Distributed jobs live in the work queue and are resumed by the workers, policy
+        # jobs by scheduler.py inside its off-peak window
+        job_ids = [
+            job.id for job in db.query(ArchiveJob)
+            .filter(ArchiveJob.status.in_([ArchiveJobStatus.scanning, ArchiveJobStatus.running]))
+            .filter(ArchiveJob.distributed.is_(False))
+            .filter(ArchiveJob.policy_id.is_(None))
+            .order_by(ArchiveJob.id)
+            .all()
+        ]
+    finally:
+        db.close()
+
+    # Every API process tries, each job is claimed by one of them
+    for job_id in job_ids:
+        run_archive_job(job_id)
+
+
+def archive_filtered_files(filters: dict, blacklist: list, share_name: str, source: str = "scan",
+                           pack_small_files: bool = False):
+    """
+    Scans all SVM volumes (or reads the watched catalog), filters files and archives
+    matching ones as a checkpointed job. Returns a summary.
+    """
+    print(f"🔍 Starting archive process for share: {share_name}")
+
+    db = SessionLocal()
+    try:
+        job = create_archive_job(db, filters, blacklist, share_name, source, pack_small_files)
+        job_id = job.id
+    finally:
+        db.close()
+
+    return run_archive_job(job_id)
+
+
+def get_share_root(share_name: str):
+    svm_data = get_svm_data_volumes()
+    ip_address = get_first_ip_address(svm_data) if svm_data else None
+    for share in svm_data.get('volumes', []) if svm_data else []:
+        if share.get('share_name') == share_name:
+            share_path, _ = access_CIFS_share(share, ip_address)
+            return share_path
+    return None
+
+
+def enqueue_archive_job(filters: dict, blacklist: list, share_name: str, pack_small_files: bool = False):
+    """
+    Creates an archive job that is scanned and moved by worker processes (see worker.py).
+    Only the share root is enqueued here, workers fan out one task per directory.
+    """
+    share_root = get_share_root(share_name)
+    if not share_root:
+        return {"status": "failed", "reason": f"Share {share_name} not found"}
+
+    db = SessionLocal()
+    try:
+        job = ArchiveJob(
+            share_name=share_name,
+            filters=filters,
+            blacklist=blacklist,
+            status=ArchiveJobStatus.running,
+            distributed=True,
+            pack_small_files=pack_small_files
+        )
+        db.add(job)
+        db.flush()
+        enqueue_task(db, SCAN_DIRECTORY, {"path": share_root}, job_id=job.id)
+        db.commit()
+        print(f"📬 Archive job {job.id} queued for share {share_name}")
+        return {"job_id": job.id, "status": "queued"}
+    finally:
+        db.close()
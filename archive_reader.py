@@ -0,0 +1,242 @@
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+import storage
+
+from compression import open_decompressed
+from models import FileMovement
+from transfer_scheduler import INTERACTIVE, transfer_slot
+
+
+ARCHIVE_CACHE_DIR = os.getenv("ARCHIVE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "storage_optimizer_cache"))
+ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("ARCHIVE_CACHE_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+# Plain archived files are cached once they have been read this many times
+ARCHIVE_CACHE_MIN_READS = int(os.getenv("ARCHIVE_CACHE_MIN_READS", 2))
+# Files whose read counts are remembered; the least recently read are forgotten first
+ARCHIVE_CACHE_TRACKED_READS = int(os.getenv("ARCHIVE_CACHE_TRACKED_READS", 10000))
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveReadCache:
+    """
+    Size-bounded LRU cache of archived file content on local disk.
+    Entries are keyed by FileMovement id; archived content never changes under an id.
+    """
+    def __init__(self, directory=ARCHIVE_CACHE_DIR, max_bytes=ARCHIVE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._reads = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _load_existing(self):
+        # Least recently used first, so a restart keeps the previous eviction order
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".bin"):
+                files.append((os.stat(path).st_atime, name[:-4], os.path.getsize(path)))
+            elif name.endswith(".tmp"):
+                os.remove(path)
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        key = str(key)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._path(key)
+
+    def record_read(self, key):
+        """
+        Counts a read that missed the cache; returns True once the entry is worth caching.
+        """
+        key = str(key)
+        with self._lock:
+            reads = self._reads.pop(key, 0) + 1
+            self._reads[key] = reads
+            while len(self._reads) > ARCHIVE_CACHE_TRACKED_READS:
+                self._reads.popitem(last=False)
+            return reads >= ARCHIVE_CACHE_MIN_READS
+
+    def put(self, key, chunks):
+        """
+        Stores the content produced by the chunks iterable and returns the cached path,
+        or None when it turns out larger than the whole cache.
+        """
+        key = str(key)
+        tmp_path = os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.tmp")
+        size = 0
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    break
+                f.write(chunk)
+
+        if size > self.max_bytes:
+            os.remove(tmp_path)
+            return None
+
+        with self._lock:
+            os.replace(tmp_path, self._path(key))
+            if key in self._entries:
+                self._size -= self._entries[key]
+            self._entries[key] = size
+            self._size += size
+            self._reads.pop(key, None)
+            self._evict()
+            return self._path(key) if key in self._entries else None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_archive_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArchiveReadCache()
+        return _cache
+
+
+def archived_size(movement: FileMovement):
+    """
+    Size of the original content, which is what clients see and ranges refer to.
+    """
+    if movement.pack_id and movement.stored_size is not None:
+        return movement.stored_size
+    return movement.file_size
+
+
+def _iter_file(f, length, archive_read=True):
+    """
+    Yields up to length bytes from f. Reads from the archive share take an interactive
+    transfer slot; local cache reads don't touch the link and skip the scheduler.
+    """
+    remaining = length
+    while remaining > 0:
+        if archive_read:
+            # Someone is waiting on the response, previews run with restores
+            with transfer_slot(INTERACTIVE):
+                data = f.read(min(READ_CHUNK_SIZE, remaining))
+        else:
+            data = f.read(min(READ_CHUNK_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def iter_archived_content(movement: FileMovement):
+    """
+    Yields the full original content of an archived file straight from the archive share.
+    """
+    size = archived_size(movement)
+    with storage.open_file(movement.destination_path, mode="rb") as f:
+        if movement.compression:
+            yield from _iter_file(open_decompressed(f), size)
+        else:
+            if movement.pack_id:
+                f.seek(movement.pack_offset)
+            yield from _iter_file(f, size)
+
+
+def iter_archived_range(movement: FileMovement, start: int, end: int):
+    """
+    Yields bytes start..end (inclusive) of an archived file's original content, serving
+    from the local cache when possible and filling it for compressed or frequently read files.
+    """
+    length = end - start + 1
+    cache = get_archive_cache()
+
+    cached_path = cache.get(movement.id)
+    fits_cache = (archived_size(movement) or 0) <= cache.max_bytes
+    if not cached_path and fits_cache and (movement.compression or cache.record_read(movement.id)):
+        # Compressed copies can't be read at an offset, decompress them once into the cache
+        cached_path = cache.put(movement.id, iter_archived_content(movement))
+
+    if cached_path:
+        with open(cached_path, "rb") as f:
+            f.seek(start)
+            yield from _iter_file(f, length, archive_read=False)
+        return
+
+    if movement.compression:
+        # Too large for the cache, decompress and skip up to the range
+        with storage.open_file(movement.destination_path, mode="rb") as f:
+            reader = open_decompressed(f)
+            skipped = 0
+            while skipped < start:
+                with transfer_slot(INTERACTIVE):
+                    data = reader.read(min(READ_CHUNK_SIZE, start - skipped))
+                if not data:
+                    return
+                skipped += len(data)
+            yield from _iter_file(reader, length)
+        return
+
+    with storage.open_file(movement.destination_path, mode="rb") as f:
+        f.seek((movement.pack_offset or 0) + start)
+        yield from _iter_file(f, length)
+
+
+def parse_range_header(range_header, size):
+    """
+    Parses a single-range "bytes=" header. Returns (start, end) inclusive, None when
+    there is no usable header (missing or malformed, served whole), or raises ValueError
+    when the range can't be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    spec = range_header[len("bytes="):].split(",")[0].strip()
+    start_text, dash, end_text = spec.partition("-")
+    start_text, end_text = start_text.strip(), end_text.strip()
+    if not dash or not (start_text or end_text):
+        return None
+    if (start_text and not start_text.isdigit()) or (end_text and not end_text.isdigit()):
+        return None
+    if start_text and end_text and int(end_text) < int(start_text):
+        return None
+
+    if size == 0:
+        # Nothing in an empty file can be addressed
+        raise ValueError("Range not satisfiable")
+
+    if not start_text:
+        # Suffix range: the last N bytes
+        suffix = int(end_text)
+        if suffix <= 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - suffix), size - 1
+
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
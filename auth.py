@@ -1,13 +1,12 @@
 import logging
 import os
 from fastapi import HTTPException, Depends
-from sqlalchemy.orm import Session
 from jose import jwt, JWTError
 from datetime import datetime, timedelta, timezone
 from models import User
 from passlib.hash import bcrypt
 
-from database import get_db
+from database import AsyncSessionLocal
 
 logging.basicConfig(level=logging.INFO)
 
@@ -52,7 +51,7 @@ def validate_token(token: str):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 # Function to get the current user from a JWT token
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         # Decode the JWT token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -60,8 +59,10 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        # Fetch the user from the database
-        user = db.query(User).filter(User.id == user_id).first()
+        # Fetch the user from the database. Uses its own short session so long running
+        # endpoints don't hold a pooled connection for their whole duration.
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
 
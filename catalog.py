@@ -0,0 +1,120 @@
+import ntpath
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+from models import FileMetadata
+from netapp_btc import normalize_path, scan_directory
+from scan_results import ScanResult
+
+
+def _apply_file_info(entry: FileMetadata, file_info: dict):
+    entry.parent_path = ntpath.dirname(entry.full_path)
+    entry.creation_time = datetime.strptime(file_info['creation_time'], '%Y-%m-%d %H:%M:%S')
+    entry.last_access_time = datetime.strptime(file_info['last_access_time'], '%Y-%m-%d %H:%M:%S')
+    entry.last_modified_time = datetime.strptime(file_info['last_modified_time'], '%Y-%m-%d %H:%M:%S')
+    entry.file_size = file_info['file_size']
+    return entry
+
+
+def upsert_file(db: Session, share_name: str, file_info: dict):
+    full_path = normalize_path(file_info['full_path'])
+    entry = db.query(FileMetadata).filter(FileMetadata.full_path == full_path).first()
+    if not entry:
+        entry = FileMetadata(share_name=share_name, full_path=full_path)
+        db.add(entry)
+    return _apply_file_info(entry, file_info)
+
+
+def remove_path(db: Session, path: str):
+    """
+    Removes a file, or a directory and everything below it, from the catalog.
+    """
+    path = normalize_path(path)
+    db.query(FileMetadata)\
+        .filter(FileMetadata.full_path == path)\
+        .delete(synchronize_session=False)
+    db.query(FileMetadata)\
+        .filter(FileMetadata.full_path.startswith(path + "\\", autoescape=True))\
+        .delete(synchronize_session=False)
+
+
+def _add_files(db: Session, share_name: str, files: list):
+    db.add_all([
+        _apply_file_info(FileMetadata(share_name=share_name, full_path=normalize_path(file_info['full_path'])), file_info)
+        for file_info in files
+    ])
+
+
+def replace_directory(db: Session, share_name: str, dir_path: str, files: list):
+    """
+    Replaces the catalog entries directly in dir_path with files (file infos from a listing).
+    """
+    dir_path = normalize_path(dir_path)
+    db.query(FileMetadata)\
+        .filter(FileMetadata.parent_path == dir_path)\
+        .delete(synchronize_session=False)
+    _add_files(db, share_name, files)
+
+
+def rescan_directory(db: Session, share_name: str, dir_path: str, recursive: bool = True):
+    """
+    Replaces the catalog entries below dir_path with a fresh listing. Used for the initial
+    load and whenever change notifications for a subtree were lost.
+    Returns the number of files found.
+    """
+    dir_path = normalize_path(dir_path)
+    if recursive:
+        remove_path(db, dir_path)
+    else:
+        db.query(FileMetadata)\
+            .filter(FileMetadata.parent_path == dir_path)\
+            .delete(synchronize_session=False)
+
+    found = 0
+    pending = [dir_path]
+    while pending:
+        current = pending.pop()
+        try:
+            subdirs, files = scan_directory(current)
+        except OSError as e:
+            print(f"Error accessing directory {current}: {e}")
+            continue
+
+        # Old entries are already gone, so new rows can be added without a lookup each
+        _add_files(db, share_name, files)
+        found += len(files)
+        if recursive:
+            pending.extend(subdirs)
+
+    return found
+
+
+def file_metadata_to_file_info(entry: FileMetadata):
+    return {
+        'full_path': entry.full_path,
+        'creation_time': entry.creation_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'last_access_time': entry.last_access_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'last_modified_time': entry.last_modified_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'file_size': entry.file_size
+    }
+
+
+def scan_catalog(db: Session, share_name: str):
+    """
+    Same shape as scan_volume()'s result for one share, read from the catalog kept
+    current by watcher.py instead of walking the share.
+    """
+    entries = db.query(FileMetadata)\
+        .filter(FileMetadata.share_name == share_name)\
+        .yield_per(10000)
+    result = ScanResult()
+    for entry in entries:
+        result.add(
+            entry.parent_path,
+            ntpath.basename(entry.full_path),
+            entry.creation_time.timestamp(),
+            entry.last_access_time.timestamp(),
+            entry.last_modified_time.timestamp(),
+            entry.file_size
+        )
+    return {share_name: result}
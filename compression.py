@@ -0,0 +1,155 @@
+import math
+import os
+import time
+from collections import Counter
+
+import storage
+
+from transfer import ContentHasher, TRANSFER_BUFFER_SIZE
+from transfer_scheduler import transfer_slot
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Compression applied to archived copies: zstd or none
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "none")
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", 3))
+# Sampled data at or above this many bits per byte is treated as already compressed
+COMPRESSION_ENTROPY_THRESHOLD = float(os.getenv("COMPRESSION_ENTROPY_THRESHOLD", 7.5))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 4096))
+
+COMPRESSION_SAMPLE_SIZE = 64 * 1024
+COMPRESSED_SUFFIXES = {"zstd": ".zst"}
+
+INCOMPRESSIBLE_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.pdf',
+    '.zip', '.gz', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.mp3', '.mp4', '.mkv', '.avi', '.mov',
+    '.docx', '.xlsx', '.pptx',
+}
+
+
+def estimate_entropy(data):
+    """
+    Shannon entropy of data in bits per byte (0 for constant data, 8 for random data).
+    """
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+def sample_entropy(path, file_size):
+    # Sample the start, middle and end so a compressible header can't hide a packed body
+    offsets = sorted({0, max(0, file_size // 2 - COMPRESSION_SAMPLE_SIZE // 2), max(0, file_size - COMPRESSION_SAMPLE_SIZE)})
+    sample = bytearray()
+    with storage.open_file(path, mode="rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            sample.extend(f.read(COMPRESSION_SAMPLE_SIZE))
+    return estimate_entropy(bytes(sample))
+
+
+def choose_compression(path, file_size):
+    """
+    Returns the compression to apply to an archived copy of path, or None to store it as is.
+    """
+    if ARCHIVE_COMPRESSION != "zstd" or zstandard is None:
+        return None
+    if file_size is not None and file_size < COMPRESSION_MIN_SIZE:
+        return None
+    if os.path.splitext(path)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return None
+    if sample_entropy(path, file_size or 0) >= COMPRESSION_ENTROPY_THRESHOLD:
+        print(f"Skipping compression for {path} (high entropy sample)")
+        return None
+    return "zstd"
+
+
+def compressed_path(path, compression):
+    return path + COMPRESSED_SUFFIXES[compression] if compression else path
+
+
+def compress_copy(src_path, dest_path, level=ARCHIVE_COMPRESSION_LEVEL, hasher=None, buffer_size=TRANSFER_BUFFER_SIZE):
+    """
+    Streams src_path into a zstd frame at dest_path with bounded memory.
+    The hasher sees the uncompressed content. Returns (bytes_in, bytes_out, cpu_seconds).
+    """
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    bytes_in = bytes_out = 0
+    cpu_seconds = 0.0
+
+    with storage.open_file(src_path, mode="rb") as src, storage.open_file(dest_path, mode="wb") as dest:
+        while True:
+            with transfer_slot():
+                data = src.read(buffer_size)
+            if not data:
+                break
+            if hasher:
+                hasher.update(data)
+            bytes_in += len(data)
+
+            started = time.thread_time()
+            out = compressor.compress(data)
+            cpu_seconds += time.thread_time() - started
+            if out:
+                with transfer_slot():
+                    dest.write(out)
+                bytes_out += len(out)
+
+        started = time.thread_time()
+        out = compressor.flush()
+        cpu_seconds += time.thread_time() - started
+        dest.write(out)
+        bytes_out += len(out)
+
+    return bytes_in, bytes_out, cpu_seconds
+
+
+def open_decompressed(file_obj):
+    """
+    Wraps an open archived file so reads return the original, uncompressed content.
+    """
+    return zstandard.ZstdDecompressor().stream_reader(file_obj, read_across_frames=True)
+
+
+def decompress_copy(src_path, dest_path, hasher=None, buffer_size=TRANSFER_BUFFER_SIZE):
+    """
+    Streams a zstd archived copy back to dest_path, decompressing on the fly.
+    Returns the number of uncompressed bytes written.
+    """
+    written = 0
+    with storage.open_file(src_path, mode="rb") as src, storage.open_file(dest_path, mode="wb") as dest:
+        reader = open_decompressed(src)
+        while True:
+            with transfer_slot():
+                data = reader.read(buffer_size)
+            if not data:
+                break
+            if hasher:
+                hasher.update(data)
+            with transfer_slot():
+                dest.write(data)
+            written += len(data)
+    return written
+
+
+def hash_compressed_file(path, algorithm, buffer_size=TRANSFER_BUFFER_SIZE):
+    """
+    Reads a compressed archived copy back and returns (content hash, uncompressed size).
+    """
+    hasher = ContentHasher(algorithm)
+    size = 0
+    with storage.open_file(path, mode="rb") as f:
+        reader = open_decompressed(f)
+        while True:
+            with transfer_slot():
+                data = reader.read(buffer_size)
+            if not data:
+                break
+            hasher.update(data)
+            size += len(data)
+    return hasher.hexdigest(), size
@@ -0,0 +1,292 @@
+"""
+Duplicate content finder. Works in three stages so most files are never read:
+
+    1. group the scanned files by size, a file with a unique size has no duplicate
+    2. hash the first and last DUPLICATE_EDGE_BYTES of files that share a size
+    3. hash the full content of files that still share (size, edge hash)
+
+Results are stored per scan so the report can be reopened without reading the shares again.
+"""
+import os
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+import storage
+from database import SessionLocal
+from models import ArchiveJobStatus, DuplicateFile, DuplicateGroup, DuplicateScan
+from netapp_btc import access_CIFS_share, get_first_ip_address, get_svm_data_volumes, scan_share, scan_volume
+from transfer import ContentHasher, TRANSFER_HASH_ALGORITHM, hash_file
+from profiling import current_job, profiled_job
+from transfer_scheduler import BULK, transfer_priority, transfer_slot
+
+
+DUPLICATE_WORKERS = int(os.getenv("DUPLICATE_WORKERS", 4))
+# Bytes hashed at each end of a file in the second stage
+DUPLICATE_EDGE_BYTES = int(os.getenv("DUPLICATE_EDGE_BYTES", 64 * 1024))
+# Smaller files are ignored, empty files are all "duplicates" of each other
+DUPLICATE_MIN_SIZE = int(os.getenv("DUPLICATE_MIN_SIZE", 1))
+GROUP_INSERT_CHUNK = 1000
+
+
+def hash_edges(path, file_size, algorithm=TRANSFER_HASH_ALGORITHM):
+    """
+    Hash of the first and last DUPLICATE_EDGE_BYTES. For files up to twice that size the
+    two reads cover the whole file, so the result is also its full content hash.
+    """
+    hasher = ContentHasher(algorithm)
+    with storage.open_file(path, mode="rb") as f:
+        with transfer_slot():
+            hasher.update(f.read(DUPLICATE_EDGE_BYTES))
+        if file_size > DUPLICATE_EDGE_BYTES:
+            f.seek(max(DUPLICATE_EDGE_BYTES, file_size - DUPLICATE_EDGE_BYTES))
+            with transfer_slot():
+                hasher.update(f.read(DUPLICATE_EDGE_BYTES))
+    return hasher.hexdigest()
+
+
+def covered_by_edges(file_size):
+    return file_size <= 2 * DUPLICATE_EDGE_BYTES
+
+
+def bounded_map(func, items, workers=DUPLICATE_WORKERS):
+    """
+    Yields (item, func(item)) from a pool of workers with at most a few tasks queued per
+    worker, so millions of candidates don't turn into millions of pending futures.
+    Files that can't be read (deleted or changed since the scan) are skipped.
+    """
+    job_id = current_job()
+
+    def task(item):
+        with transfer_priority(BULK), profiled_job(job_id):
+            try:
+                return item, func(item)
+            except OSError as e:
+                print(f"⚠️ Skipping {item[0]}: {e}")
+                return item, None
+
+    items = iter(items)
+    max_outstanding = max(1, workers) * 4
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        in_flight = set()
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < max_outstanding:
+                item = next(items, None)
+                if item is None:
+                    exhausted = True
+                    break
+                in_flight.add(executor.submit(task, item))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, result = future.result()
+                if result is not None:
+                    yield item, result
+
+
+def size_candidates(scans):
+    """
+    (full path, size, modified epoch) of every file whose size occurs more than once.
+    """
+    counts = Counter()
+    for result in scans.values():
+        counts.update(result.sizes)
+
+    candidates = []
+    for result in scans.values():
+        for index, size in enumerate(result.sizes):
+            if size >= DUPLICATE_MIN_SIZE and counts[size] > 1:
+                candidates.append((result.full_path(index), size, result.modified_times[index]))
+    return candidates
+
+
+def groups_of_two_or_more(keyed_items):
+    groups = defaultdict(list)
+    for key, item in keyed_items:
+        groups[key].append(item)
+    return {key: items for key, items in groups.items() if len(items) > 1}
+
+
+def store_groups(db: Session, scan: DuplicateScan, content_groups: dict):
+    pending = []
+    for content_hash, files in content_groups.items():
+        file_size = files[0][1]
+        group = DuplicateGroup(
+            scan_id=scan.id,
+            content_hash=content_hash,
+            file_size=file_size,
+            file_count=len(files),
+            reclaimable_bytes=file_size * (len(files) - 1)
+        )
+        db.add(group)
+        pending.append((group, files))
+        scan.duplicate_groups += 1
+        scan.duplicate_files += len(files)
+        scan.reclaimable_bytes += group.reclaimable_bytes
+
+        if len(pending) >= GROUP_INSERT_CHUNK:
+            _flush_groups(db, pending)
+            pending = []
+    _flush_groups(db, pending)
+
+
+def _flush_groups(db: Session, pending: list):
+    if not pending:
+        return
+    db.flush()
+    db.bulk_insert_mappings(DuplicateFile, [
+        {"group_id": group.id, "full_path": path, "last_modified_time": datetime.fromtimestamp(modified)}
+        for group, files in pending
+        for path, _, modified in files
+    ])
+    db.commit()
+
+
+def scan_shares(svm_data, share_name: str = None):
+    """
+    {share name: ScanResult} of every data share, or of share_name only without walking the others.
+    """
+    if not share_name:
+        return scan_volume(svm_data)
+    ip_address = get_first_ip_address(svm_data)
+    for share in svm_data.get('volumes', []):
+        share_path, name = access_CIFS_share(share, ip_address)
+        if name == share_name and share_path:
+            return {name: scan_share(share_path)}
+    return {}
+
+
+def run_duplicate_scan(scan_id: int):
+    db = SessionLocal()
+    try:
+        scan = db.query(DuplicateScan).filter(DuplicateScan.id == scan_id).first()
+        if not scan:
+            return {"status": "not_found"}
+
+        try:
+            svm_data = get_svm_data_volumes()
+            if not svm_data:
+                raise RuntimeError("No SVM volumes found")
+            scans = scan_shares(svm_data, scan.share_name)
+            scan.files_scanned = sum(len(result) for result in scans.values())
+            scan.bytes_scanned = sum(result.total_size() for result in scans.values())
+
+            # Stage 1: sizes
+            candidates = size_candidates(scans)
+            del scans
+            scan.size_candidates = len(candidates)
+            scan.status = ArchiveJobStatus.running
+            db.commit()
+            print(f"🔎 Duplicate scan {scan.id}: {len(candidates)} of {scan.files_scanned} files share a size")
+
+            # Stage 2: first and last blocks
+            edge_groups = groups_of_two_or_more(
+                ((item[1], edge_hash), item)
+                for item, edge_hash in bounded_map(lambda item: hash_edges(item[0], item[1]), candidates)
+            )
+            scan.bytes_read = sum(min(size, 2 * DUPLICATE_EDGE_BYTES) for _, size, _ in candidates)
+            del candidates
+            scan.edge_candidates = sum(len(files) for files in edge_groups.values())
+            db.commit()
+            print(f"🔎 Duplicate scan {scan.id}: {scan.edge_candidates} files left after hashing their edges")
+
+            # Stage 3: full content, only where the edges didn't already cover the file
+            keyed = []
+            full_candidates = []
+            for (size, edge_hash), files in edge_groups.items():
+                if covered_by_edges(size):
+                    keyed.extend((edge_hash, item) for item in files)
+                else:
+                    full_candidates.extend(files)
+            keyed.extend(
+                (content_hash, item)
+                for item, content_hash in bounded_map(lambda item: hash_file(item[0]), full_candidates)
+            )
+            scan.bytes_read += sum(size for _, size, _ in full_candidates)
+
+            store_groups(db, scan, groups_of_two_or_more(keyed))
+            scan.status = ArchiveJobStatus.completed
+            db.commit()
+            print(f"✅ Duplicate scan {scan.id}: {scan.duplicate_groups} groups, {scan.reclaimable_bytes} bytes reclaimable")
+            return {"scan_id": scan.id, "status": scan.status.value}
+
+        except Exception as e:
+            db.rollback()
+            scan.status = ArchiveJobStatus.failed
+            scan.error = str(e)
+            db.commit()
+            print(f"❌ Duplicate scan {scan_id} failed: {e}")
+            return {"scan_id": scan_id, "status": "failed", "reason": str(e)}
+    finally:
+        db.close()
+
+
+def start_duplicate_scan(share_name: str = None):
+    db = SessionLocal()
+    try:
+        scan = DuplicateScan(share_name=share_name, status=ArchiveJobStatus.scanning)
+        db.add(scan)
+        db.commit()
+        scan_id = scan.id
+    finally:
+        db.close()
+
+    threading.Thread(target=run_duplicate_scan, args=(scan_id,), daemon=True).start()
+    return {"scan_id": scan_id, "status": "scanning"}
+
+
+def duplicate_report(db: Session, scan_id: int, limit: int = 50, offset: int = 0):
+    """
+    Stored result of a scan, largest reclaimable groups first. None if the scan doesn't exist.
+    """
+    scan = db.query(DuplicateScan).filter(DuplicateScan.id == scan_id).first()
+    if not scan:
+        return None
+
+    groups = db.query(DuplicateGroup)\
+        .filter(DuplicateGroup.scan_id == scan_id)\
+        .order_by(DuplicateGroup.reclaimable_bytes.desc(), DuplicateGroup.id)\
+        .offset(offset)\
+        .limit(limit)\
+        .all()
+    files = defaultdict(list)
+    if groups:
+        for duplicate in db.query(DuplicateFile)\
+                .filter(DuplicateFile.group_id.in_([group.id for group in groups]))\
+                .order_by(DuplicateFile.id):
+            files[duplicate.group_id].append({
+                "full_path": duplicate.full_path,
+                "last_modified_time": duplicate.last_modified_time
+            })
+
+    return {
+        "scan_id": scan.id,
+        "share_name": scan.share_name,
+        "status": scan.status.value,
+        "error": scan.error,
+        "created_at": scan.created_at,
+        "updated_at": scan.updated_at,
+        "files_scanned": scan.files_scanned,
+        "bytes_scanned": scan.bytes_scanned,
+        "size_candidates": scan.size_candidates,
+        "edge_candidates": scan.edge_candidates,
+        "bytes_read": scan.bytes_read,
+        "duplicate_groups": scan.duplicate_groups,
+        "duplicate_files": scan.duplicate_files,
+        "reclaimable_bytes": scan.reclaimable_bytes,
+        "groups": [
+            {
+                "content_hash": group.content_hash,
+                "file_size": group.file_size,
+                "file_count": group.file_count,
+                "reclaimable_bytes": group.reclaimable_bytes,
+                "files": files[group.id]
+            }
+            for group in groups
+        ]
+    }
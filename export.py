@@ -0,0 +1,338 @@
+"""
+Exports scan results and file movement history as partitioned Parquet or Arrow files.
+
+    python export.py movements [--since 2024-01-01] [--format parquet|arrow] [--out DIR]
+    python export.py scan [--share data1] [--source scan|catalog] [--format parquet|arrow] [--out DIR]
+
+Output is laid out as {out}/{dataset}/share={share}/date={YYYY-MM-DD}/part-{export}-00000.parquet
+and is written in record batches, so memory stays flat however many rows are exported.
+Every export writes parts of its own name, through a temporary file renamed once complete,
+so exports of the same partition never overwrite each other or expose half-written parts.
+The API runs exports in the background (start_export) and records them in export_runs.
+"""
+import argparse
+import ntpath
+import os
+import threading
+import uuid
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from database import SessionLocal
+from models import ArchiveJobStatus, ExportRun, FileMetadata, FileMovement
+from netapp_btc import access_CIFS_share, get_first_ip_address, get_svm_data_volumes, walk_files
+
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 100000))
+EXPORT_FORMATS = ("parquet", "arrow")
+
+
+def scan_schema():
+    return pa.schema([
+        ("full_path", pa.string()),
+        ("parent_path", pa.string()),
+        ("file_name", pa.string()),
+        ("extension", pa.string()),
+        ("creation_time", pa.timestamp("s")),
+        ("last_access_time", pa.timestamp("s")),
+        ("last_modified_time", pa.timestamp("s")),
+        ("file_size", pa.int64()),
+        ("scanned_at", pa.timestamp("s")),
+    ])
+
+
+def movement_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("full_path", pa.string()),
+        ("destination_path", pa.string()),
+        ("action_type", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("creation_time", pa.timestamp("s")),
+        ("last_access_time", pa.timestamp("s")),
+        ("last_modified_time", pa.timestamp("s")),
+        ("file_size", pa.int64()),
+        ("stored_size", pa.int64()),
+        ("compression", pa.string()),
+        ("content_hash", pa.string()),
+    ])
+
+
+def share_from_path(full_path):
+    # \\server\share\... -> share
+    parts = full_path.lstrip("\\").split("\\")
+    return parts[1] if len(parts) > 1 else "unknown"
+
+
+class PartitionedWriter:
+    """
+    Buffers rows per (share, date) partition and writes each buffer as one record batch
+    once it reaches chunk_rows. One file is kept open per partition.
+    """
+    def __init__(self, root, schema, file_format="parquet", chunk_rows=EXPORT_CHUNK_ROWS, export_id=None):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed, pip install pyarrow to export")
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {file_format}")
+        self.root = root
+        self.schema = schema
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.export_id = str(export_id) if export_id is not None else uuid.uuid4().hex[:12]
+        self.buffers = {}
+        self.writers = {}
+        self.parts = {}
+        self.files = []
+        self.rows = 0
+
+    def _open(self, partition):
+        share, date = partition
+        directory = os.path.join(self.root, f"share={share}", f"date={date}")
+        os.makedirs(directory, exist_ok=True)
+        # A partition closed earlier in the same export gets a new part, never the same name
+        part = self.parts.get(partition, 0)
+        self.parts[partition] = part + 1
+        path = os.path.join(directory, f"part-{self.export_id}-{part:05d}.{self.file_format}")
+        tmp_path = path + ".tmp"
+        if self.file_format == "parquet":
+            writer = pq.ParquetWriter(tmp_path, self.schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(tmp_path, self.schema)
+        self.writers[partition] = (path, writer)
+        return writer
+
+    def _flush(self, partition):
+        rows = self.buffers.pop(partition, None)
+        if not rows:
+            return
+        columns = {name: [row[name] for row in rows] for name in self.schema.names}
+        batch = pa.RecordBatch.from_pydict(columns, schema=self.schema)
+        writer = self.writers[partition][1] if partition in self.writers else self._open(partition)
+        if self.file_format == "parquet":
+            writer.write_batch(batch)
+        else:
+            writer.write(batch)
+
+    def write(self, share, date, row):
+        partition = (share, date)
+        buffer = self.buffers.setdefault(partition, [])
+        buffer.append(row)
+        self.rows += 1
+        if len(buffer) >= self.chunk_rows:
+            self._flush(partition)
+
+    def close_partition(self, partition):
+        self._flush(partition)
+        if partition in self.writers:
+            path, writer = self.writers.pop(partition)
+            writer.close()
+            os.replace(path + ".tmp", path)
+            self.files.append(path)
+
+    def close_dates_before(self, date):
+        """
+        For input sorted by date: finishes every partition older than date, so only the
+        current day's partitions stay open.
+        """
+        for partition in set(self.buffers) | set(self.writers):
+            if partition[1] < date:
+                self.close_partition(partition)
+
+    def close(self):
+        for partition in set(self.buffers) | set(self.writers):
+            self.close_partition(partition)
+        return {
+            "rows": self.rows,
+            "files": sorted(self.files)
+        }
+
+
+def iter_movements(db, since=None, until=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    query = db.query(FileMovement)
+    if since:
+        query = query.filter(FileMovement.timestamp >= since)
+    if until:
+        query = query.filter(FileMovement.timestamp < until)
+    return query.order_by(FileMovement.timestamp, FileMovement.id).yield_per(chunk_rows)
+
+
+def export_movements(out_dir=EXPORT_DIR, file_format="parquet", since=None, until=None, export_id=None):
+    writer = PartitionedWriter(os.path.join(out_dir, "file_movements"), movement_schema(), file_format, export_id=export_id)
+    db = SessionLocal()
+    current_date = None
+    try:
+        for movement in iter_movements(db, since, until, writer.chunk_rows):
+            date = movement.timestamp.strftime("%Y-%m-%d")
+            if date != current_date:
+                writer.close_dates_before(date)
+                current_date = date
+            writer.write(share_from_path(movement.full_path), date, {
+                "id": movement.id,
+                "full_path": movement.full_path,
+                "destination_path": movement.destination_path,
+                "action_type": movement.action_type.value,
+                "timestamp": movement.timestamp,
+                "creation_time": movement.creation_time,
+                "last_access_time": movement.last_access_time,
+                "last_modified_time": movement.last_modified_time,
+                "file_size": movement.file_size,
+                "stored_size": movement.stored_size,
+                "compression": movement.compression,
+                "content_hash": movement.content_hash,
+            })
+    finally:
+        db.close()
+    result = writer.close()
+    print(f"📤 Exported {result['rows']} movement(s) to {len(result['files'])} file(s)")
+    return result
+
+
+def iter_scan_rows(share_name=None, source="scan", chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Yields (share name, file info with datetime timestamps) from a live walk or the catalog.
+    """
+    if source == "catalog":
+        db = SessionLocal()
+        try:
+            query = db.query(FileMetadata)
+            if share_name:
+                query = query.filter(FileMetadata.share_name == share_name)
+            for entry in query.order_by(FileMetadata.id).yield_per(chunk_rows):
+                yield entry.share_name, {
+                    "full_path": entry.full_path,
+                    "creation_time": entry.creation_time,
+                    "last_access_time": entry.last_access_time,
+                    "last_modified_time": entry.last_modified_time,
+                    "file_size": entry.file_size,
+                }
+        finally:
+            db.close()
+        return
+
+    svm_data = get_svm_data_volumes()
+    if not svm_data:
+        return
+    ip_address = get_first_ip_address(svm_data)
+    for share in svm_data.get('volumes', []):
+        share_path, name = access_CIFS_share(share, ip_address)
+        if not share_path or (share_name and name != share_name):
+            continue
+        for file_info in walk_files(share_path):
+            yield name, {
+                "full_path": file_info['full_path'],
+                "creation_time": datetime.strptime(file_info['creation_time'], '%Y-%m-%d %H:%M:%S'),
+                "last_access_time": datetime.strptime(file_info['last_access_time'], '%Y-%m-%d %H:%M:%S'),
+                "last_modified_time": datetime.strptime(file_info['last_modified_time'], '%Y-%m-%d %H:%M:%S'),
+                "file_size": file_info['file_size'],
+            }
+
+
+def export_scan(out_dir=EXPORT_DIR, file_format="parquet", share_name=None, source="scan", export_id=None):
+    writer = PartitionedWriter(os.path.join(out_dir, "scans"), scan_schema(), file_format, export_id=export_id)
+    scanned_at = datetime.utcnow().replace(microsecond=0)
+    date = scanned_at.strftime("%Y-%m-%d")
+    for name, file_info in iter_scan_rows(share_name, source, writer.chunk_rows):
+        full_path = file_info["full_path"]
+        file_name = ntpath.basename(full_path)
+        writer.write(name, date, {
+            **file_info,
+            "parent_path": ntpath.dirname(full_path),
+            "file_name": file_name,
+            "extension": os.path.splitext(file_name)[1].lower(),
+            "scanned_at": scanned_at,
+        })
+    result = writer.close()
+    print(f"📤 Exported {result['rows']} scanned file(s) to {len(result['files'])} file(s)")
+    return result
+
+
+def run_export(export_id: int, dataset: str, file_format="parquet", share_name=None, source="scan", since=None, until=None):
+    try:
+        if dataset == "movements":
+            result = export_movements(file_format=file_format, since=since, until=until, export_id=export_id)
+        else:
+            result = export_scan(file_format=file_format, share_name=share_name, source=source, export_id=export_id)
+        values = {ExportRun.status: ArchiveJobStatus.completed, ExportRun.rows: result["rows"], ExportRun.files: result["files"]}
+    except Exception as e:
+        print(f"❌ Export {export_id} failed: {e}")
+        values = {ExportRun.status: ArchiveJobStatus.failed, ExportRun.error: str(e)}
+
+    db = SessionLocal()
+    try:
+        db.query(ExportRun).filter(ExportRun.id == export_id).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def start_export(dataset: str, file_format="parquet", share_name=None, source="scan", since=None, until=None):
+    """
+    Records an export and runs it in a background thread. Returns its id; progress is in export_runs.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed, pip install pyarrow to export")
+
+    db = SessionLocal()
+    try:
+        run = ExportRun(dataset=dataset, file_format=file_format, share_name=share_name, status=ArchiveJobStatus.running)
+        db.add(run)
+        db.commit()
+        export_id = run.id
+    finally:
+        db.close()
+
+    threading.Thread(
+        target=run_export, args=(export_id, dataset, file_format, share_name, source, since, until), daemon=True
+    ).start()
+    return {"export_id": export_id, "status": "running"}
+
+
+def export_summary(db, export_id: int):
+    """
+    State of an export started with start_export(), None if it doesn't exist.
+    """
+    run = db.query(ExportRun).filter(ExportRun.id == export_id).first()
+    if not run:
+        return None
+    return {
+        "export_id": run.id,
+        "dataset": run.dataset,
+        "format": run.file_format,
+        "share_name": run.share_name,
+        "status": run.status.value,
+        "error": run.error,
+        "rows": run.rows,
+        "files": run.files or [],
+        "created_at": run.created_at,
+        "updated_at": run.updated_at
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Storage Optimizer data for analytics")
+    parser.add_argument("dataset", choices=["scan", "movements"])
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="parquet")
+    parser.add_argument("--out", default=EXPORT_DIR, help="Output directory")
+    parser.add_argument("--share", default=None, help="Only this share (scan only)")
+    parser.add_argument("--source", choices=["scan", "catalog"], default="scan", help="Walk the shares or read the catalog (scan only)")
+    parser.add_argument("--since", default=None, help="Movements at or after this date, YYYY-MM-DD")
+    parser.add_argument("--until", default=None, help="Movements before this date, YYYY-MM-DD")
+    args = parser.parse_args()
+
+    if args.dataset == "movements":
+        since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+        until = datetime.strptime(args.until, "%Y-%m-%d") if args.until else None
+        export_movements(args.out, args.format, since, until)
+    else:
+        export_scan(args.out, args.format, args.share, args.source)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+import argparse
+import csv
+import math
 import os
 import random
 import string
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
 base_paths = [
@@ -10,43 +14,198 @@ base_paths = [
 
 file_extensions = ['.docx', '.png', '.txt', '.pdf', '.csv', '.json', '.jpg']
 
-def random_string(length=8):
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
+# full: random bytes (slow, realistic content)
+# sparse: file is extended to its size without writing data (holes on NTFS/ext4/WAFL)
+# empty: zero-byte files, the intended size is only recorded in the manifest
+CONTENT_MODES = ('full', 'sparse', 'empty')
+
+# Age distributions used for access/modification times, in days before "now"
+AGE_DISTRIBUTIONS = ('uniform', 'exponential', 'lognormal')
+
+MANIFEST_FIELDS = ['full_path', 'file_size', 'creation_time', 'last_access_time', 'last_modified_time']
+
+
+def random_string(length=8, rng=random):
+    return ''.join(rng.choices(string.ascii_letters + string.digits, k=length))
+
 
 def simulate_file_usage(file_path, usage_count):
+    # Kept for backwards compatibility, only the last os.utime call ever mattered
     now = datetime.now()
-    for _ in range(usage_count):
-        access_time = now - timedelta(days=random.randint(0, 365))
-        os.utime(file_path, (access_time.timestamp(), access_time.timestamp()))
+    access_time = now - timedelta(days=random.randint(0, 365))
+    os.utime(file_path, (access_time.timestamp(), access_time.timestamp()))
+
+
+def random_age_days(rng, distribution, max_age_days):
+    if distribution == 'exponential':
+        # Most files are recent, with a long cold tail
+        age = rng.expovariate(1.0 / max(max_age_days / 4.0, 1.0))
+    elif distribution == 'lognormal':
+        age = rng.lognormvariate(math.log(max(max_age_days / 6.0, 1.0)), 1.0)
+    else:
+        age = rng.uniform(0, max_age_days)
+    return min(age, max_age_days)
+
+
+def random_timestamps(rng, now, distribution, max_age_days):
+    modified_days = random_age_days(rng, distribution, max_age_days)
+    # A file is never accessed before it was last modified
+    access_days = rng.uniform(0, modified_days)
+    modified = now - timedelta(days=modified_days)
+    accessed = now - timedelta(days=access_days)
+    return accessed.timestamp(), modified.timestamp()
+
+
+def write_file(file_path, size, mode):
+    with open(file_path, 'wb') as f:
+        if mode == 'full':
+            remaining = size
+            while remaining > 0:
+                chunk = min(remaining, 1024 * 1024)
+                f.write(os.urandom(chunk))
+                remaining -= chunk
+        elif mode == 'sparse' and size > 0:
+            f.truncate(size)
+
+
+def generate_tree(folder_path, num_folders, num_files, max_depth, options, rng, now, manifest_rows):
+    os.makedirs(folder_path, exist_ok=True)
+    count = num_files
+
+    for _ in range(num_files):
+        file_name = f"{random_string(rng=rng)}{rng.choice(file_extensions)}"
+        file_path = os.path.join(folder_path, file_name)
 
-def generate_files_and_folders(base_path, num_folders=5, num_files=20, max_depth=3):
-    for _ in range(num_folders):
-        folder_name = random_string()
-        folder_path = os.path.join(base_path, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
+        size = rng.randint(options['min_size'], options['max_size'])
+        write_file(file_path, size, options['mode'])
 
-        for _ in range(num_files):
-            file_name = f"{random_string()}{random.choice(file_extensions)}"
-            file_path = os.path.join(folder_path, file_name)
+        atime, mtime = random_timestamps(rng, now, options['age_distribution'], options['max_age_days'])
+        os.utime(file_path, (atime, mtime))
 
-            content_size = random.randint(1, 1024 * 1024) 
-            with open(file_path, 'wb') as f:
-                f.write(os.urandom(content_size))
+        if manifest_rows is not None:
+            manifest_rows.append({
+                'full_path': file_path,
+                'file_size': size,
+                'creation_time': datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                'last_access_time': datetime.fromtimestamp(atime).strftime('%Y-%m-%d %H:%M:%S'),
+                'last_modified_time': datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'),
+            })
 
-            usage_count = random.randint(1, 10)
-            simulate_file_usage(file_path, usage_count)
+    if max_depth > 1:
+        for _ in range(num_folders // 2):
+            sub_path = os.path.join(folder_path, random_string(rng=rng))
+            count += generate_tree(sub_path, num_folders // 2, num_files // 2, max_depth - 1, options, rng, now, manifest_rows)
+
+    return count
+
+
+def generate_top_folder(folder_path, num_folders, num_files, max_depth, options, seed, collect_manifest):
+    """
+    Generates one top-level folder. Runs in a worker process so folders are built in parallel.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    manifest_rows = [] if collect_manifest else None
+    count = generate_tree(folder_path, num_folders, num_files, max_depth, options, rng, now, manifest_rows)
+    return folder_path, count, manifest_rows or []
+
+
+def generate_files_and_folders(base_path, num_folders=5, num_files=20, max_depth=3, mode='full',
+                               min_size=1, max_size=1024 * 1024, age_distribution='uniform',
+                               max_age_days=365, workers=None, manifest_path=None, seed=None):
+    """
+    Builds a synthetic tree under base_path, one top-level folder per parallel task.
+    Returns the number of generated files.
+    """
+    options = {
+        'mode': mode,
+        'min_size': min_size,
+        'max_size': max_size,
+        'age_distribution': age_distribution,
+        'max_age_days': max_age_days,
+    }
+    master_rng = random.Random(seed)
+    collect_manifest = manifest_path is not None
+    generated = 0
+
+    manifest_file = open(manifest_path, 'w', newline='') if collect_manifest else None
+    try:
+        writer = None
+        if manifest_file:
+            writer = csv.DictWriter(manifest_file, fieldnames=MANIFEST_FIELDS)
+            writer.writeheader()
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    generate_top_folder,
+                    os.path.join(base_path, random_string(rng=master_rng)),
+                    num_folders, num_files, max_depth, options,
+                    master_rng.getrandbits(64), collect_manifest
+                )
+                for _ in range(num_folders)
+            ]
+            for future in as_completed(futures):
+                folder_path, count, rows = future.result()
+                if writer:
+                    writer.writerows(rows)
+                generated += count
+                print(f"Generated folder: {folder_path}")
+    finally:
+        if manifest_file:
+            manifest_file.close()
+
+    return generated
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic file trees for load testing")
+    parser.add_argument('paths', nargs='*', default=base_paths, help="Base paths to populate")
+    parser.add_argument('--mode', choices=CONTENT_MODES, default='full')
+    parser.add_argument('--folders', type=int, default=10, help="Sub-folders per folder")
+    parser.add_argument('--files', type=int, default=50, help="Files per folder")
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--min-size', type=int, default=1)
+    parser.add_argument('--max-size', type=int, default=1024 * 1024)
+    parser.add_argument('--age-distribution', choices=AGE_DISTRIBUTIONS, default='uniform')
+    parser.add_argument('--max-age-days', type=int, default=365)
+    parser.add_argument('--workers', type=int, default=None, help="Parallel worker processes (default: CPU count)")
+    parser.add_argument('--manifest', default=None, help="Write a CSV manifest per base path (suffixed with the share name)")
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args()
 
-        if max_depth > 1:
-            generate_files_and_folders(folder_path, num_folders // 2, num_files // 2, max_depth - 1)
 
 def main():
-    for base_path in base_paths:
+    args = parse_args()
+    for base_path in args.paths:
         if not os.path.exists(base_path):
             print(f"Path does not exist: {base_path}. Skipping...")
             continue
 
-        generate_files_and_folders(base_path, num_folders=10, num_files=50, max_depth=3)
-        print(f"Files and folders generated in: {base_path}")
+        manifest_path = None
+        if args.manifest:
+            root, ext = os.path.splitext(args.manifest)
+            share = os.path.basename(os.path.normpath(base_path)) or 'share'
+            manifest_path = f"{root}_{share}{ext or '.csv'}"
+
+        generated = generate_files_and_folders(
+            base_path,
+            num_folders=args.folders,
+            num_files=args.files,
+            max_depth=args.depth,
+            mode=args.mode,
+            min_size=args.min_size,
+            max_size=args.max_size,
+            age_distribution=args.age_distribution,
+            max_age_days=args.max_age_days,
+            workers=args.workers,
+            manifest_path=manifest_path,
+            seed=args.seed,
+        )
+        print(f"Files and folders generated in: {base_path} ({generated} files)")
+        if manifest_path:
+            print(f"Manifest written to: {manifest_path}")
+
 
 if __name__ == "__main__":
     main()
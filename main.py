@@ -1,9 +1,15 @@
 from io import BytesIO
-from typing import Dict, List, Optional
-from datetime import timedelta
-from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+from datetime import datetime, timedelta
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from passlib.hash import bcrypt
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordRequestForm
@@ -16,10 +22,24 @@ from fastapi.openapi.docs import get_swagger_ui_html
 
 
 
-from database import SessionLocal, engine, Base, get_db
+from database import get_async_db
 from models import PendingUser, Role, User
-from netapp_interfaces import archive_filtered_files, move_file, restore_file
-from schemas import ArchiveFilterRequest, BaseResponse, FileInfo, RegistrationRequests, RestoreRequest, UserCreate, UserValues
+from models import ActionType, ArchiveFileState, ArchiveJob, ArchiveJobFile, ArchivePolicy, FileMovement
+from netapp_interfaces import move_file, restore_file
+from sampling import sample_volume
+from export import export_summary, start_export
+from netapp_btc import get_svm_data_volumes
+from transfer_scheduler import scheduler as transfer_scheduler
+from placement import placement
+from startup import readiness, start_warmup
+from restore_history import rebuild_restore_stats, restore_history_report
+from duplicates import duplicate_report, start_duplicate_scan
+from profiling import enable_memory_tracing, get_session, list_sessions, memory_report, start_sampling
+from movement_history import HISTORY_MAX_PAGE_SIZE, HISTORY_PAGE_SIZE, build_history_page, history_query
+from archive_reader import archived_size, iter_archived_range, parse_range_header
+from netapp_btc import normalize_path
+from archive_jobs import archive_filtered_files, enqueue_archive_job, resume_incomplete_jobs, start_archive_job
+from schemas import ExportRequest, ArchiveEstimateRequest, ArchiveFilterRequest, ArchiveJobFileStatus, ArchiveJobStatusResponse, ArchivePolicyRequest, ArchivePolicyResponse, BaseResponse, DuplicateScanRequest, FileInfo, FileMovementPage, MemoryTracingRequest, ProfilingRequest, RegistrationRequests, RestoreRequest, UserCreate, UserValues
 from services import get_user_id_by_username, verify_manager
 from auth import ALGORITHM, SECRET_KEY, create_access_token, get_current_user
 
@@ -47,20 +67,35 @@ def create_admin_user(db: Session):
         print("Admin user already exists.")
 
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema, admin user, DB pool, SMB sessions and ONTAP topology are set up in the
+    # background so the process starts serving /healthz right away. Jobs interrupted by a
+    # restart continue from their last checkpoint once the database is reachable.
+    start_warmup(create_admin_user, after_database=resume_incomplete_jobs)
+    yield
 
-db = SessionLocal()
-try:
-    create_admin_user(db)
-finally:
-    db.close()
 
-app = FastAPI(docs_url=None, redoc_url=None)
+app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+@app.get("/healthz", include_in_schema=False)
+def liveness():
+    return {"status": "alive"}
+
+
+@app.get("/readyz", include_in_schema=False)
+def readiness_probe():
+    ready = readiness.is_ready()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=jsonable_encoder({"status": "ready" if ready else "starting", **readiness.snapshot()})
+    )
+
+
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui_html():
     return get_swagger_ui_html(
@@ -97,25 +132,26 @@ async def redoc_html():
 
 
 @app.post("/register", response_model=BaseResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     if not user.is_valid_password:
         raise HTTPException(status_code=422, detail="Password must be at least 8 characters long and contain at least one uppercase letter.")
 
     if user.password != user.verify_password:
         raise HTTPException(status_code=400, detail="Passwords do not match.")
 
-    existing_user = db.query(User).filter(User.email == user.email).first()
-    existing_pending_user = db.query(PendingUser).filter(PendingUser.email == user.email).first()
+    existing_user = await db.scalar(select(User).filter(User.email == user.email))
+    existing_pending_user = await db.scalar(select(PendingUser).filter(PendingUser.email == user.email))
     
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered.")
     if existing_pending_user:
         raise HTTPException(status_code=400, detail="Your registration is still pending approval.")
 
-    if db.query(User).filter(User.username == user.username).first() or db.query(PendingUser).filter(PendingUser.username == user.username).first():
+    if await db.scalar(select(User).filter(User.username == user.username)) or await db.scalar(select(PendingUser).filter(PendingUser.username == user.username)):
         raise HTTPException(status_code=400, detail="Username already taken.")
 
-    hashed_password = bcrypt.hash(user.password)
+    # bcrypt is deliberately slow, keep it off the event loop
+    hashed_password = await run_in_threadpool(bcrypt.hash, user.password)
     new_pending_user = PendingUser(
         username=user.username,
         email=user.email,
@@ -123,18 +159,17 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         registration_request_description=user.registration_request_description
     )
     db.add(new_pending_user)
-    db.commit()
-    db.refresh(new_pending_user)
+    await db.commit()
 
     return {"message": "User registration request created", "user_id": new_pending_user.id}
 
 @app.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).filter(User.email == form_data.username))
 
-    if not user or not bcrypt.verify(form_data.password, user.hashed_password):
-        pending_user = db.query(PendingUser).filter(PendingUser.email == form_data.username).first()
-        if pending_user and bcrypt.verify(form_data.password, pending_user.hashed_password):
+    if not user or not await run_in_threadpool(bcrypt.verify, form_data.password, user.hashed_password):
+        pending_user = await db.scalar(select(PendingUser).filter(PendingUser.email == form_data.username))
+        if pending_user and await run_in_threadpool(bcrypt.verify, form_data.password, pending_user.hashed_password):
             raise HTTPException(status_code=403, detail="Your account is still pending approval.")
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
@@ -147,7 +182,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     return {"access_token": token, "token_type": "bearer"}
 
 @app.get("/me", response_model=UserValues)
-def get_user_info(current_user=Depends(get_current_user)):
+async def get_user_info(current_user=Depends(get_current_user)):
     return {
         "user_id": current_user.id,
         "username": current_user.username,
@@ -157,11 +192,11 @@ def get_user_info(current_user=Depends(get_current_user)):
 
 
 @app.get("/registration-requests", response_model=List[RegistrationRequests])
-def get_registration_requests(
-    db: Session = Depends(get_db), 
+async def get_registration_requests(
+    db: AsyncSession = Depends(get_async_db), 
     user: User = Depends(verify_manager)
 ):
-    pending_users = db.query(PendingUser).all()
+    pending_users = (await db.scalars(select(PendingUser))).all()
     return [
         RegistrationRequests(
             user_id=pending_user.id,
@@ -172,12 +207,12 @@ def get_registration_requests(
     ]
 
 @app.post("/registration-requests/{pending_user_id}/approve-registration/")
-def approve_registration(
+async def approve_registration(
     pending_user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(verify_manager)
 ):
-    pending_user = db.query(PendingUser).filter(PendingUser.id == pending_user_id).first()
+    pending_user = await db.get(PendingUser, pending_user_id)
     
     if not pending_user:
         raise HTTPException(
@@ -193,19 +228,18 @@ def approve_registration(
         date_created=pending_user.date_created
     )
     db.add(approved_user)
-    db.delete(pending_user)
-    db.commit()
-    db.refresh(approved_user)
+    await db.delete(pending_user)
+    await db.commit()
     return {"message": "User approved", "user_id": approved_user.id}
 
 
 @app.delete("/registration-requests/{pending_user_id}/deny-registration/")
-def deny_registration(
+async def deny_registration(
     pending_user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(verify_manager)
 ):
-    pending_user = db.query(PendingUser).filter(PendingUser.id == pending_user_id).first()
+    pending_user = await db.get(PendingUser, pending_user_id)
     
     if not pending_user:
         raise HTTPException(
@@ -213,15 +247,15 @@ def deny_registration(
             detail="Pending user not found"
         )
 
-    db.delete(pending_user)
-    db.commit()
+    await db.delete(pending_user)
+    await db.commit()
     return {"message": "User denied and removed from pending registrations", "user_id": pending_user_id}
 
 
 @app.post("/promote_user/{username}", response_model=dict)
-def promote_user_to_manager(
+async def promote_user_to_manager(
     username: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(verify_manager)
 ):
     if current_user.role != Role.manager:
@@ -230,7 +264,7 @@ def promote_user_to_manager(
             detail="Only managers can promote users"
         )
     
-    user_to_promote = db.query(User).filter(User.username == username).first()
+    user_to_promote = await db.scalar(select(User).filter(User.username == username))
     
     if not user_to_promote:
         raise HTTPException(
@@ -245,15 +279,14 @@ def promote_user_to_manager(
         )
     
     user_to_promote.role = Role.manager
-    db.commit()
-    db.refresh(user_to_promote)
+    await db.commit()
 
     return {"message": f"User '{username}' promoted to manager", "user_id": user_to_promote.id}
 
 @app.post("/downgrade_user/{username}", response_model=dict)
-def downgrade_user_to_viewonly(
+async def downgrade_user_to_viewonly(
     username: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(verify_manager)
 ):
     if current_user.role != Role.manager:
@@ -262,7 +295,7 @@ def downgrade_user_to_viewonly(
             detail="Only managers can downgrade users"
         )
     
-    user_to_downgrade = db.query(User).filter(User.username == username).first()
+    user_to_downgrade = await db.scalar(select(User).filter(User.username == username))
     
     if not user_to_downgrade:
         raise HTTPException(
@@ -277,22 +310,25 @@ def downgrade_user_to_viewonly(
         )
     
     user_to_downgrade.role = Role.viewonly
-    db.commit()
-    db.refresh(user_to_downgrade)
+    await db.commit()
 
     return {"message": f"User '{username}' downgraded to viewonly", "user_id": user_to_downgrade.id}
 
 @app.post("/archive-file", response_model=dict)
-def archive_file(
+async def archive_file(
     file_info: FileInfo,
     request: Request,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(verify_manager)
 ):
     try:
-        result = move_file(file_info.dict())
+        # The copy blocks on SMB, run it on the thread pool
+        result, movement = await run_in_threadpool(move_file, file_info.dict())
         if not result:
             raise ValueError("move_file returned False. File may not exist, be accessible, or metadata failed.")
-        return {"message": "File archived successfully", "archived_path": result}
+        db.add(movement)
+        await db.commit()
+        return {"message": "File archived successfully", "archived_path": result, "movement_id": movement.id}
 
     except Exception as e:
         print(f"[ERROR] /archive-file failed\n  Path: {file_info.full_path}\n  Reason: {str(e)}")
@@ -308,7 +344,8 @@ def restore_archived_file(
     try:
         result = restore_file(
             archive_folder=restore_request.archive_folder,
-            filename=restore_request.filename
+            filename=restore_request.filename,
+            movement_id=restore_request.movement_id
         )
         if not result:
             raise ValueError(f"restore_file returned False. File '{restore_request.filename}' may not exist in metadata or restoration failed.")
@@ -320,26 +357,550 @@ def restore_archived_file(
 
 
 
-@app.post("/archive-filtered-files", response_model=dict)
-def archive_filtered_files_endpoint(
-    filter_request: ArchiveFilterRequest,
-    current_user: User = Depends(verify_manager)
-):
-    filters = {
+def request_filters(filter_request):
+    return {
         "file_type": filter_request.file_type,
         "date_filters": filter_request.date_filters.dict() if filter_request.date_filters else {},
         "min_size": filter_request.min_size,
         "max_size": filter_request.max_size,
     }
 
+
+@app.post("/archive-filtered-files", response_model=dict)
+def archive_filtered_files_endpoint(
+    filter_request: ArchiveFilterRequest,
+    current_user: User = Depends(verify_manager)
+):
+    filters = request_filters(filter_request)
+
+    if filter_request.distributed:
+        return enqueue_archive_job(
+            filters=filters,
+            blacklist=filter_request.blacklist or [],
+            share_name=filter_request.share_name,
+            pack_small_files=filter_request.pack_small_files
+        )
+
     result = archive_filtered_files(
         filters=filters,
         blacklist=filter_request.blacklist or [],
-        share_name=filter_request.share_name
+        share_name=filter_request.share_name,
+        source=filter_request.source,
+        pack_small_files=filter_request.pack_small_files
     )
 
     return result
 
+
+@app.post("/archive-estimate", response_model=dict)
+def estimate_archive_candidates(
+    estimate_request: ArchiveEstimateRequest,
+    current_user: User = Depends(verify_manager)
+):
+    svm_data = get_svm_data_volumes()
+    if not svm_data:
+        raise HTTPException(status_code=500, detail="No SVM volumes found")
+
+    result = sample_volume(
+        svm_data,
+        estimate_request.share_name,
+        request_filters(estimate_request),
+        estimate_request.blacklist or [],
+        probes=estimate_request.probes,
+        time_budget=estimate_request.time_budget_seconds,
+        confidence=estimate_request.confidence,
+        seed=estimate_request.seed
+    )
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Share {estimate_request.share_name} not found"
+        )
+    return result
+
+
+@app.post("/exports", response_model=dict)
+def export_data(
+    export_request: ExportRequest,
+    current_user: User = Depends(verify_manager)
+):
+    # Runs in the background, progress is on GET /exports/{export_id}
+    try:
+        return start_export(
+            export_request.dataset,
+            file_format=export_request.format,
+            share_name=export_request.share_name,
+            source=export_request.source,
+            since=export_request.since,
+            until=export_request.until
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/exports/{export_id}", response_model=dict)
+async def get_export(
+    export_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    summary = await db.run_sync(export_summary, export_id)
+    if not summary:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export not found"
+        )
+    return summary
+
+
+def job_file_bytes_copied(job_file: ArchiveJobFile):
+    if job_file.state in (ArchiveFileState.pending, ArchiveFileState.failed):
+        return job_file.bytes_copied or 0
+    return job_file.file_size or 0
+
+
+def job_totals_query(job_id: int = None):
+    """
+    (job_id, state, files, bytes, bytes copied) per job and file state, counted in the database
+    so listing jobs doesn't load their files. Copied bytes follow job_file_bytes_copied().
+    """
+    copied = case(
+        (ArchiveJobFile.state.in_([ArchiveFileState.pending, ArchiveFileState.failed]), func.coalesce(ArchiveJobFile.bytes_copied, 0)),
+        else_=func.coalesce(ArchiveJobFile.file_size, 0)
+    )
+    query = select(
+        ArchiveJobFile.job_id,
+        ArchiveJobFile.state,
+        func.count(ArchiveJobFile.id),
+        func.sum(func.coalesce(ArchiveJobFile.file_size, 0)),
+        func.sum(copied)
+    ).group_by(ArchiveJobFile.job_id, ArchiveJobFile.state)
+    if job_id is not None:
+        query = query.filter(ArchiveJobFile.job_id == job_id)
+    return query
+
+
+def collect_job_totals(rows):
+    """
+    {job_id: (file_counts, total_bytes, bytes_copied)} from the rows of job_totals_query().
+    """
+    totals = {}
+    for job_id, state, count, size, copied in rows:
+        file_counts, total_bytes, bytes_copied = totals.get(job_id, ({}, 0, 0))
+        file_counts[state.value] = count
+        totals[job_id] = (file_counts, total_bytes + int(size or 0), bytes_copied + int(copied or 0))
+    return totals
+
+
+def build_job_status(job: ArchiveJob, totals, files: list = None):
+    file_counts, total_bytes, bytes_copied = totals or ({}, 0, 0)
+    return ArchiveJobStatusResponse(
+        job_id=job.id,
+        share_name=job.share_name,
+        status=job.status.value,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        file_counts=file_counts,
+        total_bytes=total_bytes,
+        bytes_copied=bytes_copied,
+        bytes_in=job.bytes_in or 0,
+        bytes_stored=job.bytes_stored or 0,
+        capacity_saved=(job.bytes_in or 0) - (job.bytes_stored or 0),
+        compression_cpu_seconds=job.compression_cpu_seconds or 0.0,
+        files=[
+            ArchiveJobFileStatus(
+                id=job_file.id,
+                full_path=job_file.full_path,
+                destination_path=job_file.destination_path,
+                file_size=job_file.file_size,
+                bytes_copied=job_file_bytes_copied(job_file),
+                progress=round(job_file_bytes_copied(job_file) / job_file.file_size, 4) if job_file.file_size else 1.0,
+                compression=job_file.compression,
+                stored_size=job_file.stored_size,
+                state=job_file.state.value,
+                error=job_file.error
+            )
+            for job_file in files or []
+        ]
+    )
+
+
+@app.get("/archive-jobs", response_model=List[ArchiveJobStatusResponse])
+async def list_archive_jobs(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    jobs = (await db.scalars(select(ArchiveJob).order_by(ArchiveJob.id.desc()))).all()
+    totals = collect_job_totals((await db.execute(job_totals_query())).all())
+    return [build_job_status(job, totals.get(job.id)) for job in jobs]
+
+
+@app.get("/archive-jobs/{job_id}", response_model=ArchiveJobStatusResponse)
+async def get_archive_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    job = await db.scalar(select(ArchiveJob).options(selectinload(ArchiveJob.files)).filter(ArchiveJob.id == job_id))
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archive job not found"
+        )
+    totals = collect_job_totals((await db.execute(job_totals_query(job_id))).all())
+    return build_job_status(job, totals.get(job.id), job.files)
+
+
+@app.post("/archive-jobs/{job_id}/resume", response_model=dict)
+def resume_archive_job(
+    job_id: int,
+    current_user: User = Depends(verify_manager)
+):
+    # Runs in the background, progress is on GET /archive-jobs/{job_id}
+    result = start_archive_job(job_id)
+    if result.get("status") == "not_found":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archive job not found"
+        )
+    return result
+
+
+@app.get("/transfers/scheduler", response_model=dict)
+async def get_transfer_scheduler(
+    current_user: User = Depends(verify_manager)
+):
+    return transfer_scheduler.snapshot()
+
+
+@app.get("/archive-targets", response_model=dict)
+async def get_archive_targets(
+    current_user: User = Depends(verify_manager)
+):
+    return placement.snapshot()
+
+
+@app.get("/reports/restore-history", response_model=dict)
+async def get_restore_history_report(
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    return await db.run_sync(restore_history_report, limit)
+
+
+@app.get("/history", response_model=FileMovementPage)
+async def get_movement_history(
+    share_name: Optional[str] = None,
+    action_type: Optional[ActionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    search: Optional[str] = Query(None, min_length=3, description="Substring of the original path"),
+    cursor: Optional[str] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        query = history_query(
+            share_name=share_name,
+            action_type=action_type,
+            since=since,
+            until=until,
+            min_size=min_size,
+            max_size=max_size,
+            search=search,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    movements = (await db.scalars(query)).all()
+    return build_history_page(movements, limit)
+
+
+@app.post("/reports/restore-history/rebuild", response_model=dict)
+async def rebuild_restore_history(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    count = await db.run_sync(rebuild_restore_stats)
+    return {"message": "Restore history rebuilt", "restored_files": count}
+
+
+@app.post("/duplicates", response_model=dict)
+def start_duplicate_report(
+    scan_request: DuplicateScanRequest,
+    current_user: User = Depends(verify_manager)
+):
+    return start_duplicate_scan(scan_request.share_name)
+
+
+@app.get("/duplicates/{scan_id}", response_model=dict)
+async def get_duplicate_report(
+    scan_id: int,
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    report = await db.run_sync(duplicate_report, scan_id, limit, offset)
+    if not report:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Duplicate scan not found"
+        )
+    return report
+
+
+@app.post("/profiling/sessions", response_model=dict)
+async def start_profiling_session(
+    profiling_request: ProfilingRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    if profiling_request.job_id is not None:
+        job = await db.get(ArchiveJob, profiling_request.job_id)
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Archive job not found"
+            )
+        if job.distributed:
+            # Its tasks run in worker.py processes, the API process never sees them
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Distributed jobs run on the workers and can't be profiled from the API"
+            )
+    session = start_sampling(profiling_request.job_id, profiling_request.duration_seconds, profiling_request.interval_ms)
+    return session.summary()
+
+
+@app.get("/profiling/sessions", response_model=list)
+async def get_profiling_sessions(
+    current_user: User = Depends(verify_manager)
+):
+    return list_sessions()
+
+
+def find_profiling_session(session_id: int):
+    session = get_session(session_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiling session not found"
+        )
+    return session
+
+
+@app.get("/profiling/sessions/{session_id}")
+async def get_profiling_session(
+    session_id: int,
+    format: Literal["json", "collapsed"] = Query("json", description="collapsed: flamegraph.pl / speedscope input"),
+    current_user: User = Depends(verify_manager)
+):
+    session = find_profiling_session(session_id)
+    if format == "collapsed":
+        return PlainTextResponse(session.collapsed())
+    return {**session.summary(), "stacks": session.stack_counts()}
+
+
+@app.post("/profiling/sessions/{session_id}/stop", response_model=dict)
+async def stop_profiling_session(
+    session_id: int,
+    current_user: User = Depends(verify_manager)
+):
+    session = find_profiling_session(session_id)
+    session.stop()
+    await run_in_threadpool(session.join, 5)
+    return session.summary()
+
+
+@app.put("/profiling/memory", response_model=dict)
+async def set_memory_tracing(
+    tracing_request: MemoryTracingRequest,
+    current_user: User = Depends(verify_manager)
+):
+    return {"tracing": enable_memory_tracing(tracing_request.enabled)}
+
+
+@app.get("/profiling/memory", response_model=dict)
+async def get_memory_report(
+    current_user: User = Depends(verify_manager)
+):
+    return memory_report()
+
+
+def policy_to_response(policy: ArchivePolicy):
+    return ArchivePolicyResponse(
+        id=policy.id,
+        name=policy.name,
+        share_name=policy.share_name,
+        filters=policy.filters or {},
+        blacklist=policy.blacklist or [],
+        high_watermark=policy.high_watermark,
+        low_watermark=policy.low_watermark,
+        priority=policy.priority,
+        source=policy.source,
+        pack_small_files=policy.pack_small_files,
+        enabled=policy.enabled,
+        last_run_at=policy.last_run_at
+    )
+
+
+@app.get("/archive-policies", response_model=List[ArchivePolicyResponse])
+async def list_archive_policies(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    policies = (await db.scalars(select(ArchivePolicy).order_by(ArchivePolicy.priority.desc(), ArchivePolicy.id))).all()
+    return [policy_to_response(policy) for policy in policies]
+
+
+@app.put("/archive-policies", response_model=ArchivePolicyResponse)
+async def save_archive_policy(
+    policy_request: ArchivePolicyRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    if policy_request.low_watermark >= policy_request.high_watermark:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="low_watermark must be below high_watermark"
+        )
+
+    policy = await db.scalar(select(ArchivePolicy).filter(ArchivePolicy.name == policy_request.name))
+    if not policy:
+        policy = ArchivePolicy(name=policy_request.name)
+        db.add(policy)
+
+    policy.share_name = policy_request.share_name
+    policy.filters = request_filters(policy_request)
+    policy.blacklist = policy_request.blacklist or []
+    policy.high_watermark = policy_request.high_watermark
+    policy.low_watermark = policy_request.low_watermark
+    policy.priority = policy_request.priority
+    policy.source = policy_request.source
+    policy.pack_small_files = policy_request.pack_small_files
+    policy.enabled = policy_request.enabled
+    await db.commit()
+    await db.refresh(policy)
+    return policy_to_response(policy)
+
+
+@app.delete("/archive-policies/{policy_id}", response_model=dict)
+async def delete_archive_policy(
+    policy_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(verify_manager)
+):
+    policy = await db.get(ArchivePolicy, policy_id)
+    if not policy:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archive policy not found"
+        )
+    # Jobs started by the policy stay for their history, the scheduler just stops using it
+    policy.enabled = False
+    await db.commit()
+    return {"message": f"Archive policy '{policy.name}' disabled", "policy_id": policy.id}
+
+
+async def find_archived_movement(db: AsyncSession, movement: Optional[FileMovement]):
+    """
+    Returns the movement if its file is still in the archive, i.e. not restored since.
+    """
+    if not movement or movement.action_type != ActionType.moved_to_archive:
+        return None
+    restored = await db.scalar(
+        select(FileMovement.id)
+        .filter(FileMovement.full_path == movement.full_path)
+        .filter(FileMovement.action_type == ActionType.restored_from_archive)
+        .filter(FileMovement.id > movement.id)
+        .limit(1)
+    )
+    return None if restored else movement
+
+
+def stream_archived_file(movement: FileMovement, request: Request):
+    size = archived_size(movement)
+    filename = movement.full_path.rsplit("\\", 1)[-1]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{filename}"'
+    }
+
+    try:
+        byte_range = parse_range_header(request.headers.get("range"), size)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    if byte_range is None:
+        if size == 0:
+            headers["Content-Length"] = "0"
+            return StreamingResponse(iter([]), media_type="application/octet-stream", headers=headers)
+        start, end = 0, size - 1
+        status_code = status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_archived_range(movement, start, end),
+        status_code=status_code,
+        media_type="application/octet-stream",
+        headers=headers
+    )
+
+
+@app.get("/archive/files/{movement_id}/content")
+async def read_archived_file(
+    movement_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    movement = await db.get(FileMovement, movement_id)
+    movement = await find_archived_movement(db, movement)
+    if not movement:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archived file not found"
+        )
+    return stream_archived_file(movement, request)
+
+
+@app.get("/archive/content")
+async def read_archived_file_by_path(
+    path: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    movement = await db.scalar(
+        select(FileMovement)
+        .filter(FileMovement.full_path == normalize_path(path))
+        .order_by(FileMovement.id.desc())
+        .limit(1)
+    )
+    movement = await find_archived_movement(db, movement)
+    if not movement:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archived file not found"
+        )
+    return stream_archived_file(movement, request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # React app running on port 3000
@@ -0,0 +1,358 @@
+"""
+Local stand-in for the ONTAP REST endpoints used by ontap_client.py, for running and
+benchmarking topology discovery without a cluster.
+
+    python mock_ontap.py [--port 8080] [--latency-ms 20] [--extra-shares 500] [--fail-rate 0.1]
+
+Serves svm/svms, network/ip/interfaces, protocols/cifs/shares and storage/volumes with
+ONTAP-style query filters (exact, * wildcards, | alternatives), fields projection and
+max_records paging through _links.next. --fail-rate answers that share of requests with
+503 to exercise the client's retries.
+
+Volume snapshots can be listed, created and deleted (storage/volumes/{uuid}/snapshots,
+polled through cluster/jobs). With --tree-root the data shares are directories below it
+(root/192.168.16.14/data1, ... as mapped by SHARE_MOUNTS) and a snapshot is a frozen copy
+in the share's ~snapshot directory. --tree-version writes a sample tree to scan: 1 is the
+base tree, 2 changes a few directories of data1 in place, so snapshot_scan.py can be
+tried against two versions of the same share:
+
+    python mock_ontap.py --tree-root /tmp/filer --tree-version 1    # then scan
+    python mock_ontap.py --tree-root /tmp/filer --tree-version 2    # then scan again
+"""
+import argparse
+import fnmatch
+import json
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+TIB = 1024 ** 4
+DATA_IP = "192.168.16.14"
+SNAPSHOT_DIR_NAME = "~snapshot"
+SNAPSHOTS_PATH = re.compile(r"^/api/storage/volumes/([^/]+)/snapshots(?:/([^/]+))?$")
+JOBS_PATH = re.compile(r"^/api/cluster/jobs/([^/]+)$")
+# Fixed times, so an unchanged file looks the same in every version of the tree
+TREE_EPOCH = 1672531200
+
+
+def build_dataset(extra_shares=0):
+    svms = [{"uuid": "svm-1", "name": "svm_data"}, {"uuid": "svm-2", "name": "svm_mgmt"}]
+    interfaces = [
+        {"uuid": "lif-1", "name": "lif_data", "ip": {"address": "192.168.16.14"}},
+        {"uuid": "lif-2", "name": "lif_mgmt", "ip": {"address": "192.168.16.4"}},
+    ]
+    shares = [
+        {"name": "data1", "volume": {"name": "vol_data1"}},
+        {"name": "data2", "volume": {"name": "vol_data2"}},
+        {"name": "archive1", "volume": {"name": "vol_archive1"}},
+        {"name": "archive2", "volume": {"name": "vol_archive2"}},
+        {"name": "c$", "volume": {"name": "svm_data_root"}},
+        {"name": "ipc$", "volume": {"name": "svm_data_root"}},
+    ]
+    # Unrelated shares, so paging and filtering have something to do
+    shares += [{"name": f"home{index:05d}", "volume": {"name": f"vol_home{index:05d}"}} for index in range(extra_shares)]
+    for share in shares:
+        share["svm"] = {"name": "svm_data", "uuid": "svm-1"}
+
+    volumes = []
+    for share in shares:
+        size = 10 * TIB
+        used = int(size * random.uniform(0.3, 0.9))
+        volumes.append({
+            "uuid": f"vol-{share['volume']['name']}",
+            "name": share["volume"]["name"],
+            "space": {"size": size, "used": used, "available": size - used}
+        })
+    return {
+        "/api/svm/svms": svms,
+        "/api/network/ip/interfaces": interfaces,
+        "/api/protocols/cifs/shares": shares,
+        "/api/storage/volumes": volumes,
+    }
+
+
+def lookup(record, dotted):
+    for part in dotted.split("."):
+        if not isinstance(record, dict) or part not in record:
+            return None
+        record = record[part]
+    return record
+
+
+def matches(record, field, pattern):
+    value = lookup(record, field)
+    if value is None:
+        return False
+    return any(fnmatch.fnmatchcase(str(value), alternative) for alternative in pattern.split("|"))
+
+
+def project(record, fields):
+    """
+    Keeps the requested fields plus the identifying ones, like ONTAP does.
+    """
+    if not fields or fields == "*":
+        return record
+    result = {key: record[key] for key in ("uuid", "name") if key in record}
+    for field in fields.split(","):
+        value = lookup(record, field)
+        if value is None:
+            continue
+        target = result
+        parts = field.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return result
+
+
+def share_dir(tree_root, share_name):
+    return os.path.join(tree_root, DATA_IP, share_name)
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(os.path.basename(path).encode().ljust(size, b".")[:size])
+    os.utime(path, (TREE_EPOCH, TREE_EPOCH))
+
+
+def copy_frozen(src, dst):
+    """
+    Copies a file into a snapshot. A real snapshot doesn't read the file, so neither copy
+    shows the read as an access.
+    """
+    stat_result = os.stat(src)
+    shutil.copyfile(src, dst)
+    for path in (src, dst):
+        os.utime(path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+
+
+def write_tree(tree_root, version):
+    """
+    Version 1 replaces the data shares with a base tree. Version 2 changes it in place
+    (one file added, one grown, one directory removed, one added, all in data1) and
+    leaves everything else untouched; applying it twice changes nothing.
+    """
+    base = not os.path.isdir(os.path.join(share_dir(tree_root, "data1"), "projects"))
+    if version == 1 or base:
+        for share_name in ("data1", "data2"):
+            root = share_dir(tree_root, share_name)
+            if os.path.isdir(root):
+                for name in os.listdir(root):
+                    if name != SNAPSHOT_DIR_NAME:
+                        path = os.path.join(root, name)
+                        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+            for project in range(5):
+                for index in range(3):
+                    write_file(os.path.join(root, "projects", f"p{project}", "docs", f"report{index}.txt"), 1024 * (index + 1))
+                write_file(os.path.join(root, "projects", f"p{project}", "plan.txt"), 512)
+    if version == 2:
+        root = share_dir(tree_root, "data1")
+        added = os.path.join(root, "projects", "p0", "docs", "report3.txt")
+        if not os.path.exists(added):
+            write_file(added, 4096)
+        grown = os.path.join(root, "projects", "p1", "plan.txt")
+        if os.path.getsize(grown) != 2048:
+            write_file(grown, 2048)
+        shutil.rmtree(os.path.join(root, "projects", "p2"), ignore_errors=True)
+        if not os.path.isdir(os.path.join(root, "projects", "p5")):
+            write_file(os.path.join(root, "projects", "p5", "plan.txt"), 512)
+    print(f"🌳 Wrote tree version {version} below {tree_root}")
+
+
+class MockOntapHandler(BaseHTTPRequestHandler):
+    dataset = {}
+    latency = 0.0
+    fail_rate = 0.0
+    tree_root = None
+    snapshots = {}  # volume uuid -> snapshot records
+    jobs = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def delay_or_fail(self):
+        """
+        Applies the configured latency; True when this request should fail instead.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            self.send_json(503, {"error": {"message": "Service unavailable (injected)"}})
+            return True
+        return False
+
+    def volume(self, uuid):
+        return next((volume for volume in self.dataset["/api/storage/volumes"] if volume["uuid"] == uuid), None)
+
+    def collection(self, path):
+        if path in self.dataset:
+            return self.dataset[path]
+        match = SNAPSHOTS_PATH.match(path)
+        if match and not match.group(2) and self.volume(match.group(1)):
+            return self.snapshots.setdefault(match.group(1), [])
+        return None
+
+    def do_GET(self):
+        if self.delay_or_fail():
+            return
+
+        url = urlparse(self.path)
+        job = JOBS_PATH.match(url.path)
+        if job:
+            if job.group(1) not in self.jobs:
+                return self.send_json(404, {"error": {"message": f"Job {job.group(1)} not found"}})
+            return self.send_json(200, self.jobs[job.group(1)])
+
+        with self.lock:
+            records = self.collection(url.path)
+            records = list(records) if records is not None else None
+        if records is None:
+            return self.send_json(404, {"error": {"message": f"{url.path} not found"}})
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        fields = query.pop("fields", None)
+        max_records = int(query.pop("max_records", 0) or 0)
+        offset = int(query.pop("offset", 0) or 0)
+        for key in [key for key in query if key.startswith("return_")]:
+            query.pop(key)
+
+        selected = [record for record in records if all(matches(record, field, pattern) for field, pattern in query.items())]
+        page = selected[offset:offset + max_records] if max_records else selected[offset:]
+        body = {"records": [project(record, fields) for record in page], "num_records": len(page)}
+
+        next_offset = offset + len(page)
+        if max_records and next_offset < len(selected):
+            next_query = dict(query, offset=next_offset, max_records=max_records)
+            if fields:
+                next_query["fields"] = fields
+            body["_links"] = {"next": {"href": f"{url.path}?{urlencode(next_query)}"}}
+        self.send_json(200, body)
+
+
+    def do_POST(self):
+        if self.delay_or_fail():
+            return
+        match = SNAPSHOTS_PATH.match(urlparse(self.path).path)
+        volume = self.volume(match.group(1)) if match and not match.group(2) else None
+        if not volume:
+            return self.send_json(404, {"error": {"message": f"{self.path} not found"}})
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        name = json.loads(self.rfile.read(length) or b"{}").get("name")
+        if not name:
+            return self.send_json(400, {"error": {"message": "Snapshot name is required"}})
+
+        with self.lock:
+            snapshots = self.snapshots.setdefault(volume["uuid"], [])
+            if any(snapshot["name"] == name for snapshot in snapshots):
+                return self.send_json(409, {"error": {"message": f"Snapshot {name} already exists"}})
+            snapshots.append({
+                "uuid": f"snap-{volume['name']}-{name}",
+                "name": name,
+                "create_time": datetime.now(timezone.utc).isoformat(timespec="seconds")
+            })
+            self.freeze_tree(volume, name)
+            self.send_job()
+
+    def do_DELETE(self):
+        if self.delay_or_fail():
+            return
+        match = SNAPSHOTS_PATH.match(urlparse(self.path).path)
+        volume = self.volume(match.group(1)) if match and match.group(2) else None
+        with self.lock:
+            snapshots = self.snapshots.get(volume["uuid"], []) if volume else []
+            snapshot = next((snapshot for snapshot in snapshots if snapshot["uuid"] == match.group(2)), None)
+            if not snapshot:
+                return self.send_json(404, {"error": {"message": f"{self.path} not found"}})
+            snapshots.remove(snapshot)
+            for root in self.share_roots(volume):
+                shutil.rmtree(os.path.join(root, SNAPSHOT_DIR_NAME, snapshot["name"]), ignore_errors=True)
+            self.send_job()
+
+    def send_job(self):
+        # Done by the time it's polled
+        uuid = f"job-{len(self.jobs) + 1}"
+        self.jobs[uuid] = {"uuid": uuid, "state": "success", "message": "success"}
+        self.send_json(202, {"job": {"uuid": uuid, "_links": {"self": {"href": f"/api/cluster/jobs/{uuid}"}}}})
+
+    def share_roots(self, volume):
+        if not self.tree_root:
+            return []
+        return [
+            share_dir(self.tree_root, share["name"])
+            for share in self.dataset["/api/protocols/cifs/shares"]
+            if share["volume"]["name"] == volume["name"] and os.path.isdir(share_dir(self.tree_root, share["name"]))
+        ]
+
+    def freeze_tree(self, volume, name):
+        for root in self.share_roots(volume):
+            shutil.copytree(root, os.path.join(root, SNAPSHOT_DIR_NAME, name),
+                            ignore=shutil.ignore_patterns(SNAPSHOT_DIR_NAME), copy_function=copy_frozen)
+
+
+def load_snapshots(dataset, tree_root):
+    """
+    Snapshots left below tree_root by an earlier run, so they survive a restart.
+    """
+    snapshots = {}
+    for volume in dataset["/api/storage/volumes"]:
+        for share in dataset["/api/protocols/cifs/shares"]:
+            snapshot_root = os.path.join(share_dir(tree_root, share["name"]), SNAPSHOT_DIR_NAME)
+            if share["volume"]["name"] != volume["name"] or not os.path.isdir(snapshot_root):
+                continue
+            for name in os.listdir(snapshot_root):
+                created = datetime.fromtimestamp(os.stat(os.path.join(snapshot_root, name)).st_mtime, timezone.utc)
+                records = snapshots.setdefault(volume["uuid"], [])
+                if not any(record["name"] == name for record in records):
+                    records.append({"uuid": f"snap-{volume['name']}-{name}", "name": name, "create_time": created.isoformat(timespec="seconds")})
+    return snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock ONTAP REST server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Added to every response, like a WAN round trip")
+    parser.add_argument("--extra-shares", type=int, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--tree-root", default=None, help="Directory holding the share trees, see SHARE_MOUNTS")
+    parser.add_argument("--tree-version", type=int, choices=(1, 2), default=None, help="Write a sample tree first")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    MockOntapHandler.dataset = build_dataset(args.extra_shares)
+    if args.tree_root:
+        if args.tree_version:
+            write_tree(args.tree_root, args.tree_version)
+        MockOntapHandler.tree_root = args.tree_root
+        MockOntapHandler.snapshots = load_snapshots(MockOntapHandler.dataset, args.tree_root)
+    MockOntapHandler.latency = args.latency_ms / 1000.0
+    MockOntapHandler.fail_rate = args.fail_rate
+
+    server = ThreadingHTTPServer((args.host, args.port), MockOntapHandler)
+    print(f"🧪 Mock ONTAP listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Boolean, Float, String, DateTime, Enum, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship, Session
 from database import Base
 from datetime import datetime
@@ -14,6 +14,29 @@ class ActionType(enum.Enum):
     restored_from_archive = "restored_from_archive"
 
 
+class ArchiveJobStatus(enum.Enum):
+    scanning = "scanning"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class WorkTaskStatus(enum.Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class ArchiveFileState(enum.Enum):
+    pending = "pending"
+    copied = "copied"
+    verified = "verified"
+    source_deleted = "source_deleted"
+    logged = "logged"
+    failed = "failed"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -44,6 +67,261 @@ class FileMovement(Base):
     creation_time = Column(DateTime)
     last_access_time = Column(DateTime)
     last_modified_time = Column(DateTime)
-    file_size = Column(Integer)
+    file_size = Column(BigInteger)
     timestamp = Column(DateTime, default=datetime.utcnow)
     action_type = Column(Enum(ActionType), nullable=False)
+    content_hash = Column(String, index=True)
+    compression = Column(String)
+    stored_size = Column(BigInteger)
+    pack_id = Column(Integer, ForeignKey("archive_packs.id"), index=True)
+    pack_offset = Column(BigInteger)
+    # Archive share the file was placed on
+    archive_target = Column(String, index=True)
+
+    __table_args__ = (
+        # Keyset pagination of the history, newest first, optionally per action
+        Index("ix_file_movements_timestamp_id", "timestamp", "id"),
+        Index("ix_file_movements_action_timestamp_id", "action_type", "timestamp", "id"),
+        # Substring search on paths (needs the pg_trgm extension)
+        Index(
+            "ix_file_movements_full_path_trgm", "full_path",
+            postgresql_using="gin", postgresql_ops={"full_path": "gin_trgm_ops"}
+        ),
+    )
+
+
+class ArchiveJob(Base):
+    __tablename__ = "archive_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    share_name = Column(String, nullable=False)
+    filters = Column(JSON)
+    blacklist = Column(JSON)
+    status = Column(Enum(ArchiveJobStatus), nullable=False, default=ArchiveJobStatus.scanning, index=True)
+    distributed = Column(Boolean, nullable=False, default=False)
+    source = Column(String, nullable=False, default="scan")
+    pack_small_files = Column(Boolean, nullable=False, default=False)
+    policy_id = Column(Integer, ForeignKey("archive_policies.id"), index=True)
+    error = Column(String)
+    bytes_in = Column(BigInteger, nullable=False, default=0)
+    bytes_stored = Column(BigInteger, nullable=False, default=0)
+    compression_cpu_seconds = Column(Float, nullable=False, default=0.0)
+    # Process running the job (hostname-pid) and until when its claim holds without renewal
+    runner_id = Column(String)
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    files = relationship("ArchiveJobFile", back_populates="job", order_by="ArchiveJobFile.id")
+
+
+class ArchiveJobFile(Base):
+    __tablename__ = "archive_job_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("archive_jobs.id"), nullable=False, index=True)
+    full_path = Column(String, nullable=False)
+    destination_path = Column(String)
+    creation_time = Column(DateTime)
+    last_access_time = Column(DateTime)
+    last_modified_time = Column(DateTime)
+    file_size = Column(BigInteger)
+    bytes_copied = Column(BigInteger, nullable=False, default=0)
+    content_hash = Column(String)
+    compression = Column(String)
+    stored_size = Column(BigInteger)
+    pack_id = Column(Integer, ForeignKey("archive_packs.id"))
+    pack_offset = Column(BigInteger)
+    state = Column(Enum(ArchiveFileState), nullable=False, default=ArchiveFileState.pending, index=True)
+    error = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    job = relationship("ArchiveJob", back_populates="files")
+
+
+class ArchiveBlob(Base):
+    __tablename__ = "archive_blobs"
+
+    content_hash = Column(String, primary_key=True)
+    archive_path = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False, index=True)
+    compression = Column(String)
+    stored_size = Column(BigInteger)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class WorkTask(Base):
+    __tablename__ = "work_tasks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    job_id = Column(Integer, ForeignKey("archive_jobs.id"), index=True)
+    payload = Column(JSON)
+    status = Column(Enum(WorkTaskStatus), nullable=False, default=WorkTaskStatus.pending, index=True)
+    priority = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String)
+    lease_expires_at = Column(DateTime, index=True)
+    heartbeat_at = Column(DateTime)
+    attempts = Column(Integer, nullable=False, default=0)
+    # A pending task isn't handed out before this time (retry backoff)
+    not_before = Column(DateTime)
+    error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class FileMetadata(Base):
+    __tablename__ = "file_metadata"
+
+    id = Column(Integer, primary_key=True, index=True)
+    share_name = Column(String, nullable=False, index=True)
+    full_path = Column(String, nullable=False, unique=True, index=True)
+    parent_path = Column(String, nullable=False, index=True)
+    creation_time = Column(DateTime)
+    last_access_time = Column(DateTime)
+    last_modified_time = Column(DateTime)
+    file_size = Column(BigInteger)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ArchivePack(Base):
+    __tablename__ = "archive_packs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    archive_path = Column(String, nullable=False, unique=True)
+    source_dir = Column(String)
+    member_count = Column(Integer, nullable=False, default=0)
+    live_members = Column(Integer, nullable=False, default=0)
+    # Offsets of members no longer kept alive (restored or found corrupt), each counted once
+    dropped_offsets = Column(JSON)
+    total_size = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivePolicy(Base):
+    __tablename__ = "archive_policies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    share_name = Column(String, nullable=False, index=True)
+    filters = Column(JSON)
+    blacklist = Column(JSON)
+    high_watermark = Column(Float, nullable=False, default=85.0)
+    low_watermark = Column(Float, nullable=False, default=75.0)
+    priority = Column(Integer, nullable=False, default=0)
+    source = Column(String, nullable=False, default="scan")
+    pack_small_files = Column(Boolean, nullable=False, default=False)
+    enabled = Column(Boolean, nullable=False, default=True)
+    last_run_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class RestoreStats(Base):
+    __tablename__ = "restore_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    full_path = Column(String, unique=True, nullable=False, index=True)
+    restore_count = Column(Integer, nullable=False, default=0)
+    bytes_restored = Column(BigInteger, nullable=False, default=0)
+    last_restored_at = Column(DateTime, index=True)
+    skipped_count = Column(Integer, nullable=False, default=0)
+    skipped_bytes = Column(BigInteger, nullable=False, default=0)
+    last_skipped_at = Column(DateTime)
+    # A file is counted once per job that left it out
+    last_skipped_job_id = Column(Integer)
+
+
+class DuplicateScan(Base):
+    __tablename__ = "duplicate_scans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    share_name = Column(String)
+    status = Column(Enum(ArchiveJobStatus), nullable=False, default=ArchiveJobStatus.scanning, index=True)
+    error = Column(String)
+    files_scanned = Column(Integer, nullable=False, default=0)
+    bytes_scanned = Column(BigInteger, nullable=False, default=0)
+    size_candidates = Column(Integer, nullable=False, default=0)
+    edge_candidates = Column(Integer, nullable=False, default=0)
+    bytes_read = Column(BigInteger, nullable=False, default=0)
+    duplicate_groups = Column(Integer, nullable=False, default=0)
+    duplicate_files = Column(Integer, nullable=False, default=0)
+    reclaimable_bytes = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DuplicateGroup(Base):
+    __tablename__ = "duplicate_groups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scan_id = Column(Integer, ForeignKey("duplicate_scans.id"), nullable=False, index=True)
+    content_hash = Column(String, nullable=False, index=True)
+    file_size = Column(BigInteger, nullable=False)
+    file_count = Column(Integer, nullable=False)
+    # Space freed by keeping one copy
+    reclaimable_bytes = Column(BigInteger, nullable=False, index=True)
+
+
+class DuplicateFile(Base):
+    __tablename__ = "duplicate_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    group_id = Column(Integer, ForeignKey("duplicate_groups.id"), nullable=False, index=True)
+    full_path = Column(String, nullable=False)
+    last_modified_time = Column(DateTime)
+
+
+class SnapshotScan(Base):
+    __tablename__ = "snapshot_scans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    share_name = Column(String, nullable=False, index=True)
+    volume_name = Column(String)
+    snapshot_name = Column(String)
+    status = Column(Enum(ArchiveJobStatus), nullable=False, default=ArchiveJobStatus.scanning, index=True)
+    error = Column(String)
+    directories = Column(Integer, nullable=False, default=0)
+    changed_directories = Column(Integer, nullable=False, default=0)
+    removed_directories = Column(Integer, nullable=False, default=0)
+    files = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SnapshotDirectory(Base):
+    __tablename__ = "snapshot_directories"
+
+    id = Column(Integer, primary_key=True, index=True)
+    share_name = Column(String, nullable=False, index=True)
+    # Live path of the directory, as in file_metadata.parent_path
+    path = Column(String, nullable=False, unique=True)
+    # Digest of the directory's listing in the last snapshot scanned
+    signature = Column(String, nullable=False)
+    file_count = Column(Integer, nullable=False, default=0)
+    snapshot_name = Column(String)
+
+
+class TransferActivity(Base):
+    __tablename__ = "transfer_activity"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # hostname-pid of the process running transfers
+    process_id = Column(String, unique=True, nullable=False)
+    interactive_until = Column(DateTime, index=True)
+
+
+class ExportRun(Base):
+    __tablename__ = "export_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dataset = Column(String, nullable=False)
+    file_format = Column(String, nullable=False)
+    share_name = Column(String)
+    status = Column(Enum(ArchiveJobStatus), nullable=False, default=ArchiveJobStatus.running, index=True)
+    error = Column(String)
+    rows = Column(BigInteger, nullable=False, default=0)
+    files = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
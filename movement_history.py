@@ -0,0 +1,127 @@
+import base64
+from datetime import datetime
+from sqlalchemy import func, literal_column, select, text, tuple_
+
+from models import ActionType, FileMovement
+from schemas import FileMovementPage, FileMovementRecord
+
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+HISTORY_INDEXES = ("ix_file_movements_timestamp_id", "ix_file_movements_action_timestamp_id", "ix_file_movements_full_path_trgm")
+# Keyset pagination per share. Written out because the expression has to match
+# share_of() exactly for the planner to use it.
+SHARE_HISTORY_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_file_movements_share_timestamp_id "
+    "ON file_movements (lower(split_part(full_path, '\\', 4)), timestamp, id)"
+)
+
+
+def prepare_history_schema(engine):
+    """
+    Enables pg_trgm so create_all can build the path search index.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+def ensure_history_indexes(engine):
+    """
+    create_all only indexes new tables; adds the history indexes to an existing file_movements.
+    Runs after upgrade_file_movements, the other indexes of the table are created there.
+    """
+    for index in FileMovement.__table__.indexes:
+        if index.name in HISTORY_INDEXES:
+            index.create(bind=engine, checkfirst=True)
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text(SHARE_HISTORY_INDEX))
+
+
+def encode_cursor(movement: FileMovement):
+    return base64.urlsafe_b64encode(f"{movement.timestamp.isoformat()}|{movement.id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Returns (timestamp, id) of the last row of the previous page.
+    """
+    try:
+        timestamp, movement_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(movement_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def share_of(path_column):
+    """
+    Share of a \\\\server\\share\\... path, lower-cased. Literals instead of bound
+    parameters, so the expression matches ix_file_movements_share_timestamp_id.
+    """
+    return func.lower(func.split_part(path_column, literal_column("'\\'"), literal_column("4")))
+
+
+def escape_like(value: str):
+    # Paths are full of backslashes, which are also the LIKE escape character
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def history_query(
+    share_name: str = None,
+    action_type: ActionType = None,
+    since: datetime = None,
+    until: datetime = None,
+    min_size: int = None,
+    max_size: int = None,
+    search: str = None,
+    cursor: str = None,
+    limit: int = HISTORY_PAGE_SIZE
+):
+    """
+    Select for one page of file movements, newest first. The page after a cursor starts
+    below its (timestamp, id) key, so every page is an index range scan however deep it is.
+    Fetches one row more than limit to tell whether there is a next page.
+    """
+    query = select(FileMovement)
+    if share_name:
+        # Only the share component, whatever the server address and the rest of the path
+        query = query.filter(share_of(FileMovement.full_path) == share_name.lower())
+    if action_type:
+        query = query.filter(FileMovement.action_type == action_type)
+    if since:
+        query = query.filter(FileMovement.timestamp >= since)
+    if until:
+        query = query.filter(FileMovement.timestamp < until)
+    if min_size is not None:
+        query = query.filter(FileMovement.file_size >= min_size)
+    if max_size is not None:
+        query = query.filter(FileMovement.file_size <= max_size)
+    if search:
+        query = query.filter(FileMovement.full_path.ilike(f"%{escape_like(search)}%", escape="\\"))
+    if cursor:
+        query = query.filter(tuple_(FileMovement.timestamp, FileMovement.id) < tuple_(*decode_cursor(cursor)))
+
+    return query.order_by(FileMovement.timestamp.desc(), FileMovement.id.desc()).limit(limit + 1)
+
+
+def build_history_page(movements, limit: int):
+    has_more = len(movements) > limit
+    movements = movements[:limit]
+    return FileMovementPage(
+        items=[
+            FileMovementRecord(
+                id=movement.id,
+                full_path=movement.full_path,
+                destination_path=movement.destination_path,
+                action_type=movement.action_type.value,
+                file_size=movement.file_size,
+                stored_size=movement.stored_size,
+                compression=movement.compression,
+                archive_target=movement.archive_target,
+                timestamp=movement.timestamp
+            )
+            for movement in movements
+        ],
+        next_cursor=encode_cursor(movements[-1]) if has_more else None
+    )
@@ -1,111 +1,108 @@
 import json
-from netapp_ontap import HostConnection
-from netapp_ontap.resources import Svm, IpInterface, CifsShare
 import os
 import smbclient
 import os
+import threading
+import time
 from datetime import datetime
+from functools import wraps
 
+import storage
+from ontap_client import get_client
+from scan_results import FileRecord, ScanResult
+from storage import configure_smb
 
 
-smbclient.ClientConfig(username="hatul\\Administrator", password="Netapp1!")
+# Shares, LIFs and volumes rarely change, reuse a lookup for this long
+TOPOLOGY_CACHE_SECONDS = float(os.getenv("TOPOLOGY_CACHE_SECONDS", 300))
+_topology_cache = {}
+_topology_lock = threading.Lock()
 
-def get_svm_collection():
-    return [svm.to_dict() for svm in Svm.get_collection(fields="name")]
 
-def get_lif_ips():
-    lif_ips = []
-    for lif in IpInterface.get_collection(fields="name,ip.address"):
-        lif_dict = lif.to_dict()
-        if lif_dict.get('name') == "lif_data":
-            lif_ips.append(lif_dict.get('ip', {}).get('address'))
-    return lif_ips
+def cached_topology(func):
+    @wraps(func)
+    def wrapper():
+        with _topology_lock:
+            cached = _topology_cache.get(func.__name__)
+            if cached and time.monotonic() - cached[0] < TOPOLOGY_CACHE_SECONDS:
+                return cached[1]
+        value = func()
+        if value:
+            with _topology_lock:
+                _topology_cache[func.__name__] = (time.monotonic(), value)
+        return value
+    return wrapper
 
-def get_cifs_volumes():
-    volumes = []
-    for share in CifsShare.get_collection(fields="name,volume"):
-        share_dict = share.to_dict()
-        share_name = share_dict.get('name')
-        if share_name and 'data' in share_name and '$' not in share_name:
-            volumes.append({
-                'share_name': share_name,
-                'volume': share_dict.get('volume', {}).get('name')
-            })
-    return volumes
 
-def get_svm_data_volumes():
-    with HostConnection('192.168.16.4', 'admin', 'Netapp1!', verify=False):
-
-        svm_data_dict = {}
-        for svm_dict in get_svm_collection():
-            if svm_dict.get('name') == "svm_data":
-                svm_data_dict['svm_name'] = svm_dict['name']
-                
-                # Fetch LIF IPs
-                svm_data_dict['ip_addresses'] = get_lif_ips()
-                
-                # Fetch CIFS Volumes
-                svm_data_dict['volumes'] = get_cifs_volumes()
-
-        return svm_data_dict
-    
-def get_cifs_archive_volumes():
+def fetch_ontap_topology():
+    """
+    SVM, data LIFs and CIFS shares, fetched concurrently over the shared ONTAP session.
+    """
+    topology = get_client().get_collections({
+        "svms": ("/api/svm/svms", "name", {"name": "svm_data"}),
+        "lifs": ("/api/network/ip/interfaces", "name,ip.address", {"name": "lif_data"}),
+        "shares": ("/api/protocols/cifs/shares", "name,volume.name", {}),
+    })
+    return topology if topology["svms"] else {}
+
+
+@cached_topology
+def get_ontap_topology():
+    return fetch_ontap_topology()
+
+
+def get_lif_ips(topology):
+    return [lif.get('ip', {}).get('address') for lif in topology.get('lifs', [])]
+
+
+def get_cifs_volumes(topology, kind="data"):
     volumes = []
-    for share in CifsShare.get_collection(fields="name,volume"):
-        share_dict = share.to_dict()
-        share_name = share_dict.get('name')
-        if share_name and 'archive' in share_name and '$' not in share_name:
+    for share in topology.get('shares', []):
+        share_name = share.get('name')
+        if share_name and kind in share_name and '$' not in share_name:
             volumes.append({
                 'share_name': share_name,
-                'volume': share_dict.get('volume', {}).get('name')
+                'volume': share.get('volume', {}).get('name')
             })
     return volumes
 
-def get_svm_archive_volumes():
-    with HostConnection('192.168.16.4', 'admin', 'Netapp1!', verify=False):
-        svm_archive_dict = {}
-        
-        for svm_dict in get_svm_collection():
-            if svm_dict.get('name') == "svm_data":
-                svm_archive_dict['svm_name'] = svm_dict['name']
-                
-                # Fetch LIF IPs
-                svm_archive_dict['ip_addresses'] = get_lif_ips()
-                
-                # Fetch CIFS Archive Volumes
-                svm_archive_dict['volumes'] = get_cifs_archive_volumes()
-
-        return svm_archive_dict
-
-
-def get_archive_path(file_path):
-    archive_volumes = get_svm_archive_volumes()  
-    archive_ip = "192.168.16.15"
-
-    if not archive_volumes or "volumes" not in archive_volumes:
-        print("Error: No valid archive volumes found.")
-        return None
 
-    archive_map = {}  
-    for archive in archive_volumes['volumes']:
-        share_name = archive['share_name']
-        if "archive1" in share_name.lower():
-            archive_map["data1"] = f"\\\\{archive_ip}\\{share_name}"
-        elif "archive2" in share_name.lower():
-            archive_map["data2"] = f"\\\\{archive_ip}\\{share_name}"
+def get_svm_volumes(kind):
+    topology = get_ontap_topology()
+    if not topology:
+        return {}
+    return {
+        'svm_name': topology['svms'][0]['name'],
+        'ip_addresses': get_lif_ips(topology),
+        'volumes': get_cifs_volumes(topology, kind)
+    }
 
-    print(f"DEBUG: Archive Map: {archive_map}")
 
-    if "\\\\192.168.16.14\\data1\\" in file_path:
-        return archive_map.get("data1")
+def get_svm_data_volumes():
+    return get_svm_volumes("data")
 
-    elif "\\\\192.168.16.14\\data2\\" in file_path:
-        return archive_map.get("data2")
 
-    print(f"❌ Invalid source path: {file_path} (must be under data1 or data2)")
-    return None
+def get_svm_archive_volumes():
+    return get_svm_volumes("archive")
 
 
+def fetch_volume_space(volume_names):
+    """
+    Reads size and usage of all given volumes with a single REST call.
+    """
+    if not volume_names:
+        return {}
+    space = {}
+    for volume in get_client().get_collection(
+        "/api/storage/volumes", "name,space.size,space.used,space.available", name="|".join(sorted(volume_names))
+    ):
+        volume_space = volume.get('space', {})
+        space[volume['name']] = {
+            'size': volume_space.get('size', 0),
+            'used': volume_space.get('used', 0),
+            'available': volume_space.get('available', 0)
+        }
+    return space
 
 
 def get_first_ip_address(svm_dict):
@@ -124,75 +121,123 @@ def access_CIFS_share(share, ip_address):
     return share_path, share_name
 
 def get_files_by_type(file_type):
-    with HostConnection('192.168.16.4', 'admin', 'Netapp1!', verify=False):
 
 
-        # Retrieve the SVM dictionary
-        svm_dict = get_svm_data_volumes()
-        print(svm_dict)
+    # Retrieve the SVM dictionary
+    svm_dict = get_svm_data_volumes()
+    print(svm_dict)
         
-        files = {}
-        ip_address = get_first_ip_address(svm_dict)
-        if not ip_address:
-            return files
-
-        # Access each CIFS share
-        for share in svm_dict.get('volumes', []):
-            share_path, share_name = access_CIFS_share(share, ip_address)
-            if not share_name or not share_path:
-                continue
-
-            files[share_name] = []
-
-            try:
-                # Recursively walk the share
-                for dirpath, _, filenames in smbclient.walk(share_path):
-                    for file in filenames:
-                        if file.endswith(file_type):
-                            full_path = os.path.join(dirpath, file)
-                            files[share_name].append(full_path)
-            except OSError as e:
-                print(f"Error accessing share {share_path}: {e}")
-
+    files = {}
+    ip_address = get_first_ip_address(svm_dict)
+    if not ip_address:
         return files
 
+    configure_smb()
+    # Access each CIFS share
+    for share in svm_dict.get('volumes', []):
+        share_path, share_name = access_CIFS_share(share, ip_address)
+        if not share_name or not share_path:
+            continue
 
-def scan_volume(volume):
-    with HostConnection('192.168.16.4', 'admin', 'Netapp1!', verify=False):
-        files = {}
-        ip_address = get_first_ip_address(volume)
-        if not ip_address:
-            return files
-
-        for share in volume.get('volumes', []):
-            share_path, share_name = access_CIFS_share(share, ip_address)
-            if not share_name or not share_path:
-                continue
-
-            files[share_name] = []
-
-            try:
-                for dirpath, _, filenames in smbclient.walk(share_path):
-                    for file in filenames:
-                        if file.endswith("_shortcut.bat"):
-                            continue
+        files[share_name] = []
+
+        try:
+            # Recursively walk the share
+            for dirpath, _, filenames in smbclient.walk(share_path):
+                for file in filenames:
+                    if file.endswith(file_type):
                         full_path = os.path.join(dirpath, file)
-                        creation_time = datetime.fromtimestamp(os.path.getctime(full_path)).strftime('%Y-%m-%d %H:%M:%S')
-                        last_access_time = datetime.fromtimestamp(os.path.getatime(full_path)).strftime('%Y-%m-%d %H:%M:%S')
-                        last_modified_time = datetime.fromtimestamp(os.path.getmtime(full_path)).strftime('%Y-%m-%d %H:%M:%S')
-                        file_size = os.path.getsize(full_path)
-                        files[share_name].append({
-                            'full_path': full_path,
-                            'creation_time': creation_time,
-                            'last_access_time': last_access_time,
-                            'last_modified_time': last_modified_time,
-                            'file_size': file_size
-                        })
-            except OSError as e:
-                print(f"Error accessing share {share_path}: {e}")
+                        files[share_name].append(full_path)
+        except OSError as e:
+            print(f"Error accessing share {share_path}: {e}")
+
+    return files
+
+
+def scan_share(share_path):
+    """
+    Lists every file below share_path into a compact ScanResult, one directory listing
+    at a time and using the attributes that come with each listing.
+    """
+    result = ScanResult()
+    pending = [share_path]
+    while pending:
+        current = pending.pop()
+        try:
+            entries = list(storage.scandir(current))
+        except OSError as e:
+            print(f"Error accessing directory {current}: {e}")
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                pending.append(current + "\\" + entry.name)
+            elif not entry.name.endswith("_shortcut.bat"):
+                stat_result = entry.stat()
+                result.add(current, entry.name, stat_result.st_ctime, stat_result.st_atime, stat_result.st_mtime, stat_result.st_size)
+    return result
 
+
+def scan_volume(volume):
+    """
+    Returns {share name: ScanResult} for every CIFS share of the volume.
+    """
+    files = {}
+    ip_address = get_first_ip_address(volume)
+    if not ip_address:
         return files
 
+    for share in volume.get('volumes', []):
+        share_path, share_name = access_CIFS_share(share, ip_address)
+        if not share_name or not share_path:
+            continue
+
+        files[share_name] = scan_share(share_path)
+
+    return files
+
+
+
+def build_file_info(full_path, stat_result):
+    return {
+        'full_path': full_path,
+        'creation_time': datetime.fromtimestamp(stat_result.st_ctime).strftime('%Y-%m-%d %H:%M:%S'),
+        'last_access_time': datetime.fromtimestamp(stat_result.st_atime).strftime('%Y-%m-%d %H:%M:%S'),
+        'last_modified_time': datetime.fromtimestamp(stat_result.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+        'file_size': stat_result.st_size
+    }
+
+
+def scan_directory(dir_path):
+    """
+    Lists a single directory without recursing. Returns (subdirectory paths, file infos),
+    using the attributes returned with the directory listing instead of a stat per file.
+    """
+    subdirs = []
+    files = []
+    for entry in storage.scandir(dir_path):
+        full_path = os.path.join(dir_path, entry.name)
+        if entry.is_dir():
+            subdirs.append(full_path)
+        elif not entry.name.endswith("_shortcut.bat"):
+            files.append(build_file_info(full_path, entry.stat()))
+    return subdirs, files
+
+
+def walk_files(root_path):
+    """
+    Yields the file infos below root_path one directory at a time, without holding the tree.
+    """
+    pending = [root_path]
+    while pending:
+        current = pending.pop()
+        try:
+            subdirs, files = scan_directory(current)
+        except OSError as e:
+            print(f"Error accessing directory {current}: {e}")
+            continue
+        pending.extend(subdirs)
+        yield from files
+
 
 
 filter_parameters = {"blacklist", "creation_time_start", "creation_time_end", "last_access_time_start", "last_access_time_end", "last_modified_time_start", "last_modified_time_end", "file_size_min", "file_size_max"}
@@ -221,7 +266,8 @@ def filter_by_type(file_info, file_type):
 def filter_by_dates(file_info, date_filters):
     for date_type, date_range in date_filters.items():
         if date_range:  # Only process if a filter is set
-            file_date = convert_to_datetime(file_info.get(date_type))
+            # Compact scan records hold epoch times, no need to format and parse them
+            file_date = convert_to_datetime(file_info.epoch(date_type) if isinstance(file_info, FileRecord) else file_info.get(date_type))
             start_date = convert_to_datetime(date_range.get('start_date'))
             end_date = convert_to_datetime(date_range.get('end_date'))
 
@@ -248,30 +294,29 @@ def filter_files(files, filters, blacklist, share_name):
     """
     Filters files by type, dates, size, and blacklist, limited to a single share (data1 or data2).
     """
-    with HostConnection('192.168.16.4', 'admin', 'Netapp1!', verify=False):
-        if share_name not in files:
-            print(f"⚠️ Share '{share_name}' not found in scanned results.")
-            return {}
-
-        filtered_files = {share_name: []}
-
-        for file_info in files[share_name]:
-            if is_blacklisted(file_info['full_path'], blacklist):
-                print(f"⛔ Skipped (blacklist): {file_info['full_path']}")
-                continue
-            if file_info['full_path'].endswith("_shortcut.bat"):
-                print(f"⛔ Skipped (shortcut): {file_info['full_path']}")
-                continue
-            if not filter_by_type(file_info, filters.get('file_type')):
-                continue
-            if not filter_by_dates(file_info, filters.get('date_filters', {})):
-                continue
-            if not filter_by_size(file_info, filters.get('min_size'), filters.get('max_size')):
-                continue
-
-            filtered_files[share_name].append(file_info)
-
-        return {share_name: filtered_files[share_name]} if filtered_files[share_name] else {}
+    if share_name not in files:
+        print(f"⚠️ Share '{share_name}' not found in scanned results.")
+        return {}
+
+    filtered_files = {share_name: []}
+
+    for file_info in files[share_name]:
+        if is_blacklisted(file_info['full_path'], blacklist):
+            print(f"⛔ Skipped (blacklist): {file_info['full_path']}")
+            continue
+        if file_info['full_path'].endswith("_shortcut.bat"):
+            print(f"⛔ Skipped (shortcut): {file_info['full_path']}")
+            continue
+        if not filter_by_type(file_info, filters.get('file_type')):
+            continue
+        if not filter_by_dates(file_info, filters.get('date_filters', {})):
+            continue
+        if not filter_by_size(file_info, filters.get('min_size'), filters.get('max_size')):
+            continue
+
+        filtered_files[share_name].append(file_info)
+
+    return {share_name: filtered_files[share_name]} if filtered_files[share_name] else {}
 
 
 
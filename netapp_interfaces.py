@@ -1,15 +1,29 @@
 from datetime import datetime
 import json
+import ntpath
 import os
-import tempfile
-import smbclient
-import shutil
+import time
+import uuid
+import storage
 from sqlalchemy.orm import Session
 
 
-from models import FileMovement, ActionType
-from netapp_btc import filter_files, get_archive_path, get_svm_data_volumes, normalize_path, scan_volume
-from database import get_db
+from models import ArchiveBlob, FileMovement, ActionType
+from netapp_btc import filter_files, get_svm_data_volumes, normalize_path, scan_volume
+from placement import finish_placement, place_file, target_from_path
+from database import SessionLocal
+from transfer import ContentHasher, copy_file, hash_file, new_hasher
+from packing import drop_pack_member, read_pack_member, remove_pack, verify_pack_member
+from compression import choose_compression, compress_copy, compressed_path, decompress_copy, hash_compressed_file
+from restore_history import record_restore
+from transfer_scheduler import INTERACTIVE, prioritized
+
+
+# flat: {archive}\{filename}
+# cas: {archive}\.cas\{algorithm}\ab\cd\{digest}, identical content is stored once
+ARCHIVE_LAYOUT = os.getenv("ARCHIVE_LAYOUT", "flat")
+# Read every archive copy back and compare content hashes before deleting the source
+ARCHIVE_VERIFY_HASH = os.getenv("ARCHIVE_VERIFY_HASH", "true").lower() == "true"
 
 def log_file_movement(
     db: Session,
@@ -19,7 +33,8 @@ def log_file_movement(
     last_access_time: str,
     last_modified_time: str,
     file_size: int,
-    action_type: ActionType
+    action_type: ActionType,
+    content_hash: str = None
 ):
     file_movement = FileMovement(
         full_path=full_path,
@@ -28,81 +43,289 @@ def log_file_movement(
         last_access_time=datetime.strptime(last_access_time, '%Y-%m-%d %H:%M:%S'),
         last_modified_time=datetime.strptime(last_modified_time, '%Y-%m-%d %H:%M:%S'),
         file_size=file_size,
-        action_type=action_type
+        action_type=action_type,
+        content_hash=content_hash
     )
     db.add(file_movement)
+    if action_type == ActionType.restored_from_archive:
+        record_restore(db, full_path, file_size)
     db.commit()
 
 
-def move_file(file_info):
-    
-    src_path = normalize_path(file_info['full_path'])
-    dest_folder = normalize_path(get_archive_path(src_path))
+def is_content_addressed():
+    return ARCHIVE_LAYOUT == "cas"
 
-    if src_path.endswith("_shortcut.bat") or src_path.endswith(".bat"):
-        print(f"⛔ Skipped: Shortcut or batch file detected → {src_path}")
-        return None, None
 
-    print(f"DEBUG: Attempting to move file")
-    print(f"  Source: {src_path}")
-    print(f"  Destination Folder: {dest_folder}")
+def get_destination_path(src_path, dest_folder, compression=None):
+    if is_content_addressed():
+        # Copied to a staging name first, the final name is only known once the hash is
+        return normalize_path(f"{dest_folder}\\.cas\\staging\\{uuid.uuid4().hex}_{os.path.basename(src_path)}")
+    filename = os.path.basename(src_path)
+    return compressed_path(normalize_path(f"{dest_folder}\\{filename}"), compression)
+
+
+def get_cas_path(archive_root, content_hash, compression=None):
+    algorithm, digest = content_hash.split(":", 1)
+    return compressed_path(
+        normalize_path(f"{archive_root}\\.cas\\{algorithm}\\{digest[:2]}\\{digest[2:4]}\\{digest}"),
+        compression
+    )
+
+
+def get_archive_root(archive_path):
+    if "\\.cas\\" in archive_path:
+        return archive_path.split("\\.cas\\", 1)[0]
+    return ntpath.dirname(archive_path)
+
 
-    if not dest_folder:
-        print(f"Skipping file {src_path} (Invalid archive destination)")
+def find_duplicate_blob(db: Session, src_path, file_size):
+    """
+    Looks for already archived content identical to src_path. The source is only hashed
+    when a stored blob has the same size, so unique files are never read twice.
+    """
+    if not db.query(ArchiveBlob).filter(ArchiveBlob.file_size == file_size).first():
         return None, None
 
+    content_hash = hash_file(src_path)
+    blob = db.query(ArchiveBlob).filter(ArchiveBlob.content_hash == content_hash).first()
+    return blob, content_hash
+
+
+def copy_to_archive(src_path, dest_path, file_size=None, start_offset=0, progress_callback=None, compression=None):
+    """
+    Copies src_path to dest_path, compressing it when asked. Returns the content hash
+    computed during the copy (None when hashing is disabled, except in the CAS layout),
+    the stored size and the CPU time spent compressing.
+    """
+    if is_content_addressed():
+        # The blob is named after the hash, so it is computed even with TRANSFER_HASH_ALGORITHM=none
+        hasher = ContentHasher()
+        storage.makedirs(ntpath.dirname(dest_path), exist_ok=True)
+    else:
+        hasher = new_hasher() if ARCHIVE_VERIFY_HASH else None
+
+    if compression:
+        # A compressed stream can't be resumed mid-file, it always starts over
+        copied, stored_size, cpu_seconds = compress_copy(src_path, dest_path, hasher=hasher)
+        if progress_callback:
+            progress_callback(copied)
+        print(f"Compressed {copied} bytes to {stored_size} bytes in archive: {dest_path}")
+    else:
+        stored_size = copy_file(src_path, dest_path, file_size, start_offset, progress_callback, hasher=hasher)
+        cpu_seconds = 0.0
+        print(f"Copied {stored_size} bytes to archive: {dest_path}")
+
+    return {
+        "content_hash": hasher.hexdigest() if hasher else None,
+        "stored_size": stored_size,
+        "cpu_seconds": cpu_seconds
+    }
+
+
+def verify_archive_copy(dest_path, file_size, content_hash=None, compression=None):
     try:
-        smbclient.stat(src_path)  
-        print("File is accessible, proceeding with move...")
+        dest_size = storage.stat(dest_path).st_size
+    except FileNotFoundError:
+        print(f"Failed to verify copied file at {dest_path}. Not deleting original.")
+        return False
 
-        filename = os.path.basename(src_path)
-        dest_path = f"{dest_folder}\\{filename}"
-        dest_path = normalize_path(dest_path)
+    if compression:
+        if not ARCHIVE_VERIFY_HASH:
+            return True
+        # The stored size says nothing about the content, decompress and compare instead
+        algorithm = content_hash.split(":", 1)[0] if content_hash else None
+        read_back, dest_size = hash_compressed_file(dest_path, algorithm)
+        if content_hash and read_back != content_hash:
+            print(f"Hash mismatch for {dest_path}: expected {content_hash}, read back {read_back}. Not deleting original.")
+            return False
+
+    if file_size is not None and dest_size != file_size:
+        print(f"Size mismatch for {dest_path}: expected {file_size}, found {dest_size}. Not deleting original.")
+        return False
 
-        print(f"Final Destination Path: {dest_path}")
+    if content_hash and ARCHIVE_VERIFY_HASH and not compression:
+        algorithm = content_hash.split(":", 1)[0]
+        read_back = hash_file(dest_path, algorithm=algorithm)
+        if read_back != content_hash:
+            print(f"Hash mismatch for {dest_path}: expected {content_hash}, read back {read_back}. Not deleting original.")
+            return False
+    return True
 
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file_path = temp_file.name
-            with open(temp_file_path, "wb") as f:
-                with smbclient.open_file(src_path, mode="rb") as remote_file:
-                    shutil.copyfileobj(remote_file, f)
 
-        print(f"Downloaded file to local temp: {temp_file_path}")
+def _exists(path):
+    try:
+        storage.stat(path)
+        return True
+    except FileNotFoundError:
+        return False
+
 
-        with open(temp_file_path, "rb") as f:
-            with smbclient.open_file(dest_path, mode="wb") as remote_file:
-                shutil.copyfileobj(f, remote_file)
+def locate_staged_copy(staged_path, content_hash, compression=None):
+    """
+    Where a staged CAS copy is now. An attempt that stopped between moving it to its blob
+    path and committing left it there, with no blob row yet.
+    """
+    if not content_hash or _exists(staged_path):
+        return staged_path
+    blob_path = get_cas_path(get_archive_root(staged_path), content_hash, compression)
+    return blob_path if _exists(blob_path) else staged_path
 
-        print(f"Uploaded file to archive: {dest_path}")
 
-        try:
-            smbclient.stat(dest_path)
-            smbclient.remove(src_path)
-            print(f"Deleted original file: {src_path}")
-        except FileNotFoundError:
-            print(f"Failed to verify copied file at {dest_path}. Not deleting original.")
-            return None, None
-
-        os.utime(dest_path, (
+def store_archive_blob(db: Session, staged_path, content_hash, file_size, compression=None, stored_size=None):
+    """
+    Moves a verified staged copy to its content-addressed path, or drops it when the
+    content is already stored. Returns the blob path; the caller commits. A staged_path
+    that is already the blob path (see locate_staged_copy) is registered where it is.
+    """
+    blob = db.query(ArchiveBlob).filter(ArchiveBlob.content_hash == content_hash).first()
+    if blob:
+        if staged_path != blob.archive_path:
+            storage.remove(staged_path)
+        blob.ref_count += 1
+        print(f"Deduplicated {staged_path} → {blob.archive_path}")
+        return blob.archive_path
+
+    blob_path = get_cas_path(get_archive_root(staged_path), content_hash, compression)
+    if staged_path != blob_path:
+        storage.makedirs(ntpath.dirname(blob_path), exist_ok=True)
+        storage.replace(staged_path, blob_path)
+    db.add(ArchiveBlob(
+        content_hash=content_hash,
+        archive_path=blob_path,
+        file_size=file_size,
+        compression=compression,
+        stored_size=stored_size,
+        ref_count=1
+    ))
+    return blob_path
+
+
+def release_archive_copy(db: Session, archive_path, content_hash):
+    """
+    Drops one reference to an archived copy and deletes it once nothing refers to it.
+    """
+    blob = db.query(ArchiveBlob).filter(ArchiveBlob.content_hash == content_hash).first() if content_hash else None
+    if blob and blob.archive_path == archive_path:
+        blob.ref_count -= 1
+        if blob.ref_count > 0:
+            print(f"Archive copy still referenced {blob.ref_count} time(s): {archive_path}")
+            return
+        db.delete(blob)
+
+    storage.remove(archive_path)
+    print(f"Deleted file from archive: {archive_path}")
+
+
+def delete_source(src_path):
+    try:
+        storage.remove(src_path)
+        print(f"Deleted original file: {src_path}")
+    except FileNotFoundError:
+        # Already removed by an earlier, interrupted attempt
+        print(f"Original file already removed: {src_path}")
+
+
+def finalize_archive(src_path, dest_path, file_info, set_times=True):
+    # Shared content-addressed copies and packs keep their own times, originals are in FileMovement
+    if set_times and not is_content_addressed():
+        os.utime(storage.os_path(dest_path), (
             datetime.strptime(file_info["last_access_time"], '%Y-%m-%d %H:%M:%S').timestamp(),
             datetime.strptime(file_info["last_modified_time"], '%Y-%m-%d %H:%M:%S').timestamp()
         ))
 
-        create_shortcut(src_path, dest_path)
+    create_shortcut(src_path, dest_path)
+
+
+def build_file_movement(src_path, dest_path, file_info, content_hash=None, compression=None, stored_size=None,
+                        pack_id=None, pack_offset=None):
+    return FileMovement(
+        full_path=src_path,
+        destination_path=dest_path,
+        creation_time=datetime.strptime(file_info['creation_time'], '%Y-%m-%d %H:%M:%S'),
+        last_access_time=datetime.strptime(file_info['last_access_time'], '%Y-%m-%d %H:%M:%S'),
+        last_modified_time=datetime.strptime(file_info['last_modified_time'], '%Y-%m-%d %H:%M:%S'),
+        file_size=file_info['file_size'],
+        action_type=ActionType.moved_to_archive,
+        content_hash=content_hash,
+        compression=compression,
+        stored_size=stored_size,
+        pack_id=pack_id,
+        pack_offset=pack_offset,
+        archive_target=target_from_path(dest_path)
+    )
+
+
+def move_file(file_info):
+    
+    src_path = normalize_path(file_info['full_path'])
+
+    if src_path.endswith("_shortcut.bat") or src_path.endswith(".bat"):
+        print(f"⛔ Skipped: Shortcut or batch file detected → {src_path}")
+        return None, None
+
+    # Only placed when a copy is made, a deduplicated file takes no space or traffic on a target
+    dest_folder = None
+    started = None
+    try:
+        storage.stat(src_path)  
+        print("File is accessible, proceeding with move...")
+
+        db = SessionLocal()
+        try:
+            content_hash = None
+            compression = None
+            stored_size = None
+            dest_path = None
+            if is_content_addressed():
+                blob, content_hash = find_duplicate_blob(db, src_path, file_info['file_size'])
+                if blob:
+                    blob.ref_count += 1
+                    dest_path = blob.archive_path
+                    compression = blob.compression
+                    stored_size = 0
+                    print(f"Identical content already archived: {dest_path}")
+
+            if not dest_path:
+                dest_folder = place_file(file_info['file_size'])
+
+                print(f"DEBUG: Attempting to move file")
+                print(f"  Source: {src_path}")
+                print(f"  Destination Folder: {dest_folder}")
+
+                if not dest_folder:
+                    print(f"Skipping file {src_path} (Invalid archive destination)")
+                    return None, None
+
+                started = time.monotonic()
+                compression = choose_compression(src_path, file_info['file_size'])
+                dest_path = get_destination_path(src_path, dest_folder, compression)
+                print(f"Final Destination Path: {dest_path}")
+
+                result = copy_to_archive(src_path, dest_path, file_info['file_size'], compression=compression)
+                content_hash = result["content_hash"]
+                stored_size = result["stored_size"]
+
+                if not verify_archive_copy(dest_path, file_info['file_size'], content_hash, compression):
+                    return None, None
+                if is_content_addressed():
+                    dest_path = store_archive_blob(db, dest_path, content_hash, file_info['file_size'], compression, stored_size)
+
+            db.commit()
 
-        os.remove(temp_file_path)
+            try:
+                delete_source(src_path)
+            except Exception:
+                if is_content_addressed():
+                    # The source stays, so the reference taken for it is given back
+                    release_archive_copy(db, dest_path, content_hash)
+                    db.commit()
+                raise
+        finally:
+            db.close()
 
-        file_movement = FileMovement(
-            full_path=src_path,
-            destination_path=dest_path,
-            creation_time=datetime.strptime(file_info['creation_time'], '%Y-%m-%d %H:%M:%S'),
-            last_access_time=datetime.strptime(file_info['last_access_time'], '%Y-%m-%d %H:%M:%S'),
-            last_modified_time=datetime.strptime(file_info['last_modified_time'], '%Y-%m-%d %H:%M:%S'),
-            file_size=file_info['file_size'],
-            action_type=ActionType.moved_to_archive
-        )
+        finalize_archive(src_path, dest_path, file_info)
 
-        return dest_path, file_movement
+        return dest_path, build_file_movement(src_path, dest_path, file_info, content_hash, compression, stored_size)
 
     except FileNotFoundError:
         print(f"File not found: {src_path}")
@@ -113,6 +336,9 @@ def move_file(file_info):
     except Exception as e:
         print(f"Failed to move {src_path}: {e}")
         return None, None
+    finally:
+        if dest_folder:
+            finish_placement(dest_folder, file_info['file_size'], started)
 
 
 
@@ -120,7 +346,7 @@ def create_shortcut(original_path, archive_path):
     shortcut_path = original_path + "_shortcut.bat"  # Create a .bat file
     
     try:
-        with open(shortcut_path, 'w') as shortcut:
+        with open(storage.os_path(shortcut_path), 'w') as shortcut:
             shortcut.write(f'@echo off\nstart "" "{archive_path}"\n')  # Opens the file when double-clicked
         
         print(f"Shortcut created: {shortcut_path} → {archive_path}")
@@ -139,80 +365,124 @@ def process_files_for_archival(files):
 
 
 
-def restore_file(archive_folder, filename):
+def finish_restore(db: Session, archive_entry: FileMovement):
+    original_path = archive_entry.full_path
+
+    # Restore timestamps
+    os.utime(storage.os_path(original_path), (
+        archive_entry.last_access_time.timestamp(),
+        archive_entry.last_modified_time.timestamp()
+    ))
+    print(f"Timestamps restored for {original_path}")
+
+    # Remove the shortcut file if exists
+    shortcut_path = original_path + "_shortcut.bat"
+    if os.path.exists(storage.os_path(shortcut_path)):
+        os.remove(storage.os_path(shortcut_path))
+        print(f"Removed shortcut: {shortcut_path}")
+
+    # Log restore operation
+    log_file_movement(
+        db,
+        full_path=original_path,
+        destination_path=archive_entry.destination_path,
+        creation_time=archive_entry.creation_time.strftime('%Y-%m-%d %H:%M:%S'),
+        last_access_time=archive_entry.last_access_time.strftime('%Y-%m-%d %H:%M:%S'),
+        last_modified_time=archive_entry.last_modified_time.strftime('%Y-%m-%d %H:%M:%S'),
+        file_size=archive_entry.file_size,
+        action_type=ActionType.restored_from_archive,
+        content_hash=archive_entry.content_hash
+    )
+
+    return original_path
+
+
+def restore_pack_member(db: Session, archive_entry: FileMovement):
+    """
+    Restores one file from a pack by seeking to its offset; the pack is deleted once
+    every member has been restored.
+    """
+    size = archive_entry.stored_size if archive_entry.stored_size is not None else archive_entry.file_size
+
+    if not verify_pack_member(archive_entry.destination_path, archive_entry.pack_offset, size, archive_entry.content_hash):
+        print(f"Pack member is corrupt: {archive_entry.destination_path} at {archive_entry.pack_offset}. Skipping restore.")
+        # It can't be restored from here, so it no longer keeps the pack alive
+        empty_pack = drop_pack_member(db, archive_entry.pack_id, archive_entry.pack_offset)
+        db.commit()
+        if empty_pack:
+            remove_pack(empty_pack)
+        return False
+
+    data = read_pack_member(archive_entry.destination_path, archive_entry.pack_offset, size)
+    with storage.open_file(archive_entry.full_path, mode="wb") as restored:
+        restored.write(data)
+    print(f"Restored file to: {archive_entry.full_path}")
+
+    if not verify_archive_copy(archive_entry.full_path, size, archive_entry.content_hash):
+        print(f"Could not verify restored file. Keeping pack member.")
+        return False
+
+    # Committed with the restore record
+    empty_pack = drop_pack_member(db, archive_entry.pack_id, archive_entry.pack_offset)
+    restored_path = finish_restore(db, archive_entry)
+    if empty_pack:
+        remove_pack(empty_pack)
+    return restored_path
+
+
+@prioritized(INTERACTIVE)
+def restore_file(archive_folder, filename, movement_id=None):
     from sqlalchemy import desc
 
     archive_path = os.path.join(archive_folder, filename)
     print(f"Preparing to restore {filename} from {archive_path}")
 
-    db_gen = get_db()
-    db = next(db_gen)
+    db = SessionLocal()
     try:
+        query = db.query(FileMovement)\
+            .filter(FileMovement.action_type == ActionType.moved_to_archive)
+        if movement_id is not None:
+            # Content-addressed copies are shared, the movement identifies which file to restore
+            query = query.filter(FileMovement.id == movement_id)
+        else:
+            query = query.filter(FileMovement.destination_path == normalize_path(archive_path))
+
         # Find the most recent archive entry for the given file
-        archive_entry = db.query(FileMovement)\
-            .filter(FileMovement.destination_path == normalize_path(archive_path))\
-            .filter(FileMovement.action_type == ActionType.moved_to_archive)\
-            .order_by(desc(FileMovement.timestamp))\
-            .first()
+        archive_entry = query.order_by(desc(FileMovement.timestamp)).first()
 
         if not archive_entry:
             print(f"No matching archive entry found in DB for: {filename}")
             return False
 
+        archive_path = archive_entry.destination_path
+
         original_path = archive_entry.full_path
         print(f"Restoring {filename}")
         print(f"  Source (Archive): {archive_path}")
         print(f"  Destination (Original): {original_path}")
 
-        # Copy from archive to temp file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file_path = temp_file.name
-            with open(temp_file_path, "wb") as f:
-                with smbclient.open_file(archive_path, mode="rb") as remote_file:
-                    shutil.copyfileobj(remote_file, f)
-        print(f"Downloaded file from archive to local temp: {temp_file_path}")
-
-        # Copy from temp to original location
-        with open(temp_file_path, "rb") as f:
-            with smbclient.open_file(original_path, mode="wb") as remote_file:
-                shutil.copyfileobj(f, remote_file)
+        if archive_entry.pack_id:
+            return restore_pack_member(db, archive_entry)
+
+        # Copy from archive straight back to the original location
+        hasher = ContentHasher(archive_entry.content_hash.split(":", 1)[0]) if archive_entry.content_hash else None
+        if archive_entry.compression:
+            decompress_copy(archive_path, original_path, hasher=hasher)
+        else:
+            copy_file(archive_path, original_path, archive_entry.file_size, hasher=hasher)
         print(f"Restored file to: {original_path}")
 
+        if hasher and hasher.hexdigest() != archive_entry.content_hash:
+            print(f"Archive copy is corrupt: {archive_path} does not match {archive_entry.content_hash}. Skipping archive deletion.")
+            return False
+
         # Remove the file from archive
-        try:
-            smbclient.stat(original_path)
-            smbclient.remove(archive_path)
-            print(f"Deleted file from archive: {archive_path}")
-        except FileNotFoundError:
+        if not verify_archive_copy(original_path, archive_entry.file_size, archive_entry.content_hash):
             print(f"Could not verify restored file. Skipping archive deletion.")
             return False
+        release_archive_copy(db, archive_path, archive_entry.content_hash)
 
-        # Restore timestamps
-        os.utime(original_path, (
-            archive_entry.last_access_time.timestamp(),
-            archive_entry.last_modified_time.timestamp()
-        ))
-        print(f"Timestamps restored for {original_path}")
-
-        # Remove the shortcut file if exists
-        shortcut_path = original_path + "_shortcut.bat"
-        if os.path.exists(shortcut_path):
-            os.remove(shortcut_path)
-            print(f"Removed shortcut: {shortcut_path}")
-
-        # Log restore operation
-        log_file_movement(
-            db,
-            full_path=original_path,
-            destination_path=archive_path,
-            creation_time=archive_entry.creation_time.strftime('%Y-%m-%d %H:%M:%S'),
-            last_access_time=archive_entry.last_access_time.strftime('%Y-%m-%d %H:%M:%S'),
-            last_modified_time=archive_entry.last_modified_time.strftime('%Y-%m-%d %H:%M:%S'),
-            file_size=archive_entry.file_size,
-            action_type=ActionType.restored_from_archive
-        )
-
-        return original_path
+        return finish_restore(db, archive_entry)
 
     except FileNotFoundError:
         print(f"File not found in archive: {archive_path}")
@@ -224,61 +494,9 @@ def restore_file(archive_folder, filename):
         print(f"Failed to restore {filename}: {e}")
         return False
     finally:
-        db_gen.close()
+        db.close()
 
     
-def archive_filtered_files(filters: dict, blacklist: list, share_name: str):
-    """
-    Scans all SVM volumes, filters files, archives matching ones, and logs all moves to DB in bulk.
-    Returns a summary.
-    """
-    print(f"🔍 Starting archive process for share: {share_name}")
-
-    svm_data = get_svm_data_volumes()
-    if not svm_data:
-        return {"status": "failed", "reason": "No SVM volumes found"}
-
-    all_files = scan_volume(svm_data)
-    if not all_files or share_name not in all_files:
-        return {"status": "no_files", "reason": f"No files found in {share_name}"}
-
-    filtered = filter_files(all_files, filters, blacklist, share_name)
-
-    if not filtered:
-        return {"status": "no_matches"}
-
-    archived_files = []
-    movements = []
-
-    for file_info in filtered.get(share_name, []):
-        archive_path, movement = move_file(file_info)
-        if archive_path and movement:
-            archived_files.append({
-                "filename": os.path.basename(file_info["full_path"]),
-                "original_path": file_info["full_path"],
-                "archived_path": archive_path
-            })
-            movements.append(movement)
-
-    if movements:
-        db_gen = get_db()
-        db = next(db_gen)
-        try:
-            db.bulk_save_objects(movements)
-            db.commit()
-        except Exception as e:
-            print(f"❌ Failed to save file movements to DB: {e}")
-            db.rollback()
-        finally:
-            db_gen.close()
-
-    return {
-        "status": "success" if archived_files else "no_matches",
-        "archived_count": len(archived_files),
-        "files": archived_files
-    }
-
-
     #    print(scan_volume(get_svm_data_volumes()))
 #    print(get_svm_data_volumes())
 
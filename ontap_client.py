@@ -0,0 +1,151 @@
+"""
+ONTAP REST access. One persistent HTTP session (keep-alive, connection pool) is shared by
+every lookup; independent collections are fetched concurrently, each asking only for the
+fields it needs and paging with max_records. Idempotent GETs are retried with backoff.
+
+Point ONTAP_URL at mock_ontap.py to work without a cluster:
+
+    python mock_ontap.py --port 8080
+    ONTAP_URL=http://127.0.0.1:8080 python ontap_client.py --repeat 20
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+ONTAP_URL = os.getenv("ONTAP_URL", "https://192.168.16.4")
+ONTAP_USERNAME = os.getenv("ONTAP_USERNAME", "admin")
+ONTAP_PASSWORD = os.getenv("ONTAP_PASSWORD", "Netapp1!")
+ONTAP_VERIFY_SSL = os.getenv("ONTAP_VERIFY_SSL", "false").lower() == "true"
+ONTAP_TIMEOUT = float(os.getenv("ONTAP_TIMEOUT", 30))
+ONTAP_MAX_RECORDS = int(os.getenv("ONTAP_MAX_RECORDS", 1000))
+ONTAP_RETRIES = int(os.getenv("ONTAP_RETRIES", 4))
+# Retries wait backoff * 2^n seconds
+ONTAP_RETRY_BACKOFF = float(os.getenv("ONTAP_RETRY_BACKOFF", 0.5))
+ONTAP_CONCURRENCY = int(os.getenv("ONTAP_CONCURRENCY", 4))
+# Asynchronous requests (snapshot create/delete) answer with a job that is polled until done
+ONTAP_JOB_TIMEOUT = float(os.getenv("ONTAP_JOB_TIMEOUT", 300))
+ONTAP_JOB_POLL_SECONDS = float(os.getenv("ONTAP_JOB_POLL_SECONDS", 1))
+
+if not ONTAP_VERIFY_SSL:
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+class OntapClient:
+    def __init__(self, base_url=ONTAP_URL, username=ONTAP_USERNAME, password=ONTAP_PASSWORD,
+                 verify=ONTAP_VERIFY_SSL, concurrency=ONTAP_CONCURRENCY):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+        self.session.verify = verify
+        self.session.headers["Accept"] = "application/json"
+
+        retry = Retry(
+            total=ONTAP_RETRIES,
+            backoff_factor=ONTAP_RETRY_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=max(1, concurrency))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ontap")
+
+    def get(self, path, params=None):
+        url = path if path.startswith("http") else self.base_url + path
+        response = self.session.get(url, params=params, timeout=ONTAP_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path, body):
+        # Not retried, a POST that reached the cluster may already have taken effect
+        response = self.session.post(self.base_url + path, json=body, timeout=ONTAP_TIMEOUT)
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def delete(self, path):
+        response = self.session.delete(self.base_url + path, timeout=ONTAP_TIMEOUT)
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def wait_for_job(self, body):
+        """
+        Waits for the job an asynchronous request returned (202 with a job link), if any.
+        """
+        job = body.get("job")
+        if not job:
+            return body
+        href = job.get("_links", {}).get("self", {}).get("href") or f"/api/cluster/jobs/{job['uuid']}"
+        deadline = time.monotonic() + ONTAP_JOB_TIMEOUT
+        while True:
+            status = self.get(href, {"fields": "state,message"})
+            if status.get("state") == "success":
+                return status
+            if status.get("state") in ("failure", "error"):
+                raise RuntimeError(f"ONTAP job {job.get('uuid')} failed: {status.get('message')}")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"ONTAP job {job.get('uuid')} still {status.get('state')} after {ONTAP_JOB_TIMEOUT:.0f}s")
+            time.sleep(ONTAP_JOB_POLL_SECONDS)
+
+    def get_collection(self, path, fields, **query):
+        """
+        All records of a collection. Query values are ONTAP filters, e.g. name="vol1|vol2".
+        """
+        params = {"fields": fields, "max_records": ONTAP_MAX_RECORDS, **query}
+        records = []
+        while path:
+            body = self.get(path, params)
+            records.extend(body.get("records", []))
+            # The next link already carries the query
+            path = body.get("_links", {}).get("next", {}).get("href")
+            params = None
+        return records
+
+    def get_collections(self, queries):
+        """
+        Fetches {key: (path, fields, query)} concurrently, returns {key: records}.
+        """
+        futures = {
+            key: self.executor.submit(self.get_collection, path, fields, **query)
+            for key, (path, fields, query) in queries.items()
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = OntapClient()
+    return _client
+
+
+def main():
+    # Times topology discovery, e.g. against mock_ontap.py
+    from netapp_btc import fetch_ontap_topology
+
+    parser = argparse.ArgumentParser(description="Time ONTAP topology discovery")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        topology = fetch_ontap_topology()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"{len(topology.get('shares', []))} shares, {len(topology.get('lifs', []))} LIFs")
+    print(f"min {timings[0] * 1000:.1f} ms, median {timings[len(timings) // 2] * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import json
+import ntpath
+import os
+import tarfile
+import time
+
+import storage
+from sqlalchemy.orm import Session
+
+from models import ArchiveJobFile, ArchivePack, FileMovement
+from transfer import ContentHasher, TRANSFER_HASH_ALGORITHM
+from transfer_scheduler import transfer_slot
+
+
+# Files up to this size are bundled into pack files instead of being archived one by one
+ARCHIVE_PACK_MAX_FILE_SIZE = int(os.getenv("ARCHIVE_PACK_MAX_FILE_SIZE", 64 * 1024))
+# A pack is closed once it holds this many bytes or members
+ARCHIVE_PACK_TARGET_SIZE = int(os.getenv("ARCHIVE_PACK_TARGET_SIZE", 256 * 1024 * 1024))
+ARCHIVE_PACK_MAX_MEMBERS = int(os.getenv("ARCHIVE_PACK_MAX_MEMBERS", 10000))
+
+TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+def group_pack_members(job_files):
+    """
+    Splits small files into pack-sized groups, never mixing directories in one pack.
+    """
+    by_directory = {}
+    for job_file in job_files:
+        by_directory.setdefault(ntpath.dirname(job_file.full_path), []).append(job_file)
+
+    groups = []
+    for members in by_directory.values():
+        current, current_size = [], 0
+        for job_file in members:
+            file_size = job_file.file_size or 0
+            if current and (len(current) >= ARCHIVE_PACK_MAX_MEMBERS or current_size + file_size > ARCHIVE_PACK_TARGET_SIZE):
+                groups.append(current)
+                current, current_size = [], 0
+            current.append(job_file)
+            current_size += file_size
+        if current:
+            groups.append(current)
+    return groups
+
+
+def write_pack(pack_path, src_paths):
+    """
+    Writes src_paths into a tar pack at pack_path and a JSON index next to it.
+    Returns one entry per member with the offset of its data inside the pack, its size
+    and content hash, so a single member can later be read with one seek.
+    """
+    index = []
+    offset = 0
+    with storage.open_file(pack_path, mode="wb") as pack:
+        for position, src_path in enumerate(src_paths):
+            # Small by definition, read whole so the header can carry the real size
+            with transfer_slot(), storage.open_file(src_path, mode="rb") as src:
+                data = src.read()
+
+            hasher = ContentHasher(TRANSFER_HASH_ALGORITHM)
+            hasher.update(data)
+
+            tar_info = tarfile.TarInfo(name=f"{position:06d}_{ntpath.basename(src_path)}")
+            tar_info.size = len(data)
+            tar_info.mtime = int(time.time())
+            header = tar_info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape")
+
+            with transfer_slot():
+                pack.write(header)
+            offset += len(header)
+            index.append({
+                "full_path": src_path,
+                "member": tar_info.name,
+                "offset": offset,
+                "size": len(data),
+                "content_hash": hasher.hexdigest()
+            })
+
+            with transfer_slot():
+                pack.write(data)
+            padding = (TAR_BLOCK_SIZE - len(data) % TAR_BLOCK_SIZE) % TAR_BLOCK_SIZE
+            pack.write(b"\0" * padding)
+            offset += len(data) + padding
+
+        # End-of-archive marker so standard tar tools can open the pack too
+        pack.write(b"\0" * TAR_BLOCK_SIZE * 2)
+
+    with storage.open_file(pack_path + ".idx.json", mode="w") as index_file:
+        index_file.write(json.dumps(index))
+
+    return index
+
+
+def read_pack_member(pack_path, offset, size):
+    with transfer_slot(), storage.open_file(pack_path, mode="rb") as pack:
+        pack.seek(offset)
+        return pack.read(size)
+
+
+def verify_pack_member(pack_path, offset, size, content_hash):
+    data = read_pack_member(pack_path, offset, size)
+    if len(data) != size:
+        print(f"Size mismatch in pack {pack_path} at {offset}: expected {size}, found {len(data)}. Not deleting original.")
+        return False
+
+    hasher = ContentHasher(content_hash.split(":", 1)[0])
+    hasher.update(data)
+    if hasher.hexdigest() != content_hash:
+        print(f"Hash mismatch in pack {pack_path} at {offset}. Not deleting original.")
+        return False
+    return True
+
+
+def drop_pack_member(db: Session, pack_id: int, offset: int):
+    """
+    Counts the member at offset as gone from its pack, restored or unreadable. Once no
+    member is left the pack row is deleted (with the references to it) in the caller's
+    transaction and its path returned; remove the files with remove_pack() after the commit.
+    """
+    pack = db.query(ArchivePack).filter(ArchivePack.id == pack_id).with_for_update().first()
+    if not pack:
+        return None
+    dropped = list(pack.dropped_offsets or [])
+    if offset in dropped:
+        return None
+    pack.dropped_offsets = dropped + [offset]
+    pack.live_members -= 1
+    if pack.live_members > 0:
+        return None
+
+    db.query(FileMovement).filter(FileMovement.pack_id == pack.id).update({FileMovement.pack_id: None}, synchronize_session=False)
+    db.query(ArchiveJobFile).filter(ArchiveJobFile.pack_id == pack.id).update({ArchiveJobFile.pack_id: None}, synchronize_session=False)
+    db.delete(pack)
+    return pack.archive_path
+
+
+def remove_pack(pack_path):
+    for path in (pack_path, pack_path + ".idx.json"):
+        try:
+            storage.remove(path)
+        except FileNotFoundError:
+            pass
+    print(f"Deleted pack: {pack_path}")
@@ -0,0 +1,156 @@
+"""
+Chooses the archive share each archived file is written to.
+
+Every CIFS archive share found in the ONTAP topology is a target. A file goes to the
+target whose share of the recent write traffic is furthest below its share of the free
+space, so over time each target receives bytes in proportion to its free space. Bytes
+still being written count towards a target's traffic until they finish, so a target
+that writes slowly accumulates load and is chosen less often.
+"""
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from netapp_btc import fetch_volume_space, get_svm_archive_volumes, normalize_path
+
+
+ARCHIVE_SERVER = os.getenv("ARCHIVE_SERVER", "192.168.16.15")
+# A target is skipped when a file would leave it with less free space than this
+PLACEMENT_MIN_FREE_BYTES = int(os.getenv("PLACEMENT_MIN_FREE_BYTES", 5 * 1024 ** 3))
+# Completed writes count towards a target's traffic for this long
+PLACEMENT_WINDOW_SECONDS = float(os.getenv("PLACEMENT_WINDOW_SECONDS", 300))
+PLACEMENT_SPACE_SECONDS = float(os.getenv("PLACEMENT_SPACE_SECONDS", 60))
+
+
+def target_path(share_name):
+    return f"\\\\{ARCHIVE_SERVER}\\{share_name}"
+
+
+def target_from_path(archive_path):
+    """
+    The archive share of a path below it: \\\\server\\share\\... -> share.
+    """
+    parts = normalize_path(archive_path).lstrip("\\").split("\\")
+    return parts[1] if len(parts) > 1 else None
+
+
+class PlacementEngine:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        # Free bytes per share at the last ONTAP read, and bytes placed on it since
+        self.available = {}
+        self.space_loaded_at = 0.0
+        self.reserved = defaultdict(int)
+        self.in_flight = defaultdict(int)
+        self.completed = defaultdict(deque)  # (finished at, bytes, seconds)
+
+    def targets(self):
+        """
+        Maps archive share name to its volume.
+        """
+        archive = get_svm_archive_volumes() or {}
+        return {share['share_name']: share.get('volume') for share in archive.get('volumes', []) if share.get('share_name')}
+
+    def refresh_space(self, targets):
+        with self.refresh_lock:
+            if time.monotonic() - self.space_loaded_at < PLACEMENT_SPACE_SECONDS:
+                return
+            try:
+                space = fetch_volume_space({volume for volume in targets.values() if volume})
+            except Exception as e:
+                # Keep placing on the last known numbers, retry on the next call
+                print(f"⚠️ Could not read archive volume space: {e}")
+                return
+            with self.lock:
+                self.available = {
+                    share: space[volume]['available'] for share, volume in targets.items() if volume in space
+                }
+                # The new reading already includes what was written since the last one
+                self.reserved.clear()
+                self.space_loaded_at = time.monotonic()
+
+    def _expire(self, now):
+        for completed in self.completed.values():
+            while completed and now - completed[0][0] > PLACEMENT_WINDOW_SECONDS:
+                completed.popleft()
+
+    def _load(self, share):
+        return self.in_flight[share] + sum(size for _, size, _ in self.completed[share])
+
+    def place(self, file_size):
+        """
+        Picks the target for file_size bytes and counts them as in flight there.
+        Returns the target's share path, or None when no target has room.
+        """
+        targets = self.targets()
+        if not targets:
+            print("Error: No valid archive volumes found.")
+            return None
+        self.refresh_space(targets)
+
+        with self.lock:
+            self._expire(time.monotonic())
+            free = {share: self.available[share] - self.reserved[share] for share in targets if share in self.available}
+            if free:
+                eligible = {share: space for share, space in free.items() if space - file_size >= PLACEMENT_MIN_FREE_BYTES}
+                if not eligible:
+                    print(f"❌ No archive volume has room for {file_size} bytes")
+                    return None
+            else:
+                # Space unknown, spread by traffic alone
+                eligible = {share: 1 for share in targets}
+
+            total_free = sum(eligible.values()) or 1
+            load = {share: self._load(share) for share in eligible}
+            total_load = sum(load.values())
+
+            def score(share):
+                traffic_share = load[share] / total_load if total_load else 0.0
+                return traffic_share - eligible[share] / total_free, -eligible[share]
+
+            share = min(eligible, key=score)
+            self.reserved[share] += file_size
+            self.in_flight[share] += file_size
+        return target_path(share)
+
+    def finish(self, archive_path, file_size, seconds=None):
+        """
+        Marks a placed write as done, successful or not.
+        """
+        share = target_from_path(archive_path)
+        with self.lock:
+            self.in_flight[share] = max(0, self.in_flight[share] - file_size)
+            self.completed[share].append((time.monotonic(), file_size, seconds or 0.0))
+
+    def snapshot(self):
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            shares = set(self.available) | set(self.in_flight) | set(self.completed)
+            result = {}
+            for share in sorted(shares):
+                completed = self.completed[share]
+                busy_seconds = sum(seconds for _, _, seconds in completed)
+                written = sum(size for _, size, _ in completed)
+                result[share] = {
+                    "path": target_path(share),
+                    "available_bytes": self.available.get(share),
+                    "reserved_bytes": self.reserved[share],
+                    "in_flight_bytes": self.in_flight[share],
+                    "recent_bytes": written,
+                    "recent_bytes_per_second": round(written / busy_seconds) if busy_seconds else None
+                }
+            return {"window_seconds": PLACEMENT_WINDOW_SECONDS, "targets": result}
+
+
+placement = PlacementEngine()
+
+
+def place_file(file_size):
+    return placement.place(file_size or 0)
+
+
+def finish_placement(archive_path, file_size, started=None):
+    placement.finish(archive_path, file_size or 0, time.monotonic() - started if started else None)
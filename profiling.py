@@ -0,0 +1,245 @@
+"""
+On-demand profiling of a running process.
+
+Sampling: a background thread reads the stacks of the profiled threads every few
+milliseconds (sys._current_frames, nothing is installed in the profiled code) and
+counts them as collapsed stacks, the "root;caller;callee count" format flamegraph.pl,
+speedscope and inferno read. A session follows the threads of one archive job (including
+the block copy and hashing pool threads working for it), or every thread of the process
+for profiling requests. Distributed jobs run in worker.py processes and can't be followed
+from the API.
+
+Memory: while tracemalloc is enabled, memory_stage() snapshots the heap around the scan
+and filter stages of archive jobs and keeps the largest allocation differences.
+
+Both are off by default. When off, job threads only register their id once per job and
+memory_stage() is a check of tracemalloc.is_tracing().
+"""
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+
+PROFILING_MAX_DURATION_SECONDS = float(os.getenv("PROFILING_MAX_DURATION_SECONDS", 300))
+PROFILING_MAX_SESSIONS = int(os.getenv("PROFILING_MAX_SESSIONS", 10))
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", 10))
+PROFILING_MEMORY_TOP = int(os.getenv("PROFILING_MEMORY_TOP", 25))
+PROFILING_MAX_STAGE_REPORTS = int(os.getenv("PROFILING_MAX_STAGE_REPORTS", 50))
+
+_job_threads = {}
+_thread_jobs = {}
+_job_threads_lock = threading.Lock()
+
+
+@contextmanager
+def profiled_job(job_id):
+    """
+    Marks the current thread as working on job_id, so a job profile can find it.
+    Nothing is registered for job_id None; an already registered thread stays registered.
+    """
+    if job_id is None:
+        yield
+        return
+
+    ident = threading.get_ident()
+    with _job_threads_lock:
+        threads = _job_threads.setdefault(job_id, set())
+        registered = ident not in threads
+        threads.add(ident)
+        previous_job = _thread_jobs.get(ident)
+        _thread_jobs[ident] = job_id
+    try:
+        yield
+    finally:
+        with _job_threads_lock:
+            if previous_job is None:
+                _thread_jobs.pop(ident, None)
+            else:
+                _thread_jobs[ident] = previous_job
+            threads = _job_threads.get(job_id)
+            if registered and threads is not None:
+                threads.discard(ident)
+                if not threads:
+                    del _job_threads[job_id]
+
+
+def current_job():
+    """
+    Job the current thread is registered for, to hand on to pool threads (which don't
+    inherit it) like the transfer priority.
+    """
+    with _job_threads_lock:
+        return _thread_jobs.get(threading.get_ident())
+
+
+def profiled_job_entry(func):
+    """
+    Decorator form of profiled_job() for job entry points taking the job id first.
+    """
+    @wraps(func)
+    def wrapper(job_id, *args, **kwargs):
+        with profiled_job(job_id):
+            return func(job_id, *args, **kwargs)
+    return wrapper
+
+
+def job_threads(job_id):
+    with _job_threads_lock:
+        return set(_job_threads.get(job_id, ()))
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingSession(threading.Thread):
+    def __init__(self, session_id, job_id=None, duration=30.0, interval=0.005):
+        super().__init__(name=f"profiler-{session_id}", daemon=True)
+        self.session_id = session_id
+        self.job_id = job_id
+        self.duration = min(duration, PROFILING_MAX_DURATION_SECONDS)
+        self.interval = max(interval, 0.001)
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        own_ident = threading.get_ident()
+        while not self.stop_event.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            idents = job_threads(self.job_id) if self.job_id is not None else set(frames) - {own_ident}
+            with self.lock:
+                for ident in idents:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self.stacks[collapse(frame)] += 1
+                        self.samples += 1
+            del frames
+        self.finished_at = datetime.utcnow()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stack_counts(self):
+        with self.lock:
+            return dict(self.stacks.most_common())
+
+    def collapsed(self):
+        with self.lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        with self.lock:
+            return {
+                "session_id": self.session_id,
+                "job_id": self.job_id,
+                "running": self.is_alive(),
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "duration_seconds": self.duration,
+                "interval_ms": self.interval * 1000,
+                "samples": self.samples,
+                "distinct_stacks": len(self.stacks)
+            }
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_session_ids = itertools.count(1)
+
+
+def start_sampling(job_id=None, duration=30.0, interval_ms=5.0):
+    with _sessions_lock:
+        session = SamplingSession(next(_session_ids), job_id, duration, interval_ms / 1000.0)
+        _sessions[session.session_id] = session
+        # Forget the oldest finished sessions
+        for old_id in sorted(_sessions)[:-PROFILING_MAX_SESSIONS]:
+            if not _sessions[old_id].is_alive():
+                del _sessions[old_id]
+    session.start()
+    print(f"🔬 Profiling session {session.session_id} started ({'job ' + str(job_id) if job_id is not None else 'all threads'})")
+    return session
+
+
+def get_session(session_id):
+    with _sessions_lock:
+        return _sessions.get(session_id)
+
+
+def list_sessions():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    return [session.summary() for session in sessions]
+
+
+_stage_reports = deque(maxlen=PROFILING_MAX_STAGE_REPORTS)
+
+
+def enable_memory_tracing(enabled: bool):
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return tracemalloc.is_tracing()
+
+
+@contextmanager
+def memory_stage(stage, job_id=None):
+    """
+    Records the heap growth of the enclosed block while tracemalloc is on.
+    """
+    if not tracemalloc.is_tracing():
+        yield
+        return
+
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        differences = after.compare_to(before, "traceback")[:PROFILING_MEMORY_TOP]
+        _stage_reports.append({
+            "stage": stage,
+            "job_id": job_id,
+            "finished_at": datetime.utcnow(),
+            "seconds": round(time.monotonic() - started, 3),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top_allocations": [
+                {
+                    "size_diff": difference.size_diff,
+                    "count_diff": difference.count_diff,
+                    "size": difference.size,
+                    # Innermost frame first
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in reversed(difference.traceback)]
+                }
+                for difference in differences
+            ]
+        })
+
+
+def memory_report():
+    return {"tracing": tracemalloc.is_tracing(), "stages": list(_stage_reports)}
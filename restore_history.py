@@ -0,0 +1,165 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import ActionType, FileMovement, RestoreStats
+from netapp_btc import normalize_path
+
+
+PINGPONG_AVOIDANCE = os.getenv("PINGPONG_AVOIDANCE", "true").lower() == "true"
+# Files restored within this many days are not archived again
+PINGPONG_RECENT_DAYS = int(os.getenv("PINGPONG_RECENT_DAYS", 30))
+# Files restored at least this many times are not archived again
+PINGPONG_MAX_RESTORES = int(os.getenv("PINGPONG_MAX_RESTORES", 3))
+
+# Lookups are chunked to keep the IN list of one query reasonable
+STATS_LOOKUP_CHUNK = 5000
+
+
+def record_restore(db: Session, full_path: str, file_size: int, restored_at: datetime = None):
+    """
+    Counts one restore of full_path in the summary table; committed with the caller's movement.
+    """
+    full_path = normalize_path(full_path)
+    restored_at = restored_at or datetime.utcnow()
+    stats = db.query(RestoreStats).filter(RestoreStats.full_path == full_path).first()
+    if not stats:
+        stats = RestoreStats(full_path=full_path, restore_count=0, bytes_restored=0, skipped_count=0, skipped_bytes=0)
+        db.add(stats)
+    stats.restore_count += 1
+    stats.bytes_restored += file_size or 0
+    if not stats.last_restored_at or restored_at > stats.last_restored_at:
+        stats.last_restored_at = restored_at
+    return stats
+
+
+def rebuild_restore_stats(db: Session):
+    """
+    Recomputes the summary table from file_movements, for restores logged before it existed.
+    Skip counters are kept.
+    """
+    rows = db.query(
+        FileMovement.full_path,
+        func.count(FileMovement.id),
+        func.coalesce(func.sum(FileMovement.file_size), 0),
+        func.max(FileMovement.timestamp)
+    )\
+        .filter(FileMovement.action_type == ActionType.restored_from_archive)\
+        .group_by(FileMovement.full_path)\
+        .all()
+
+    existing = {stats.full_path: stats for stats in db.query(RestoreStats).all()}
+    for full_path, restore_count, bytes_restored, last_restored_at in rows:
+        stats = existing.get(full_path)
+        if not stats:
+            stats = RestoreStats(full_path=full_path, skipped_count=0, skipped_bytes=0)
+            db.add(stats)
+        stats.restore_count = restore_count
+        stats.bytes_restored = bytes_restored
+        stats.last_restored_at = last_restored_at
+    db.commit()
+    return len(rows)
+
+
+def load_restore_stats(db: Session, paths):
+    paths = list(paths)
+    stats = {}
+    for start in range(0, len(paths), STATS_LOOKUP_CHUNK):
+        chunk = paths[start:start + STATS_LOOKUP_CHUNK]
+        for entry in db.query(RestoreStats).filter(RestoreStats.full_path.in_(chunk)).all():
+            stats[entry.full_path] = entry
+    return stats
+
+
+def is_pingpong(stats: RestoreStats, now: datetime):
+    if stats.restore_count >= PINGPONG_MAX_RESTORES:
+        return True
+    return stats.last_restored_at is not None and now - stats.last_restored_at < timedelta(days=PINGPONG_RECENT_DAYS)
+
+
+def apply_restore_history(db: Session, candidates: list, skipped: list = None):
+    """
+    Drops candidates that were restored recently or often and moves other previously
+    restored files behind never-restored ones, keeping the order within each group.
+    (stats, file size) of every dropped file is appended to skipped; pass it to
+    record_skipped() once a job is created from the candidates.
+    """
+    if not PINGPONG_AVOIDANCE or not candidates:
+        return candidates
+
+    stats = load_restore_stats(db, {normalize_path(file_info['full_path']) for file_info in candidates})
+    if not stats:
+        return candidates
+
+    now = datetime.utcnow()
+    fresh, restored_before, dropped = [], [], 0
+    for file_info in candidates:
+        entry = stats.get(normalize_path(file_info['full_path']))
+        if not entry:
+            fresh.append(file_info)
+        elif is_pingpong(entry, now):
+            if skipped is not None:
+                skipped.append((entry, file_info['file_size'] or 0))
+            dropped += 1
+        else:
+            restored_before.append(file_info)
+
+    if dropped:
+        print(f"🏓 Skipped {dropped} recently or frequently restored file(s)")
+    return fresh + restored_before
+
+
+def record_skipped(skipped: list, job_id: int):
+    """
+    Counts the files apply_restore_history() left out of job_id in restore_stats, for the
+    avoided-transfer report. Planning the same job again doesn't count a file twice.
+    Committed with the caller's job.
+    """
+    now = datetime.utcnow()
+    for entry, file_size in skipped:
+        if entry.last_skipped_job_id == job_id:
+            continue
+        entry.skipped_count += 1
+        entry.skipped_bytes += file_size
+        entry.last_skipped_at = now
+        entry.last_skipped_job_id = job_id
+
+
+def restore_history_report(db: Session, limit: int = 20):
+    totals = db.query(
+        func.count(RestoreStats.id),
+        func.coalesce(func.sum(RestoreStats.restore_count), 0),
+        func.coalesce(func.sum(RestoreStats.bytes_restored), 0),
+        func.coalesce(func.sum(RestoreStats.skipped_count), 0),
+        func.coalesce(func.sum(RestoreStats.skipped_bytes), 0)
+    ).one()
+
+    top = db.query(RestoreStats)\
+        .filter(RestoreStats.skipped_count > 0)\
+        .order_by(RestoreStats.skipped_bytes.desc())\
+        .limit(limit)\
+        .all()
+
+    return {
+        "restored_files": totals[0],
+        "restores": totals[1],
+        "bytes_restored": totals[2],
+        "skipped_archives": totals[3],
+        "archive_bytes_avoided": totals[4],
+        "policy": {
+            "enabled": PINGPONG_AVOIDANCE,
+            "recent_days": PINGPONG_RECENT_DAYS,
+            "max_restores": PINGPONG_MAX_RESTORES
+        },
+        "top_files": [
+            {
+                "full_path": entry.full_path,
+                "restore_count": entry.restore_count,
+                "last_restored_at": entry.last_restored_at,
+                "skipped_count": entry.skipped_count,
+                "skipped_bytes": entry.skipped_bytes
+            }
+            for entry in top
+        ]
+    }
@@ -0,0 +1,160 @@
+import math
+import os
+import random
+import time
+
+from netapp_btc import access_CIFS_share, filter_files, get_first_ip_address, scan_directory
+
+
+SAMPLE_PROBES = int(os.getenv("SAMPLE_PROBES", 200))
+SAMPLE_TIME_BUDGET_SECONDS = float(os.getenv("SAMPLE_TIME_BUDGET_SECONDS", 10))
+# Top-level directories beyond this many are grouped so each stratum still gets probes
+SAMPLE_MAX_STRATA = int(os.getenv("SAMPLE_MAX_STRATA", 50))
+SAMPLE_MIN_PROBES_PER_STRATUM = 2
+
+# Two-sided normal quantiles
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.96, 0.99: 2.5758}
+
+METRICS = ("total_files", "total_bytes", "matching_files", "matching_bytes")
+
+
+class DirectorySampler:
+    """
+    Estimates totals over a directory tree from random root-to-leaf probes. Each probe
+    weights a directory's files by the product of the branching factors on its way down,
+    which makes the probe an unbiased estimate of the whole subtree (Knuth's estimator).
+    Listings are cached, so directories shared by several probes are read once.
+    """
+    def __init__(self, share_name, filters, blacklist, rng):
+        self.share_name = share_name
+        self.filters = filters or {}
+        self.blacklist = blacklist or []
+        self.rng = rng
+        self.listings = {}
+
+    def list_directory(self, dir_path):
+        if dir_path not in self.listings:
+            try:
+                subdirs, files = scan_directory(dir_path)
+            except OSError as e:
+                print(f"Error accessing directory {dir_path}: {e}")
+                subdirs, files = [], []
+            matching = filter_files({self.share_name: files}, self.filters, self.blacklist, self.share_name)\
+                .get(self.share_name, [])
+            self.listings[dir_path] = (subdirs, (
+                len(files),
+                sum(file_info['file_size'] for file_info in files),
+                len(matching),
+                sum(file_info['file_size'] for file_info in matching)
+            ))
+        return self.listings[dir_path]
+
+    def probe(self, stratum):
+        """
+        One random descent starting at a uniformly chosen directory of the stratum.
+        """
+        weight = len(stratum)
+        dir_path = self.rng.choice(stratum)
+        totals = [0.0] * len(METRICS)
+        while True:
+            subdirs, values = self.list_directory(dir_path)
+            for i, value in enumerate(values):
+                totals[i] += weight * value
+            if not subdirs:
+                return totals
+            weight *= len(subdirs)
+            dir_path = self.rng.choice(subdirs)
+
+    def observed(self):
+        """
+        Exact totals of every directory listed so far, a hard lower bound for the estimate.
+        """
+        totals = [0] * len(METRICS)
+        for _, values in self.listings.values():
+            for i, value in enumerate(values):
+                totals[i] += value
+        return totals
+
+
+def build_strata(top_level_dirs, max_strata, rng):
+    dirs = list(top_level_dirs)
+    rng.shuffle(dirs)
+    count = min(len(dirs), max_strata)
+    return [dirs[i::count] for i in range(count)] if count else []
+
+
+def sample_share(share_path, share_name, filters, blacklist, probes=SAMPLE_PROBES,
+                 time_budget=SAMPLE_TIME_BUDGET_SECONDS, confidence=0.95, seed=None):
+    """
+    Estimates file counts and bytes of a share, in total and matching filter_files(),
+    from a stratified sample of directories. Strata are the top-level directories (grouped
+    when there are many), probed round-robin until the probe count or time budget runs out.
+    """
+    started = time.monotonic()
+    rng = random.Random(seed)
+    sampler = DirectorySampler(share_name, filters, blacklist, rng)
+
+    top_level_dirs, root_values = sampler.list_directory(share_path)
+    # Every stratum needs at least two probes for a variance
+    max_strata = max(1, min(SAMPLE_MAX_STRATA, probes // SAMPLE_MIN_PROBES_PER_STRATUM))
+    strata = build_strata(top_level_dirs, max_strata, rng)
+    samples = [[] for _ in strata]
+
+    taken = 0
+    rounds = 0
+    while strata and taken < probes:
+        if rounds >= SAMPLE_MIN_PROBES_PER_STRATUM and time.monotonic() - started > time_budget:
+            break
+        for index, stratum in enumerate(strata):
+            if taken >= probes:
+                break
+            samples[index].append(sampler.probe(stratum))
+            taken += 1
+        rounds += 1
+
+    z = Z_SCORES.get(confidence, 1.96)
+    observed = sampler.observed()
+    # Files directly in the share root are counted exactly
+    estimates = [float(value) for value in root_values]
+    variances = [0.0] * len(METRICS)
+    for stratum_samples in samples:
+        n = len(stratum_samples)
+        for i in range(len(METRICS)):
+            values = [sample[i] for sample in stratum_samples]
+            mean = sum(values) / n
+            estimates[i] += mean
+            if n > 1:
+                variances[i] += sum((value - mean) ** 2 for value in values) / (n - 1) / n
+
+    result = {}
+    for i, metric in enumerate(METRICS):
+        half_width = z * math.sqrt(variances[i])
+        estimate = max(estimates[i], observed[i])
+        result[metric] = {
+            "estimate": int(round(estimate)),
+            "low": int(max(observed[i], estimates[i] - half_width)),
+            "high": int(math.ceil(max(observed[i], estimates[i] + half_width))),
+            "observed": observed[i]
+        }
+
+    return {
+        "share_name": share_name,
+        "confidence": confidence,
+        "strata": len(strata),
+        "probes": taken,
+        "directories_listed": len(sampler.listings),
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+        "estimates": result
+    }
+
+
+def sample_volume(volume, share_name, filters, blacklist, **kwargs):
+    """
+    Sampling counterpart of scan_volume() for a single share.
+    """
+    ip_address = get_first_ip_address(volume)
+    for share in volume.get('volumes', []):
+        share_path, name = access_CIFS_share(share, ip_address)
+        if name == share_name and share_path:
+            return sample_share(share_path, share_name, filters, blacklist, **kwargs)
+    return None
@@ -0,0 +1,126 @@
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIME_FIELDS = ('creation_time', 'last_access_time', 'last_modified_time')
+FIELDS = ('full_path',) + TIME_FIELDS + ('file_size',)
+
+
+class ScanResult:
+    """
+    Compact list of scanned files. Each directory path is stored once in a parent table;
+    a file is its directory index, its name and four int64 columns (three epoch times and
+    the size). Iterating yields FileRecord views that read like the old file info dicts,
+    so filter_files(), move_file() and job creation work on it unchanged.
+    """
+    def __init__(self):
+        self.directories = []
+        self._directory_index = {}
+        self.dir_ids = array('q')
+        self.names = []
+        self.creation_times = array('q')
+        self.access_times = array('q')
+        self.modified_times = array('q')
+        self.sizes = array('q')
+
+    def _directory(self, dir_path):
+        index = self._directory_index.get(dir_path)
+        if index is None:
+            index = len(self.directories)
+            self.directories.append(dir_path)
+            self._directory_index[dir_path] = index
+        return index
+
+    def add(self, dir_path, name, creation_time, access_time, modified_time, file_size):
+        """
+        Adds one file; times are epoch seconds.
+        """
+        self.dir_ids.append(self._directory(dir_path))
+        self.names.append(name)
+        self.creation_times.append(int(creation_time))
+        self.access_times.append(int(access_time))
+        self.modified_times.append(int(modified_time))
+        # Unknown sizes count as empty, the column can't hold None
+        self.sizes.append(file_size or 0)
+
+    def add_file_info(self, file_info):
+        """
+        Adds a file info dict as built by build_file_info() or read from a table.
+        """
+        dir_path, _, name = file_info['full_path'].replace("/", "\\").rpartition("\\")
+        times = [
+            value.timestamp() if isinstance(value, datetime) else datetime.strptime(value, TIME_FORMAT).timestamp()
+            for value in (file_info[field] for field in TIME_FIELDS)
+        ]
+        self.add(dir_path, name, *times, file_info['file_size'])
+
+    def full_path(self, index):
+        return self.directories[self.dir_ids[index]] + "\\" + self.names[index]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __bool__(self):
+        return bool(self.names)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.names)
+        if not 0 <= index < len(self.names):
+            raise IndexError("scan result index out of range")
+        return FileRecord(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.names)):
+            yield FileRecord(self, index)
+
+    def total_size(self):
+        return sum(self.sizes)
+
+
+class FileRecord(Mapping):
+    """
+    Read-only view of one file in a ScanResult. Full paths and time strings are only
+    built when a field is read.
+    """
+    __slots__ = ('_result', '_index')
+
+    def __init__(self, result, index):
+        self._result = result
+        self._index = index
+
+    def __getitem__(self, key):
+        result, index = self._result, self._index
+        if key == 'full_path':
+            return result.full_path(index)
+        if key == 'file_size':
+            return result.sizes[index]
+        if key == 'creation_time':
+            return datetime.fromtimestamp(result.creation_times[index]).strftime(TIME_FORMAT)
+        if key == 'last_access_time':
+            return datetime.fromtimestamp(result.access_times[index]).strftime(TIME_FORMAT)
+        if key == 'last_modified_time':
+            return datetime.fromtimestamp(result.modified_times[index]).strftime(TIME_FORMAT)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def epoch(self, field):
+        """
+        A time field as epoch seconds, without formatting it first.
+        """
+        columns = {
+            'creation_time': self._result.creation_times,
+            'last_access_time': self._result.access_times,
+            'last_modified_time': self._result.modified_times,
+        }
+        return columns[field][self._index]
@@ -0,0 +1,304 @@
+"""
+Capacity scheduler: archives data when a data volume crosses its high watermark.
+
+    python scheduler.py [--once]
+
+Every poll reads the space of all data volumes in one ONTAP call. When a volume is above
+the high watermark of an enabled policy for its share, the coldest matching files are
+archived until usage is expected to fall below the policy's low watermark. Jobs only
+move data inside the off-peak windows and at most SCHEDULER_MAX_BYTES_PER_SECOND; a job
+paused at the end of a window is resumed in the next one.
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+from archive_jobs import checkpoint_candidates, run_archive_job
+from catalog import scan_catalog
+from database import SessionLocal
+from models import ArchiveJob, ArchiveJobStatus, ArchivePolicy
+from netapp_btc import TOPOLOGY_CACHE_SECONDS, fetch_volume_space, filter_files, get_svm_data_volumes, scan_volume
+from profiling import memory_stage
+from restore_history import apply_restore_history, record_skipped
+from snapshot_scan import sync_share_snapshot
+
+
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", 300))
+# Comma separated HH:MM-HH:MM ranges in local time, a range may wrap past midnight
+SCHEDULER_WINDOWS = os.getenv("SCHEDULER_WINDOWS", "20:00-06:00")
+# 0 disables the limit
+SCHEDULER_MAX_BYTES_PER_SECOND = int(os.getenv("SCHEDULER_MAX_BYTES_PER_SECOND", 100 * 1024 * 1024))
+VOLUME_SPACE_CACHE_SECONDS = float(os.getenv("VOLUME_SPACE_CACHE_SECONDS", 60))
+
+
+def parse_windows(windows):
+    parsed = []
+    for window in windows.split(","):
+        window = window.strip()
+        if not window:
+            continue
+        start, end = window.split("-")
+        parsed.append((
+            datetime.strptime(start.strip(), "%H:%M").time(),
+            datetime.strptime(end.strip(), "%H:%M").time()
+        ))
+    return parsed
+
+
+OFFPEAK_WINDOWS = parse_windows(SCHEDULER_WINDOWS)
+
+
+def in_offpeak_window(now=None):
+    if not OFFPEAK_WINDOWS:
+        return True
+    current = (now or datetime.now()).time()
+    for start, end in OFFPEAK_WINDOWS:
+        if start <= end:
+            if start <= current < end:
+                return True
+        elif current >= start or current < end:
+            return True
+    return False
+
+
+class TokenBucket:
+    """
+    Byte-rate limiter. A file larger than the bucket is let through and paid off
+    afterwards, so the average rate still holds.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class TtlCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.value = None
+        self.loaded_at = 0.0
+
+    def get(self, loader):
+        if self.value is None or time.monotonic() - self.loaded_at > self.ttl:
+            self.value = loader()
+            self.loaded_at = time.monotonic()
+        return self.value
+
+    def invalidate(self):
+        self.value = None
+
+
+_topology = TtlCache(TOPOLOGY_CACHE_SECONDS)
+_volume_space = TtlCache(VOLUME_SPACE_CACHE_SECONDS)
+
+
+def get_share_volumes():
+    """
+    Maps share name to volume name for the data shares, cached since it rarely changes.
+    """
+    def load():
+        svm_data = get_svm_data_volumes() or {}
+        return {share['share_name']: share['volume'] for share in svm_data.get('volumes', []) if share.get('volume')}
+    return _topology.get(load)
+
+
+def get_volume_space():
+    return _volume_space.get(lambda: fetch_volume_space(set(get_share_volumes().values())))
+
+
+def usage_percent(space):
+    return space['used'] * 100.0 / space['size'] if space['size'] else 0.0
+
+
+def bytes_to_free(space, low_watermark):
+    return max(0, space['used'] - int(space['size'] * low_watermark / 100.0))
+
+
+def plan_candidates(db, policy: ArchivePolicy, target_bytes, skipped: list = None):
+    """
+    Returns the coldest files matching the policy whose sizes add up to target_bytes.
+    """
+    with memory_stage("scan"):
+        if policy.source == "catalog":
+            all_files = scan_catalog(db, policy.share_name)
+        elif policy.source == "snapshot":
+            scan = sync_share_snapshot(db, policy.share_name)
+            all_files = scan_catalog(db, policy.share_name) if scan.status == ArchiveJobStatus.completed else {}
+        else:
+            svm_data = get_svm_data_volumes()
+            all_files = scan_volume(svm_data) if svm_data else {}
+    if not all_files or policy.share_name not in all_files:
+        return []
+
+    with memory_stage("filter"):
+        filtered = filter_files(all_files, policy.filters or {}, policy.blacklist or [], policy.share_name)
+    # Scan records keep epoch times, sort on those instead of formatting a string per file
+    candidates = sorted(filtered.get(policy.share_name, []), key=lambda file_info: file_info.epoch('last_access_time'))
+    candidates = apply_restore_history(db, candidates, skipped)
+
+    planned, planned_bytes = [], 0
+    for file_info in candidates:
+        if planned_bytes >= target_bytes:
+            break
+        # Only the planned files become dicts, the rest of the scan can be freed
+        planned.append(dict(file_info))
+        planned_bytes += file_info['file_size'] or 0
+    return planned
+
+
+def make_throttle(bucket):
+    def before_file(job_file):
+        if not in_offpeak_window():
+            return False
+        bucket.consume(job_file.file_size or 0)
+        return True
+    return before_file
+
+
+def resume_policy_jobs(bucket):
+    """
+    Continues policy jobs paused at the end of an earlier window. Returns the shares
+    that still have an unfinished job.
+    """
+    db = SessionLocal()
+    try:
+        jobs = db.query(ArchiveJob)\
+            .filter(ArchiveJob.policy_id.isnot(None))\
+            .filter(ArchiveJob.status.in_([ArchiveJobStatus.scanning, ArchiveJobStatus.running]))\
+            .order_by(ArchiveJob.id)\
+            .all()
+        job_ids = [job.id for job in jobs]
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        if not in_offpeak_window():
+            break
+        print(f"🔁 Resuming policy job {job_id}")
+        run_archive_job(job_id, before_file=make_throttle(bucket))
+
+    db = SessionLocal()
+    try:
+        return {
+            job.share_name for job in db.query(ArchiveJob)
+            .filter(ArchiveJob.id.in_(job_ids))
+            .filter(ArchiveJob.status.in_([ArchiveJobStatus.scanning, ArchiveJobStatus.running]))
+            .all()
+        }
+    finally:
+        db.close()
+
+
+def run_policy(policy_id, target_bytes, bucket):
+    db = SessionLocal()
+    try:
+        policy = db.query(ArchivePolicy).filter(ArchivePolicy.id == policy_id).first()
+        skipped = []
+        candidates = plan_candidates(db, policy, target_bytes, skipped)
+        policy.last_run_at = datetime.utcnow()
+        if not candidates:
+            db.commit()
+            print(f"Policy '{policy.name}': nothing to archive")
+            return None
+
+        job = ArchiveJob(
+            share_name=policy.share_name,
+            filters=policy.filters,
+            blacklist=policy.blacklist,
+            source=policy.source,
+            pack_small_files=policy.pack_small_files,
+            policy_id=policy.id,
+            status=ArchiveJobStatus.scanning
+        )
+        db.add(job)
+        db.flush()
+        record_skipped(skipped, job.id)
+        checkpoint_candidates(db, job, candidates)
+        job_id = job.id
+        print(f"📋 Policy '{policy.name}': job {job_id} for {len(candidates)} file(s), "
+              f"{sum(file_info['file_size'] or 0 for file_info in candidates)} bytes")
+    finally:
+        db.close()
+
+    return run_archive_job(job_id, before_file=make_throttle(bucket))
+
+
+def run_once(bucket):
+    if not in_offpeak_window():
+        print("🕒 Outside the off-peak window, not archiving")
+        return
+
+    busy_shares = resume_policy_jobs(bucket)
+
+    db = SessionLocal()
+    try:
+        policies = db.query(ArchivePolicy)\
+            .filter(ArchivePolicy.enabled.is_(True))\
+            .order_by(ArchivePolicy.priority.desc(), ArchivePolicy.id)\
+            .all()
+        policies = [(policy.id, policy.name, policy.share_name, policy.high_watermark, policy.low_watermark) for policy in policies]
+    finally:
+        db.close()
+
+    share_volumes = get_share_volumes()
+    for policy_id, name, share_name, high_watermark, low_watermark in policies:
+        if not in_offpeak_window():
+            return
+        if share_name in busy_shares:
+            continue
+        space = get_volume_space().get(share_volumes.get(share_name))
+        if not space:
+            print(f"⚠️ Policy '{name}': no volume found for share {share_name}")
+            continue
+
+        used = usage_percent(space)
+        if used < high_watermark:
+            continue
+
+        target = bytes_to_free(space, low_watermark)
+        print(f"📈 {share_name} at {used:.1f}% (high watermark {high_watermark}%), freeing {target} bytes with policy '{name}'")
+        result = run_policy(policy_id, target, bucket)
+        if result and result.get("status") != "success":
+            print(f"Policy '{name}': {result}")
+        # Usage changed, read it again before the next policy for this volume
+        _volume_space.invalidate()
+
+
+def run_scheduler(once=False):
+    bucket = TokenBucket(SCHEDULER_MAX_BYTES_PER_SECOND)
+    print(f"⏰ Capacity scheduler started, windows: {SCHEDULER_WINDOWS or 'always'}")
+    while True:
+        try:
+            run_once(bucket)
+        except Exception as e:
+            print(f"❌ Scheduler run failed: {e}")
+        if once:
+            return
+        time.sleep(SCHEDULER_POLL_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage Optimizer capacity scheduler")
+    parser.add_argument("--once", action="store_true", help="Check all policies once and exit")
+    args = parser.parse_args()
+    run_scheduler(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -47,6 +47,7 @@ class FileInfo(BaseModel):
 class RestoreRequest(BaseModel):
     archive_folder: str
     filename: str
+    movement_id: Optional[int] = None
     
 
 class DateRange(BaseModel):
@@ -66,4 +67,121 @@ class ArchiveFilterRequest(BaseModel):
     date_filters: Optional[DateFilters] = None
     min_size: Optional[int] = None
     max_size: Optional[int] = None
-    blacklist: Optional[List[str]] = []
\ No newline at end of file
+    blacklist: Optional[List[str]] = []
+    distributed: bool = Field(False, description="Queue the job for worker processes instead of running it in the API")
+    source: Literal["scan", "catalog", "snapshot"] = Field("scan", description="Walk the share, use the catalog kept current by the watcher, or bring the catalog up to a volume snapshot first")
+    pack_small_files: bool = Field(False, description="Bundle small files from the same directory into indexed pack files")
+
+
+class ArchiveEstimateRequest(BaseModel):
+    share_name: Literal["data1", "data2"]
+    file_type: Optional[str] = None
+    date_filters: Optional[DateFilters] = None
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    blacklist: Optional[List[str]] = []
+    probes: int = Field(200, ge=2, le=100000, description="Random directory descents to sample")
+    time_budget_seconds: float = Field(10.0, gt=0, description="Stop probing after this long")
+    confidence: Literal[0.8, 0.9, 0.95, 0.99] = 0.95
+    seed: Optional[int] = None
+
+
+class ArchiveJobFileStatus(BaseModel):
+    id: int
+    full_path: str
+    destination_path: Optional[str] = None
+    file_size: Optional[int] = None
+    bytes_copied: int = 0
+    progress: float = 0.0
+    compression: Optional[str] = None
+    stored_size: Optional[int] = None
+    state: str
+    error: Optional[str] = None
+
+
+class ArchiveJobStatusResponse(BaseModel):
+    job_id: int
+    share_name: str
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    file_counts: Dict[str, int] = {}
+    total_bytes: int = 0
+    bytes_copied: int = 0
+    bytes_in: int = 0
+    bytes_stored: int = 0
+    capacity_saved: int = 0
+    compression_cpu_seconds: float = 0.0
+    files: List[ArchiveJobFileStatus] = []
+
+
+class ArchivePolicyRequest(BaseModel):
+    name: str
+    share_name: Literal["data1", "data2"]
+    file_type: Optional[str] = None
+    date_filters: Optional[DateFilters] = None
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    blacklist: Optional[List[str]] = []
+    high_watermark: float = Field(85.0, gt=0, le=100, description="Volume usage in percent that triggers archiving")
+    low_watermark: float = Field(75.0, ge=0, lt=100, description="Volume usage in percent archiving aims for")
+    priority: int = 0
+    source: Literal["scan", "catalog", "snapshot"] = "scan"
+    pack_small_files: bool = False
+    enabled: bool = True
+
+
+class ArchivePolicyResponse(BaseModel):
+    id: int
+    name: str
+    share_name: str
+    filters: Dict[str, Any] = {}
+    blacklist: List[str] = []
+    high_watermark: float
+    low_watermark: float
+    priority: int
+    source: str
+    pack_small_files: bool
+    enabled: bool
+    last_run_at: Optional[datetime] = None
+
+
+class ExportRequest(BaseModel):
+    dataset: Literal["scan", "movements"]
+    format: Literal["parquet", "arrow"] = "parquet"
+    share_name: Optional[str] = Field(None, description="Only this share (scan only)")
+    source: Literal["scan", "catalog"] = Field("scan", description="Walk the shares or read the catalog (scan only)")
+    since: Optional[datetime] = Field(None, description="Movements at or after this time (movements only)")
+    until: Optional[datetime] = Field(None, description="Movements before this time (movements only)")
+
+
+class FileMovementRecord(BaseModel):
+    id: int
+    full_path: str
+    destination_path: Optional[str] = None
+    action_type: str
+    file_size: Optional[int] = None
+    stored_size: Optional[int] = None
+    compression: Optional[str] = None
+    archive_target: Optional[str] = None
+    timestamp: datetime
+
+
+class FileMovementPage(BaseModel):
+    items: List[FileMovementRecord] = []
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page, null on the last page")
+
+
+class DuplicateScanRequest(BaseModel):
+    share_name: Optional[Literal["data1", "data2"]] = Field(None, description="Only this share, all data shares when omitted")
+
+
+class ProfilingRequest(BaseModel):
+    job_id: Optional[int] = Field(None, description="Sample only this archive job's threads, every thread when omitted")
+    duration_seconds: float = Field(30.0, gt=0, le=300)
+    interval_ms: float = Field(5.0, ge=1, le=1000)
+
+
+class MemoryTracingRequest(BaseModel):
+    enabled: bool
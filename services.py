@@ -21,7 +21,7 @@ def get_user_by_id(user_id: int, db: Session):
     return user
 
 
-def verify_manager(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def verify_manager(user: User = Depends(get_current_user)):
     if user.role != Role.manager:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -0,0 +1,310 @@
+"""
+Scans the data shares from an ONTAP snapshot instead of the live volume.
+
+A snapshot of the share's volume is created (or a recent one reused) and walked through
+the share's ~snapshot directory, so the listing is consistent to one point in time and
+the walk reads frozen blocks instead of following users' writes around the live tree.
+
+Each directory gets a signature of its listing (entry names, sizes, access and modified
+times). Only directories whose signature differs from the previous snapshot scan have
+their catalog rows rewritten, and directories gone from the snapshot have theirs removed,
+so the catalog (see catalog.py) matches the snapshot after touching only what changed.
+Jobs and policies with source="snapshot" run this first and then read the catalog.
+
+    python snapshot_scan.py [--share data1]
+
+Against mock_ontap.py --tree-root, with SHARE_MOUNTS mapping the shares into that tree
+and SNAPSHOT_SCAN_REUSE_SECONDS=0 so every run takes a new snapshot.
+"""
+import argparse
+import hashlib
+import os
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+
+import storage
+from catalog import replace_directory
+from database import SessionLocal
+from models import ArchiveFileState, ArchiveJob, ArchiveJobFile, ArchiveJobStatus, FileMetadata, SnapshotDirectory, SnapshotScan
+from netapp_btc import access_CIFS_share, build_file_info, get_first_ip_address, get_svm_data_volumes, normalize_path
+from ontap_client import get_client
+
+
+SNAPSHOT_SCAN_PREFIX = os.getenv("SNAPSHOT_SCAN_PREFIX", "archive_scan")
+# The newest scan snapshot is reused while younger than this
+SNAPSHOT_SCAN_REUSE_SECONDS = float(os.getenv("SNAPSHOT_SCAN_REUSE_SECONDS", 3600))
+# Scan snapshots kept per volume; older ones are deleted after a successful scan
+SNAPSHOT_SCAN_KEEP = int(os.getenv("SNAPSHOT_SCAN_KEEP", 2))
+SNAPSHOT_DIR_NAME = os.getenv("SNAPSHOT_DIR_NAME", "~snapshot")
+SNAPSHOT_COMMIT_DIRECTORIES = 500
+
+
+def volume_uuid(volume_name):
+    records = get_client().get_collection("/api/storage/volumes", "uuid", name=volume_name)
+    if not records:
+        raise RuntimeError(f"Volume {volume_name} not found")
+    return records[0]["uuid"]
+
+
+def snapshot_created(snapshot):
+    created = datetime.fromisoformat(snapshot["create_time"].replace("Z", "+00:00"))
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created
+
+
+def snapshot_age(snapshot):
+    return (datetime.now(timezone.utc) - snapshot_created(snapshot)).total_seconds()
+
+
+def archived_since(db: Session, share_name: str, since: datetime):
+    """
+    Whether jobs deleted sources on the share after since. Those files are still in a
+    snapshot taken before, so it can't be reused.
+    """
+    since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return db.query(ArchiveJobFile.id)\
+        .join(ArchiveJob, ArchiveJob.id == ArchiveJobFile.job_id)\
+        .filter(ArchiveJob.share_name == share_name)\
+        .filter(ArchiveJobFile.state.in_([ArchiveFileState.source_deleted, ArchiveFileState.logged]))\
+        .filter(ArchiveJobFile.updated_at >= since)\
+        .first() is not None
+
+
+def list_scan_snapshots(vol_uuid):
+    """
+    Snapshots this module created on the volume, newest first.
+    """
+    records = get_client().get_collection(
+        f"/api/storage/volumes/{vol_uuid}/snapshots", "name,create_time", name=f"{SNAPSHOT_SCAN_PREFIX}.*"
+    )
+    return sorted(records, key=snapshot_age)
+
+
+def acquire_snapshot(db: Session, vol_uuid, share_name):
+    """
+    Name of a scan snapshot no older than SNAPSHOT_SCAN_REUSE_SECONDS, created if needed.
+    A snapshot taken before files of the share were archived is not reused.
+    """
+    snapshots = list_scan_snapshots(vol_uuid)
+    if snapshots and snapshot_age(snapshots[0]) < SNAPSHOT_SCAN_REUSE_SECONDS\
+            and not archived_since(db, share_name, snapshot_created(snapshots[0])):
+        return snapshots[0]["name"]
+
+    name = f"{SNAPSHOT_SCAN_PREFIX}.{datetime.utcnow():%Y-%m-%d_%H%M%S}"
+    client = get_client()
+    client.wait_for_job(client.post(f"/api/storage/volumes/{vol_uuid}/snapshots", {"name": name}))
+    print(f"📸 Created snapshot {name}")
+    return name
+
+
+def prune_snapshots(vol_uuid, keep_name):
+    client = get_client()
+    for snapshot in list_scan_snapshots(vol_uuid)[SNAPSHOT_SCAN_KEEP:]:
+        if snapshot["name"] == keep_name:
+            continue
+        try:
+            client.wait_for_job(client.delete(f"/api/storage/volumes/{vol_uuid}/snapshots/{snapshot['uuid']}"))
+            print(f"🗑️ Deleted snapshot {snapshot['name']}")
+        except Exception as e:
+            # Tried again after the next scan
+            print(f"⚠️ Could not delete snapshot {snapshot['name']}: {e}")
+
+
+def directory_signature(lines):
+    digest = hashlib.blake2b(digest_size=16)
+    for line in sorted(lines):
+        digest.update(line.encode("utf-8", "surrogateescape"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def walk_snapshot(snapshot_root, live_root):
+    """
+    Yields (live directory path, signature, file infos) for every directory below
+    snapshot_root, one listing at a time. Paths are translated to the live share so catalog
+    rows and jobs point at the real files. A directory that can't be listed is yielded with
+    signature None and its subtree is not walked.
+    """
+    pending = [""]
+    while pending:
+        relative = pending.pop()
+        live_dir = live_root + relative
+        try:
+            entries = list(storage.scandir(snapshot_root + relative))
+        except OSError as e:
+            print(f"Error accessing directory {snapshot_root + relative}: {e}")
+            yield live_dir, None, None
+            continue
+
+        lines = []
+        files = []
+        for entry in entries:
+            if entry.is_dir():
+                # Some volumes show ~snapshot in every directory
+                if entry.name != SNAPSHOT_DIR_NAME:
+                    pending.append(relative + "\\" + entry.name)
+                    lines.append(f"d|{entry.name}")
+            elif not entry.name.endswith("_shortcut.bat"):
+                stat_result = entry.stat()
+                # No st_ctime: on mounted shares it is the inode change time, which moves on
+                # every metadata update, and replacing a file changes its modified time anyway
+                lines.append(f"f|{entry.name}|{stat_result.st_size}|{int(stat_result.st_atime)}|{int(stat_result.st_mtime)}")
+                files.append(build_file_info(live_dir + "\\" + entry.name, stat_result))
+        yield live_dir, directory_signature(lines), files
+
+
+def is_below(path, parents):
+    return any(path == parent or path.startswith(parent + "\\") for parent in parents)
+
+
+def sync_directories(db: Session, scan: SnapshotScan, share_path: str):
+    """
+    Walks the scan's snapshot and brings the catalog and the directory signatures up to it.
+    """
+    known = {
+        path: (directory_id, signature)
+        for directory_id, path, signature in db.query(SnapshotDirectory.id, SnapshotDirectory.path, SnapshotDirectory.signature)
+        .filter(SnapshotDirectory.share_name == scan.share_name)
+    }
+    seen = set()
+    unreadable = []
+
+    snapshot_root = f"{share_path}\\{SNAPSHOT_DIR_NAME}\\{scan.snapshot_name}"
+    for live_dir, signature, files in walk_snapshot(snapshot_root, share_path):
+        live_dir = normalize_path(live_dir)
+        seen.add(live_dir)
+        if signature is None:
+            unreadable.append(live_dir)
+            continue
+        scan.directories += 1
+        scan.files += len(files)
+
+        previous = known.get(live_dir)
+        if previous and previous[1] == signature:
+            continue
+        replace_directory(db, scan.share_name, live_dir, files)
+        values = {"signature": signature, "file_count": len(files), "snapshot_name": scan.snapshot_name}
+        if previous:
+            db.query(SnapshotDirectory).filter(SnapshotDirectory.id == previous[0]).update(values, synchronize_session=False)
+        else:
+            db.add(SnapshotDirectory(share_name=scan.share_name, path=live_dir, **values))
+        scan.changed_directories += 1
+        if scan.changed_directories % SNAPSHOT_COMMIT_DIRECTORIES == 0:
+            db.commit()
+
+    # Keep what is known about subtrees that couldn't be read this time
+    removed = [path for path in known if path not in seen and not is_below(path, unreadable)]
+    for path in removed:
+        db.query(FileMetadata).filter(FileMetadata.parent_path == path).delete(synchronize_session=False)
+        db.query(SnapshotDirectory).filter(SnapshotDirectory.id == known[path][0]).delete(synchronize_session=False)
+    scan.removed_directories = len(removed)
+
+
+def scan_share_snapshot(db: Session, share_name: str, share_path: str, volume_name: str):
+    scan = SnapshotScan(share_name=share_name, volume_name=volume_name, status=ArchiveJobStatus.scanning)
+    db.add(scan)
+    db.commit()
+    try:
+        vol_uuid = volume_uuid(volume_name)
+        scan.snapshot_name = acquire_snapshot(db, vol_uuid, share_name)
+
+        previous = db.query(SnapshotScan)\
+            .filter(SnapshotScan.share_name == share_name, SnapshotScan.status == ArchiveJobStatus.completed)\
+            .order_by(SnapshotScan.id.desc())\
+            .first()
+        if previous and previous.snapshot_name == scan.snapshot_name:
+            # The catalog already matches this snapshot, and nothing was archived since it was taken
+            scan.directories = previous.directories
+            scan.files = previous.files
+            scan.status = ArchiveJobStatus.completed
+            db.commit()
+            print(f"✅ {share_name} already scanned at snapshot {scan.snapshot_name}")
+            return scan
+
+        scan.status = ArchiveJobStatus.running
+        db.commit()
+        sync_directories(db, scan, share_path)
+        scan.status = ArchiveJobStatus.completed
+        db.commit()
+        print(f"✅ Snapshot scan of {share_name} at {scan.snapshot_name}: {scan.changed_directories} of "
+              f"{scan.directories} directories changed, {scan.removed_directories} removed")
+
+        prune_snapshots(vol_uuid, scan.snapshot_name)
+        return scan
+
+    except Exception as e:
+        db.rollback()
+        scan.status = ArchiveJobStatus.failed
+        scan.error = str(e)
+        db.commit()
+        print(f"❌ Snapshot scan of {share_name} failed: {e}")
+        return scan
+
+
+def data_shares():
+    """
+    (share name, share path, volume name) of every CIFS data share.
+    """
+    svm_data = get_svm_data_volumes()
+    if not svm_data:
+        raise RuntimeError("No SVM volumes found")
+    ip_address = get_first_ip_address(svm_data)
+    shares = []
+    for share in svm_data.get('volumes', []):
+        share_path, share_name = access_CIFS_share(share, ip_address)
+        if share_name and share_path and share.get('volume'):
+            shares.append((share_name, share_path, share['volume']))
+    return shares
+
+
+def sync_share_snapshot(db: Session, share_name: str):
+    """
+    Brings the catalog of share_name up to a current snapshot. Returns the SnapshotScan.
+    """
+    for name, share_path, volume_name in data_shares():
+        if name == share_name:
+            return scan_share_snapshot(db, name, share_path, volume_name)
+    raise RuntimeError(f"Share {share_name} not found")
+
+
+def scan_summary(scan: SnapshotScan):
+    return {
+        "scan_id": scan.id,
+        "share_name": scan.share_name,
+        "snapshot_name": scan.snapshot_name,
+        "status": scan.status.value,
+        "error": scan.error,
+        "directories": scan.directories,
+        "changed_directories": scan.changed_directories,
+        "removed_directories": scan.removed_directories,
+        "files": scan.files
+    }
+
+
+def run_snapshot_scan(share_name: str = None):
+    """
+    Snapshot scan of every data share, or only share_name. Returns {share name: summary}.
+    """
+    db = SessionLocal()
+    try:
+        return {
+            name: scan_summary(scan_share_snapshot(db, name, share_path, volume_name))
+            for name, share_path, volume_name in data_shares()
+            if not share_name or name == share_name
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan the data shares from ONTAP snapshots")
+    parser.add_argument("--share", default=None, help="Only this share")
+    args = parser.parse_args()
+
+    for name, summary in run_snapshot_scan(args.share).items():
+        print(f"{name}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import BigInteger, inspect, text
+
+from database import Base, SessionLocal, engine
+from models import FileMovement
+from movement_history import ensure_history_indexes, prepare_history_schema
+from netapp_btc import get_first_ip_address, get_svm_archive_volumes, get_svm_data_volumes
+from placement import ARCHIVE_SERVER
+from storage import configure_smb, warm_smb_session
+
+
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", 5))
+WARMUP_MAX_RETRY_SECONDS = float(os.getenv("WARMUP_MAX_RETRY_SECONDS", 60))
+# Connections opened ahead of the first requests
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", 5))
+
+# Columns file_movements gained after the table was first created; create_all doesn't add
+# columns to existing tables
+FILE_MOVEMENT_UPGRADE_COLUMNS = ("content_hash", "compression", "stored_size", "pack_id", "pack_offset", "archive_target")
+
+# Components that must be up before the API takes traffic. The filer only has to have
+# been tried once, so an outage there doesn't keep every replica out of rotation.
+REQUIRED_COMPONENTS = ("database",)
+ATTEMPTED_COMPONENTS = ("ontap", "smb")
+
+
+class Readiness:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.components = {
+            name: {"status": "pending", "attempts": 0, "error": None, "ready_at": None}
+            for name in REQUIRED_COMPONENTS + ATTEMPTED_COMPONENTS
+        }
+        self.started_at = datetime.utcnow()
+
+    def update(self, name, status, error=None):
+        with self.lock:
+            component = self.components[name]
+            component["status"] = status
+            component["error"] = error
+            if status != "pending":
+                component["attempts"] += 1
+            if status == "ready":
+                component["ready_at"] = datetime.utcnow()
+
+    def is_ready(self):
+        with self.lock:
+            return all(self.components[name]["status"] == "ready" for name in REQUIRED_COMPONENTS)\
+                and all(self.components[name]["attempts"] > 0 for name in ATTEMPTED_COMPONENTS)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "components": {name: dict(component) for name, component in self.components.items()}
+            }
+
+
+readiness = Readiness()
+
+
+def retry_until_ready(name, step):
+    """
+    Runs step until it succeeds, backing off between attempts.
+    """
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        try:
+            step()
+            readiness.update(name, "ready")
+            print(f"✅ Warmup: {name} ready")
+            return
+        except Exception as e:
+            readiness.update(name, "failed", str(e))
+            print(f"⚠️ Warmup: {name} not ready ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, WARMUP_MAX_RETRY_SECONDS)
+
+
+def upgrade_file_movements(engine):
+    """
+    Adds the newer columns (and their indexes) to a file_movements table created by an
+    older version and widens file_size. Safe to run on every start and from several
+    processes at once.
+    """
+    table = FileMovement.__table__
+    columns = {column["name"]: column for column in inspect(engine).get_columns(table.name)}
+    if_not_exists = "IF NOT EXISTS " if engine.dialect.name == "postgresql" else ""
+    with engine.begin() as connection:
+        for name in FILE_MOVEMENT_UPGRADE_COLUMNS:
+            column = table.columns[name]
+            if name not in columns:
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {if_not_exists}{name} {column.type.compile(dialect=engine.dialect)}"
+                for foreign_key in column.foreign_keys:
+                    ddl += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+                connection.execute(text(ddl))
+                print(f"🛠️ Added file_movements.{name}")
+            if column.index:
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table.name}_{name} ON {table.name} ({name})"))
+
+        # file_size was a 32-bit integer, too small for files over 2 GiB (SQLite integers are 64-bit already)
+        if engine.dialect.name == "postgresql" and not isinstance(columns["file_size"]["type"], BigInteger):
+            connection.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN file_size TYPE BIGINT"))
+            print("🛠️ Widened file_movements.file_size to BIGINT")
+
+
+def warm_database(create_admin_user):
+    prepare_history_schema(engine)
+    Base.metadata.create_all(bind=engine)
+    upgrade_file_movements(engine)
+    ensure_history_indexes(engine)
+    db = SessionLocal()
+    try:
+        create_admin_user(db)
+    finally:
+        db.close()
+
+    # Open the first connections now instead of on the first requests
+    def ping(_):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    with ThreadPoolExecutor(max_workers=WARMUP_DB_CONNECTIONS) as executor:
+        list(executor.map(ping, range(WARMUP_DB_CONNECTIONS)))
+
+
+def warm_ontap():
+    # Both lookups are cached, later calls reuse this result
+    if not get_svm_data_volumes():
+        raise RuntimeError("No data SVM found")
+    if not get_svm_archive_volumes():
+        raise RuntimeError("No archive SVM found")
+
+
+def warm_smb():
+    configure_smb()
+    servers = set()
+    svm_data = get_svm_data_volumes()
+    if svm_data:
+        servers.add(get_first_ip_address(svm_data))
+    if get_svm_archive_volumes():
+        servers.add(ARCHIVE_SERVER)
+    for server in servers:
+        if server:
+            warm_smb_session(server)
+
+
+def warm_up(create_admin_user, after_database=None):
+    """
+    Brings up the database first (jobs can resume once it's there), then ONTAP and SMB.
+    The filer steps are tried once here and keep retrying in the background.
+    """
+    retry_until_ready("database", lambda: warm_database(create_admin_user))
+    if after_database:
+        threading.Thread(target=after_database, daemon=True).start()
+
+    for name, step in (("ontap", warm_ontap), ("smb", warm_smb)):
+        threading.Thread(target=retry_until_ready, args=(name, step), daemon=True).start()
+
+
+def start_warmup(create_admin_user, after_database=None):
+    thread = threading.Thread(target=warm_up, args=(create_admin_user, after_database), daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,236 @@
+"""
+File access for share paths. Shares that are kernel-mounted on this host (CIFS or NFS)
+are reached through the mount with plain os calls and in-kernel copies; every other
+path goes through smbclient.
+
+    SHARE_MOUNTS="\\\\192.168.16.14\\data1=/mnt/data1,\\\\192.168.16.15\\archive1=/mnt/archive1"
+"""
+import errno
+import os
+import threading
+
+import smbclient
+
+from transfer_scheduler import transfer_slot
+
+
+SMB_USERNAME = os.getenv("SMB_USERNAME", "hatul\\Administrator")
+SMB_PASSWORD = os.getenv("SMB_PASSWORD", "Netapp1!")
+SHARE_MOUNTS = os.getenv("SHARE_MOUNTS", "")
+LOCAL_COPY_CHUNK = int(os.getenv("LOCAL_COPY_CHUNK", 64 * 1024 * 1024))
+LOCAL_CHECKPOINT_BYTES = int(os.getenv("TRANSFER_CHECKPOINT_BYTES", 64 * 1024 * 1024))
+
+# copy_file_range can't be used for this pair of files, try the next method
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.EBADF}
+
+
+_smb_configured = False
+_smb_lock = threading.Lock()
+
+
+def configure_smb():
+    """
+    Sets the smbclient credentials on first use instead of at import time.
+    """
+    global _smb_configured
+    if _smb_configured:
+        return
+    with _smb_lock:
+        if not _smb_configured:
+            smbclient.ClientConfig(username=SMB_USERNAME, password=SMB_PASSWORD)
+            _smb_configured = True
+
+
+def warm_smb_session(server):
+    """
+    Opens (and authenticates) the SMB session to server so the first file access doesn't pay for it.
+    """
+    configure_smb()
+    smbclient.register_session(server, username=SMB_USERNAME, password=SMB_PASSWORD)
+
+
+def parse_mounts(mounts):
+    """
+    Returns (lower-case UNC prefix, mount point) pairs, longest prefix first. Mappings
+    whose mount point is missing are dropped so a failed mount falls back to smbclient.
+    """
+    parsed = []
+    for mapping in mounts.split(","):
+        if "=" not in mapping:
+            continue
+        unc, mount_point = mapping.split("=", 1)
+        unc = "\\\\" + unc.strip().replace("/", "\\").strip("\\")
+        mount_point = mount_point.strip().rstrip("/")
+        if not os.path.isdir(mount_point):
+            print(f"⚠️ Mount point {mount_point} for {unc} not found, using smbclient")
+            continue
+        parsed.append((unc.lower(), mount_point))
+    return sorted(parsed, key=lambda mapping: len(mapping[0]), reverse=True)
+
+
+MOUNTS = parse_mounts(SHARE_MOUNTS)
+
+
+def local_path(path):
+    """
+    The mounted equivalent of a UNC path, or None when its share isn't mounted here.
+    """
+    if not MOUNTS:
+        return None
+    unc = "\\\\" + path.replace("/", "\\").lstrip("\\")
+    lowered = unc.lower()
+    for prefix, mount_point in MOUNTS:
+        if lowered == prefix or lowered.startswith(prefix + "\\"):
+            return mount_point + unc[len(prefix):].replace("\\", "/")
+    return None
+
+
+def is_local(path):
+    return local_path(path) is not None
+
+
+def os_path(path):
+    """
+    Path for plain os calls: the mounted path when available, otherwise the UNC path.
+    """
+    return local_path(path) or path
+
+
+def open_file(path, mode="r", buffering=-1, **kwargs):
+    mounted = local_path(path)
+    if mounted:
+        return open(mounted, mode, buffering=buffering)
+    configure_smb()
+    return smbclient.open_file(path, mode=mode, buffering=buffering, **kwargs)
+
+
+def stat(path):
+    mounted = local_path(path)
+    if mounted:
+        return os.stat(mounted)
+    configure_smb()
+    return smbclient.stat(path)
+
+
+def scandir(path):
+    """
+    Entries have name, is_dir() and stat(); on a mount the stat comes with the listing.
+    """
+    mounted = local_path(path)
+    if mounted:
+        return os.scandir(mounted)
+    configure_smb()
+    return smbclient.scandir(path)
+
+
+def remove(path):
+    mounted = local_path(path)
+    if mounted:
+        return os.remove(mounted)
+    configure_smb()
+    return smbclient.remove(path)
+
+
+def replace(src_path, dest_path):
+    src_mounted, dest_mounted = local_path(src_path), local_path(dest_path)
+    if src_mounted and dest_mounted:
+        return os.replace(src_mounted, dest_mounted)
+    configure_smb()
+    return smbclient.replace(src_path, dest_path)
+
+
+def makedirs(path, exist_ok=False):
+    mounted = local_path(path)
+    if mounted:
+        return os.makedirs(mounted, exist_ok=exist_ok)
+    configure_smb()
+    return smbclient.makedirs(path, exist_ok=exist_ok)
+
+
+def _copy_range(src_fd, dest_fd, offset, count, method):
+    """
+    Copies up to count bytes at offset without passing them through this process.
+    Returns (bytes copied, method that worked).
+    """
+    if method == "copy_file_range":
+        try:
+            # Lets the kernel or the server (SMB copychunk, NFS COPY) do the copy
+            return os.copy_file_range(src_fd, dest_fd, count, offset, offset), method
+        except (AttributeError, OSError) as e:
+            if isinstance(e, OSError) and e.errno not in _FALLBACK_ERRNOS:
+                raise
+            method = "sendfile"
+
+    if method == "sendfile":
+        try:
+            os.lseek(dest_fd, offset, os.SEEK_SET)
+            return os.sendfile(dest_fd, src_fd, offset, count), method
+        except (AttributeError, OSError) as e:
+            if isinstance(e, OSError) and e.errno not in _FALLBACK_ERRNOS:
+                raise
+            method = "pread"
+
+    data = os.pread(src_fd, count, offset)
+    return os.pwrite(dest_fd, data, offset), method
+
+
+def copy_local(src_path, dest_path, file_size, start_offset=0, progress_callback=None, hasher=None):
+    """
+    Copies between two mounted paths with copy_file_range, then sendfile, then pread/pwrite.
+    A hasher still needs the bytes, so the source is read for it alongside the in-kernel copy;
+    the destination write never goes through userspace.
+    """
+    src_mounted, dest_mounted = local_path(src_path), local_path(dest_path)
+    src_fd = os.open(src_mounted, os.O_RDONLY)
+    try:
+        dest_fd = os.open(dest_mounted, os.O_WRONLY | os.O_CREAT | (0 if start_offset else os.O_TRUNC), 0o666)
+        try:
+            if start_offset:
+                # Whatever was written past the last checkpoint is not trusted
+                os.ftruncate(dest_fd, start_offset)
+                if hasher:
+                    _hash_range(src_fd, hasher, 0, start_offset)
+
+            offset = start_offset
+            last_checkpoint = start_offset
+            method = "copy_file_range"
+            while offset < file_size:
+                count = min(LOCAL_COPY_CHUNK, file_size - offset)
+                if hasher:
+                    _hash_range(src_fd, hasher, offset, count)
+                end = offset + count
+                while offset < end:
+                    with transfer_slot():
+                        copied, method = _copy_range(src_fd, dest_fd, offset, end - offset, method)
+                    if copied == 0:
+                        break
+                    offset += copied
+                if offset < end:
+                    # The source shrank, verification reports the size mismatch
+                    break
+
+                if progress_callback and offset - last_checkpoint >= LOCAL_CHECKPOINT_BYTES:
+                    os.fsync(dest_fd)
+                    progress_callback(offset)
+                    last_checkpoint = offset
+
+            os.fsync(dest_fd)
+        finally:
+            os.close(dest_fd)
+    finally:
+        os.close(src_fd)
+
+    if progress_callback:
+        progress_callback(offset)
+    return offset
+
+
+def _hash_range(fd, hasher, offset, length, buffer_size=8 * 1024 * 1024):
+    end = offset + length
+    while offset < end:
+        with transfer_slot():
+            data = os.pread(fd, min(buffer_size, end - offset), offset)
+        if not data:
+            break
+        hasher.update(data)
+        offset += len(data)
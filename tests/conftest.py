@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Modules connect lazily, but database.py builds its engines on import. Point it at a
+# throwaway SQLite file and keep the transfer scheduler from syncing through it.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}")
+os.environ.setdefault("TRANSFER_ACTIVITY_SHARED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
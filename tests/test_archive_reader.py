@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("smbclient")
+
+from archive_reader import parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-4", (0, 4)),
+    ("bytes=5-", (5, 9)),
+    ("bytes=2-100", (2, 9)),
+    ("bytes=-3", (7, 9)),
+    ("bytes=-100", (0, 9)),
+    ("bytes=1-2, 5-6", (1, 2)),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 10) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-4", "bytes=abc", "bytes=-", "bytes=a-4", "bytes=5-3"])
+def test_parse_range_header_ignores_missing_or_malformed(header):
+    assert parse_range_header(header, 10) is None
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=10-", 10),
+    ("bytes=-0", 10),
+    ("bytes=0-", 0),
+    ("bytes=-3", 0),
+])
+def test_parse_range_header_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range_header(header, size)
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("smbclient")
+pytest.importorskip("requests")
+
+from duplicates import bounded_map
+
+
+def test_bounded_map_returns_every_result():
+    items = [(f"file{i}", i) for i in range(50)]
+    results = dict(bounded_map(lambda item: item[1] * 2, items, workers=4))
+    assert results == {item: item[1] * 2 for item in items}
+
+
+def test_bounded_map_skips_unreadable_files():
+    def read(item):
+        if item[1] % 2:
+            raise OSError("gone")
+        return item[1]
+
+    items = [(f"file{i}", i) for i in range(10)]
+    assert sorted(result for _, result in bounded_map(read, items, workers=2)) == [0, 2, 4, 6, 8]
+
+
+def test_bounded_map_reads_items_lazily():
+    pulled = []
+
+    def items():
+        for i in range(1000):
+            pulled.append(i)
+            yield (f"file{i}", i)
+
+    results = bounded_map(lambda item: item[1], items(), workers=2)
+    next(results)
+    # At most four queued per worker, plus the one being handed in
+    assert len(pulled) <= 2 * 4 + 1
+    assert len(list(results)) == 999
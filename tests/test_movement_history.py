@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("pydantic")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from database import Base
+from models import ActionType, FileMovement
+from movement_history import SHARE_HISTORY_INDEX, history_query, share_of
+
+
+def split_part(value, delimiter, index):
+    parts = value.split(delimiter)
+    return parts[index - 1] if index <= len(parts) else ""
+
+
+@pytest.fixture
+def db():
+    # SQLite has no split_part, give it Postgres' semantics
+    engine = create_engine("sqlite://")
+    event.listen(engine, "connect", lambda connection, _: connection.create_function("split_part", 3, split_part))
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def add_movements(db, paths):
+    now = datetime.utcnow()
+    for i, path in enumerate(paths):
+        db.add(FileMovement(full_path=path, action_type=ActionType.moved_to_archive, timestamp=now - timedelta(seconds=i)))
+    db.commit()
+
+
+def test_share_of_matches_share_index_expression():
+    sql = str(share_of(FileMovement.full_path).compile(dialect=postgresql.dialect()))
+    assert sql == "lower(split_part(file_movements.full_path, '\\', 4))"
+    assert sql.replace("file_movements.", "") in SHARE_HISTORY_INDEX
+
+
+def test_history_share_filter_matches_share_component_only(db):
+    add_movements(db, [
+        "\\\\srv\\data1\\a.txt",
+        "\\\\10.0.0.5\\DATA1\\dir\\b.txt",
+        "\\\\srv\\data10\\c.txt",
+        "\\\\srv\\other\\data1\\d.txt",
+        "\\\\data1\\other\\e.txt",
+    ])
+
+    movements = db.execute(history_query(share_name="Data1")).scalars().all()
+
+    assert [movement.full_path for movement in movements] == ["\\\\srv\\data1\\a.txt", "\\\\10.0.0.5\\DATA1\\dir\\b.txt"]
+
+
+def test_history_without_share_returns_everything(db):
+    add_movements(db, ["\\\\srv\\data1\\a.txt", "\\\\srv\\data2\\b.txt"])
+    assert len(db.execute(history_query()).scalars().all()) == 2
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("smbclient")
+
+import packing
+from packing import group_pack_members
+
+
+def job_file(full_path, file_size):
+    return SimpleNamespace(full_path=full_path, file_size=file_size)
+
+
+def paths(groups):
+    return [[member.full_path for member in group] for group in groups]
+
+
+def test_group_pack_members_never_mixes_directories():
+    files = [job_file("\\\\srv\\data1\\a\\1", 10), job_file("\\\\srv\\data1\\b\\1", 10), job_file("\\\\srv\\data1\\a\\2", 10)]
+    assert paths(group_pack_members(files)) == [
+        ["\\\\srv\\data1\\a\\1", "\\\\srv\\data1\\a\\2"],
+        ["\\\\srv\\data1\\b\\1"],
+    ]
+
+
+def test_group_pack_members_splits_on_size(monkeypatch):
+    monkeypatch.setattr(packing, "ARCHIVE_PACK_TARGET_SIZE", 25)
+    files = [job_file(f"\\\\srv\\data1\\a\\{i}", 10) for i in range(5)]
+    assert [len(group) for group in group_pack_members(files)] == [2, 2, 1]
+
+
+def test_group_pack_members_splits_on_member_count(monkeypatch):
+    monkeypatch.setattr(packing, "ARCHIVE_PACK_MAX_MEMBERS", 3)
+    files = [job_file(f"\\\\srv\\data1\\a\\{i}", None) for i in range(7)]
+    assert [len(group) for group in group_pack_members(files)] == [3, 3, 1]
+
+
+def test_group_pack_members_keeps_oversized_file_alone(monkeypatch):
+    monkeypatch.setattr(packing, "ARCHIVE_PACK_TARGET_SIZE", 25)
+    files = [job_file("\\\\srv\\data1\\a\\1", 10), job_file("\\\\srv\\data1\\a\\2", 40), job_file("\\\\srv\\data1\\a\\3", 10)]
+    assert [len(group) for group in group_pack_members(files)] == [1, 1, 1]
+
+
+def test_group_pack_members_empty():
+    assert group_pack_members([]) == []
@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("smbclient")
+pytest.importorskip("requests")
+
+import sampling
+from sampling import sample_share
+
+
+def fake_share(monkeypatch, tree):
+    """
+    Serves directory listings from tree: {dir path: (subdir paths, file sizes)}.
+    """
+    def scan_directory(dir_path):
+        subdirs, sizes = tree[dir_path]
+        files = [{'full_path': f"{dir_path}\\f{i}", 'file_size': size} for i, size in enumerate(sizes)]
+        return list(subdirs), files
+    monkeypatch.setattr(sampling, "scan_directory", scan_directory)
+
+
+def uniform_tree():
+    tree = {"R": ([f"R\\{top}" for top in "abcd"], [])}
+    for top in "abcd":
+        top_path = f"R\\{top}"
+        tree[top_path] = ([f"{top_path}\\{sub}" for sub in "xyz"], [50])
+        for sub in "xyz":
+            tree[f"{top_path}\\{sub}"] = ([], [100, 100])
+    return tree
+
+
+def test_sample_share_is_exact_on_uniform_tree(monkeypatch):
+    fake_share(monkeypatch, uniform_tree())
+    result = sample_share("R", "data1", {"min_size": 80}, [], probes=20, time_budget=60, seed=1)
+
+    estimates = result["estimates"]
+    assert estimates["total_files"]["estimate"] == 28
+    assert estimates["total_bytes"]["estimate"] == 2600
+    assert estimates["matching_files"]["estimate"] == 24
+    assert estimates["matching_bytes"]["estimate"] == 2400
+    # Every probe gives the same value, so there is no spread
+    assert estimates["total_files"]["low"] == estimates["total_files"]["high"] == 28
+    assert result["strata"] == 4
+
+
+def test_sample_share_estimate_brackets_uneven_tree(monkeypatch):
+    # Half of the leaves hold all the files, single probes are either 0 or twice the truth
+    tree = {"R": (["R\\a", "R\\b"], [7])}
+    for top in "ab":
+        leaves = [f"R\\{top}\\{i}" for i in range(4)]
+        tree[f"R\\{top}"] = (leaves, [])
+        for i, leaf in enumerate(leaves):
+            tree[leaf] = ([], [1] * 10 if i % 2 else [])
+    fake_share(monkeypatch, tree)
+
+    result = sample_share("R", "data1", {}, [], probes=2000, time_budget=60, seed=7)
+
+    total_files = result["estimates"]["total_files"]
+    assert total_files["low"] <= total_files["estimate"] <= total_files["high"]
+    assert abs(total_files["estimate"] - 47) <= 4
+    # The root is listed exactly and every directory listed counts as observed
+    assert total_files["observed"] <= 47
+    assert result["directories_listed"] <= len(tree)
+
+
+def test_sample_share_without_subdirectories(monkeypatch):
+    fake_share(monkeypatch, {"R": ([], [10, 20])})
+    result = sample_share("R", "data1", {}, [], probes=20, time_budget=60, seed=1)
+
+    assert result["strata"] == 0
+    assert result["probes"] == 0
+    assert result["estimates"]["total_bytes"] == {"estimate": 30, "low": 30, "high": 30, "observed": 30}
@@ -0,0 +1,18 @@
+from scan_results import ScanResult
+
+
+def test_scan_result_stores_unknown_size_as_zero():
+    result = ScanResult()
+    result.add("\\\\srv\\data1\\a", "file", 0, 0, 0, None)
+    assert result[0]['file_size'] == 0
+    assert result.total_size() == 0
+
+
+def test_scan_result_records_read_like_file_infos():
+    result = ScanResult()
+    result.add("\\\\srv\\data1\\a", "one", 0, 100, 200, 10)
+    result.add("\\\\srv\\data1\\a", "two", 0, 300, 400, 20)
+    assert len(result.directories) == 1
+    assert [record['full_path'] for record in result] == ["\\\\srv\\data1\\a\\one", "\\\\srv\\data1\\a\\two"]
+    assert result[1].epoch('last_access_time') == 300
+    assert result.total_size() == 30
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("smbclient")
+pytest.importorskip("requests")
+
+from snapshot_scan import directory_signature
+
+
+def test_directory_signature_ignores_listing_order():
+    assert directory_signature(["a|1|2|3", "b|4|5|6"]) == directory_signature(["b|4|5|6", "a|1|2|3"])
+
+
+def test_directory_signature_changes_with_any_entry():
+    base = directory_signature(["a|1|2|3", "b|4|5|6"])
+    assert directory_signature(["a|1|2|3", "b|4|5|7"]) != base
+    assert directory_signature(["a|1|2|3"]) != base
+    assert directory_signature(["a|1|2|3", "b|4|5|6", "c|7|8|9"]) != base
+
+
+def test_directory_signature_keeps_entries_apart():
+    # Entries are separated, joining two names doesn't give the same signature
+    assert directory_signature(["ab"]) != directory_signature(["a", "b"])
+
+
+def test_directory_signature_handles_undecodable_names():
+    signature = directory_signature(["caf\udce9|1|2|3"])
+    assert len(signature) == 32
+    assert signature == directory_signature(["caf\udce9|1|2|3"])
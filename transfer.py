@@ -0,0 +1,251 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import storage
+from profiling import current_job, profiled_job
+from transfer_scheduler import current_priority, transfer_slot
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# Requested block size per SMB read/write, rounded to what the connection negotiated
+TRANSFER_BUFFER_SIZE = int(os.getenv("TRANSFER_BUFFER_SIZE", 8 * 1024 * 1024))
+# Reads/writes kept in flight per file, each one consumes SMB2 credits on the connection
+TRANSFER_MAX_OUTSTANDING = int(os.getenv("TRANSFER_MAX_OUTSTANDING", 4))
+# Files at least this large are copied in blocks with checkpoints, smaller ones in one stream
+CHUNKED_TRANSFER_MIN_SIZE = int(os.getenv("CHUNKED_TRANSFER_MIN_SIZE", 64 * 1024 * 1024))
+# How much newly committed data triggers a checkpoint callback
+TRANSFER_CHECKPOINT_BYTES = int(os.getenv("TRANSFER_CHECKPOINT_BYTES", 64 * 1024 * 1024))
+
+# Content hash computed while copying: blake3, xxhash, blake2b or none
+TRANSFER_HASH_ALGORITHM = os.getenv("TRANSFER_HASH_ALGORITHM", "blake3")
+
+SMB_BLOCK_ALIGNMENT = 64 * 1024
+
+
+class ContentHasher:
+    """
+    Streaming content hash. Digests are prefixed with the algorithm that produced them,
+    so hashes from hosts with different optional packages never compare equal by accident.
+    """
+    def __init__(self, algorithm=TRANSFER_HASH_ALGORITHM):
+        if algorithm == "blake3" and blake3 is not None:
+            self.algorithm, self._hash = "blake3", blake3.blake3()
+        elif algorithm in ("xxhash", "xxh3_128") and xxhash is not None:
+            self.algorithm, self._hash = "xxh3_128", xxhash.xxh3_128()
+        else:
+            self.algorithm, self._hash = "blake2b", hashlib.blake2b(digest_size=32)
+
+    def update(self, data):
+        self._hash.update(data)
+
+    def hexdigest(self):
+        return f"{self.algorithm}:{self._hash.hexdigest()}"
+
+
+def new_hasher(algorithm=TRANSFER_HASH_ALGORITHM):
+    if not algorithm or algorithm == "none":
+        return None
+    return ContentHasher(algorithm)
+
+
+def _feed_hasher(path, hasher, length=None, buffer_size=TRANSFER_BUFFER_SIZE):
+    remaining = length
+    with storage.open_file(path, mode="rb") as f:
+        while remaining is None or remaining > 0:
+            with transfer_slot():
+                data = f.read(buffer_size if remaining is None else min(buffer_size, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            if remaining is not None:
+                remaining -= len(data)
+
+
+def hash_file(path, algorithm=TRANSFER_HASH_ALGORITHM):
+    """
+    Reads path back and returns its prefixed content hash.
+    """
+    hasher = ContentHasher(algorithm)
+    _feed_hasher(path, hasher)
+    return hasher.hexdigest()
+
+
+def get_smb_io_sizes(path):
+    """
+    Returns the (max_read_size, max_write_size) negotiated on the connection that serves path.
+    """
+    with storage.open_file(path, mode="rb", buffering=0) as raw:
+        connection = raw.fd.connection
+        return connection.max_read_size, connection.max_write_size
+
+
+def aligned_block_size(requested, max_read_size, max_write_size):
+    # A block must fit in a single SMB READ and a single SMB WRITE request
+    block_size = min(requested, max_read_size, max_write_size)
+    return max(SMB_BLOCK_ALIGNMENT, block_size - block_size % SMB_BLOCK_ALIGNMENT)
+
+
+class _HandlePool(threading.local):
+    """
+    One source and one destination handle per worker thread, so every thread can keep
+    its own read and write outstanding on the shared SMB session.
+    """
+    def __init__(self):
+        self.handles = None
+
+
+def _read_block(handle, offset, length):
+    handle.seek(offset)
+    data = bytearray()
+    while len(data) < length:
+        chunk = handle.read(length - len(data))
+        if not chunk:
+            break
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _write_block(handle, offset, data):
+    handle.seek(offset)
+    view = memoryview(data)
+    while view:
+        written = handle.write(view)
+        view = view[written:]
+
+
+def stream_copy(src_path, dest_path, buffer_size=TRANSFER_BUFFER_SIZE, hasher=None):
+    with storage.open_file(src_path, mode="rb") as src, storage.open_file(dest_path, mode="wb") as dest:
+        while True:
+            # One slot per block, so a higher priority transfer can step in between blocks
+            with transfer_slot():
+                data = src.read(buffer_size)
+                if data:
+                    dest.write(data)
+            if not data:
+                break
+            if hasher:
+                hasher.update(data)
+
+
+def chunked_copy(src_path, dest_path, file_size, start_offset=0, progress_callback=None,
+                 buffer_size=TRANSFER_BUFFER_SIZE, max_outstanding=TRANSFER_MAX_OUTSTANDING, hasher=None):
+    """
+    Copies src_path to dest_path in fixed blocks with several reads/writes in flight.
+    Copying starts at start_offset (a previous checkpoint); progress_callback(offset) is
+    called from the calling thread whenever the contiguous, flushed prefix of the
+    destination grows by TRANSFER_CHECKPOINT_BYTES and once at the end.
+    When a hasher is given it is fed the whole file in order.
+    Returns the number of bytes in the destination.
+    """
+    max_read_size, max_write_size = get_smb_io_sizes(src_path)
+    block_size = aligned_block_size(buffer_size, max_read_size, max_write_size)
+
+    # Only whole blocks are ever checkpointed, so resume on a block boundary
+    start_offset -= start_offset % block_size
+    if start_offset:
+        print(f"Resuming copy of {src_path} at offset {start_offset}")
+        if hasher:
+            # The hash state isn't checkpointed, rebuild it from the already copied prefix
+            _feed_hasher(src_path, hasher, length=start_offset, buffer_size=block_size)
+    else:
+        with storage.open_file(dest_path, mode="wb"):
+            pass
+
+    # Worker threads don't inherit the caller's context, take its priority and job along
+    priority = current_priority()
+    job_id = current_job()
+    local = _HandlePool()
+    opened = []
+    opened_lock = threading.Lock()
+    checkpoint_handle = storage.open_file(dest_path, mode="r+b", buffering=0) if progress_callback else None
+
+    def copy_block(offset):
+        if local.handles is None:
+            local.handles = (
+                storage.open_file(src_path, mode="rb", buffering=0),
+                storage.open_file(dest_path, mode="r+b", buffering=0),
+            )
+            with opened_lock:
+                opened.extend(local.handles)
+        src, dest = local.handles
+        with profiled_job(job_id), transfer_slot(priority):
+            data = _read_block(src, offset, min(block_size, file_size - offset))
+            _write_block(dest, offset, data)
+        return offset, data
+
+    committed = start_offset
+    last_checkpoint = start_offset
+    completed = {}
+    next_offset = start_offset
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_outstanding) as executor:
+            in_flight = set()
+            while next_offset < file_size or in_flight:
+                # Out-of-order blocks are held for the hasher, so cap how far ahead we read
+                while (next_offset < file_size and len(in_flight) < max_outstanding
+                       and next_offset - committed < 2 * max_outstanding * block_size):
+                    in_flight.add(executor.submit(copy_block, next_offset))
+                    next_offset += block_size
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    offset, data = future.result()
+                    completed[offset] = data if hasher else len(data)
+
+                # Blocks complete out of order, only the contiguous prefix counts as copied
+                while committed in completed:
+                    block = completed.pop(committed)
+                    if hasher:
+                        hasher.update(block)
+                        block = len(block)
+                    committed += block
+
+                if progress_callback and committed - last_checkpoint >= TRANSFER_CHECKPOINT_BYTES:
+                    # SMB2 FLUSH makes every block below the checkpoint durable on the server
+                    checkpoint_handle.fd.flush()
+                    progress_callback(committed)
+                    last_checkpoint = committed
+    finally:
+        with opened_lock:
+            for handle in opened:
+                handle.close()
+        if checkpoint_handle:
+            checkpoint_handle.close()
+
+    if progress_callback and committed != last_checkpoint:
+        progress_callback(committed)
+    return committed
+
+
+def copy_file(src_path, dest_path, file_size=None, start_offset=0, progress_callback=None, hasher=None):
+    """
+    Copies a file between shares, using checkpointed block transfers for large files.
+    Between two mounted shares the kernel copies the data (see storage.py).
+    """
+    if file_size is None:
+        file_size = storage.stat(src_path).st_size
+
+    src_local, dest_local = storage.is_local(src_path), storage.is_local(dest_path)
+    if src_local and dest_local:
+        return storage.copy_local(src_path, dest_path, file_size, start_offset, progress_callback, hasher=hasher)
+
+    # Block transfers need SMB handles on both sides
+    if file_size >= CHUNKED_TRANSFER_MIN_SIZE and not src_local and not dest_local:
+        return chunked_copy(src_path, dest_path, file_size, start_offset, progress_callback, hasher=hasher)
+
+    stream_copy(src_path, dest_path, hasher=hasher)
+    if progress_callback:
+        progress_callback(file_size)
+    return file_size
@@ -0,0 +1,209 @@
+import contextvars
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import wraps
+
+from database import SessionLocal
+from models import TransferActivity
+
+
+# Priority classes, lower runs first
+INTERACTIVE = 0  # a user waiting on a restore
+SINGLE = 1       # one file archived through the API
+BULK = 2         # archive jobs, workers and policy runs
+PRIORITY_NAMES = {INTERACTIVE: "interactive", SINGLE: "single", BULK: "bulk"}
+
+# Blocks that may be in flight on the filer link at once, across all transfers
+TRANSFER_SLOTS = int(os.getenv("TRANSFER_SLOTS", 8))
+# Slots only interactive transfers may use, so a restore never waits for a bulk block
+TRANSFER_INTERACTIVE_RESERVED = int(os.getenv("TRANSFER_INTERACTIVE_RESERVED", 2))
+
+# Slots are per process. Interactive transfers are also announced in the database, and
+# while another process (an API replica) is serving one, bulk transfers here are held
+# to this many slots.
+TRANSFER_ACTIVITY_SHARED = os.getenv("TRANSFER_ACTIVITY_SHARED", "true").lower() in ("1", "true", "yes")
+TRANSFER_BULK_SLOTS_SHARED = int(os.getenv("TRANSFER_BULK_SLOTS_SHARED", 1))
+# How long an announcement lasts; it is renewed and other processes are polled twice as often
+TRANSFER_ACTIVITY_SECONDS = float(os.getenv("TRANSFER_ACTIVITY_SECONDS", 5))
+
+_current_priority = contextvars.ContextVar("transfer_priority", default=SINGLE)
+
+
+class ActivitySync(threading.Thread):
+    """
+    Shares interactive transfer activity with the other processes through the
+    transfer_activity table. Each round records this process as interactive if it ran an
+    interactive block since the previous round, and reads whether another process did.
+    The database is only touched from this thread, never on a transfer's path.
+    """
+    def __init__(self, on_change):
+        super().__init__(name="transfer-activity", daemon=True)
+        self.process_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.on_change = on_change
+        self.interactive_seen = False
+        self.remote_interactive = False
+        self.error = None
+
+    def run(self):
+        while True:
+            try:
+                self.sync()
+                self.error = None
+            except Exception as e:
+                if self.error is None:
+                    print(f"⚠️ Transfer activity not shared with other processes: {e}")
+                self.error = str(e)
+            time.sleep(TRANSFER_ACTIVITY_SECONDS / 2)
+
+    def sync(self):
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            if self.interactive_seen:
+                self.interactive_seen = False
+                activity = db.query(TransferActivity).filter(TransferActivity.process_id == self.process_id).first()
+                if not activity:
+                    activity = TransferActivity(process_id=self.process_id)
+                    db.add(activity)
+                activity.interactive_until = now + timedelta(seconds=TRANSFER_ACTIVITY_SECONDS)
+            remote = db.query(TransferActivity.id)\
+                .filter(TransferActivity.process_id != self.process_id)\
+                .filter(TransferActivity.interactive_until > now)\
+                .first() is not None
+            db.commit()
+        finally:
+            db.close()
+
+        if remote != self.remote_interactive:
+            self.remote_interactive = remote
+            self.on_change()
+
+
+class TransferScheduler:
+    """
+    Hands out per-block transfer slots by priority. A block waits while any higher
+    priority block is waiting, and bulk and single transfers can't take the reserved
+    slots, so a restore starts within one block time however busy the link is.
+    Bulk transfers also give way to restores served by other processes, see ActivitySync.
+    """
+    def __init__(self, slots=TRANSFER_SLOTS, reserved=TRANSFER_INTERACTIVE_RESERVED):
+        self.slots = max(1, slots)
+        self.reserved = min(max(0, reserved), self.slots - 1)
+        self.in_use = 0
+        self.waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self.blocks = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_seconds = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.max_wait_seconds = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.condition = threading.Condition()
+        self.activity = None
+
+    def _start_activity(self):
+        with self.condition:
+            if self.activity is None:
+                self.activity = ActivitySync(self._activity_changed)
+                self.activity.start()
+
+    def _activity_changed(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def _can_run(self, priority):
+        if any(self.waiting[higher] for higher in PRIORITY_NAMES if higher < priority):
+            return False
+        limit = self.slots if priority == INTERACTIVE else self.slots - self.reserved
+        if priority == BULK and self.activity and self.activity.remote_interactive:
+            limit = min(limit, TRANSFER_BULK_SLOTS_SHARED)
+        return self.in_use < limit
+
+    def acquire(self, priority):
+        started = time.monotonic()
+        if TRANSFER_ACTIVITY_SHARED:
+            if self.activity is None:
+                self._start_activity()
+            if priority == INTERACTIVE:
+                self.activity.interactive_seen = True
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                while not self._can_run(priority):
+                    self.condition.wait()
+            finally:
+                self.waiting[priority] -= 1
+            self.in_use += 1
+
+            waited = time.monotonic() - started
+            self.blocks[priority] += 1
+            self.wait_seconds[priority] += waited
+            self.max_wait_seconds[priority] = max(self.max_wait_seconds[priority], waited)
+
+    def release(self):
+        with self.condition:
+            self.in_use -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority=None):
+        priority = current_priority() if priority is None else priority
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                "slots": self.slots,
+                "interactive_reserved": self.reserved,
+                "in_use": self.in_use,
+                "remote_interactive": bool(self.activity and self.activity.remote_interactive),
+                "classes": {
+                    name: {
+                        "waiting": self.waiting[priority],
+                        "blocks": self.blocks[priority],
+                        "avg_wait_ms": round(self.wait_seconds[priority] * 1000 / self.blocks[priority], 3) if self.blocks[priority] else 0.0,
+                        "max_wait_ms": round(self.max_wait_seconds[priority] * 1000, 3)
+                    }
+                    for priority, name in PRIORITY_NAMES.items()
+                }
+            }
+
+
+scheduler = TransferScheduler()
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+@contextmanager
+def transfer_priority(priority):
+    """
+    Runs every transfer started inside the block at the given priority class.
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def transfer_slot(priority=None):
+    return scheduler.slot(priority)
+
+
+def prioritized(priority):
+    """
+    Decorator form of transfer_priority() for entry points such as restores and jobs.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with transfer_priority(priority):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
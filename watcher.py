@@ -0,0 +1,193 @@
+"""
+Catalog watcher: keeps the file_metadata table current from SMB2 CHANGE_NOTIFY events.
+
+    python watcher.py [--initial-scan]
+
+Every top-level directory of each data share gets its own tree watcher, and the share
+root gets a non-recursive one. When the server reports that its notify buffer
+overflowed, only the subtree of that watcher is rescanned.
+"""
+import argparse
+import ntpath
+import threading
+import time
+
+import smbclient
+from smbprotocol.change_notify import ChangeNotifyFlags, CompletionFilter, FileAction, FileSystemWatcher
+
+from catalog import remove_path, rescan_directory, upsert_file
+from database import SessionLocal
+from storage import configure_smb
+from models import FileMetadata
+from netapp_btc import access_CIFS_share, build_file_info, get_first_ip_address, get_svm_data_volumes, normalize_path
+
+
+WATCH_FILTER = (
+    CompletionFilter.FILE_NOTIFY_CHANGE_FILE_NAME
+    | CompletionFilter.FILE_NOTIFY_CHANGE_DIR_NAME
+    | CompletionFilter.FILE_NOTIFY_CHANGE_SIZE
+    | CompletionFilter.FILE_NOTIFY_CHANGE_LAST_WRITE
+    | CompletionFilter.FILE_NOTIFY_CHANGE_CREATION
+)
+NOTIFY_BUFFER_LENGTH = 64 * 1024
+WATCH_RETRY_SECONDS = 10
+
+ADDED_ACTIONS = {FileAction.FILE_ACTION_ADDED, FileAction.FILE_ACTION_MODIFIED, FileAction.FILE_ACTION_RENAMED_NEW_NAME}
+REMOVED_ACTIONS = {FileAction.FILE_ACTION_REMOVED, FileAction.FILE_ACTION_RENAMED_OLD_NAME, FileAction.FILE_ACTION_REMOVED_BY_DELETE}
+
+
+def apply_change(db, share_name, path, action):
+    """
+    Applies one change event to the catalog. Returns True when a new directory appeared.
+    """
+    if action in REMOVED_ACTIONS:
+        remove_path(db, path)
+        return False
+
+    if action not in ADDED_ACTIONS or path.endswith("_shortcut.bat"):
+        return False
+
+    try:
+        stat_result = smbclient.stat(path)
+    except FileNotFoundError:
+        # Already gone again, a later event will say so too
+        remove_path(db, path)
+        return False
+
+    if stat_result.st_file_attributes & 0x10:  # FILE_ATTRIBUTE_DIRECTORY
+        if action == FileAction.FILE_ACTION_MODIFIED:
+            return False
+        # A directory appeared or was renamed in, its contents come with it
+        rescan_directory(db, share_name, path)
+        return True
+
+    upsert_file(db, share_name, build_file_info(path, stat_result))
+    return False
+
+
+def watch_directory(share_name, dir_path, recursive, stop_event, on_new_directory=None):
+    """
+    Watches one directory until stop_event is set, applying every change to the catalog.
+    on_new_directory(path) is called for directories created directly in a non-tree watch.
+    """
+    flags = ChangeNotifyFlags.SMB2_WATCH_TREE if recursive else ChangeNotifyFlags.NONE
+
+    while not stop_event.is_set():
+        try:
+            with smbclient.open_file(dir_path, mode="rb", buffering=0, file_type="dir") as dir_handle:
+                print(f"👀 Watching {dir_path}" + (" (tree)" if recursive else ""))
+                while not stop_event.is_set():
+                    watcher = FileSystemWatcher(dir_handle.fd)
+                    watcher.start(WATCH_FILTER, flags=flags, output_buffer_length=NOTIFY_BUFFER_LENGTH)
+                    changes = watcher.wait()
+
+                    db = SessionLocal()
+                    try:
+                        if not changes:
+                            # STATUS_NOTIFY_ENUM_DIR: the server dropped events, relist this subtree
+                            print(f"⚠️ Notify buffer overflow on {dir_path}, rescanning")
+                            rescan_directory(db, share_name, dir_path, recursive=recursive)
+                        else:
+                            new_directories = []
+                            for change in changes:
+                                path = normalize_path(ntpath.join(dir_path, change["file_name"].get_value()))
+                                if apply_change(db, share_name, path, change["action"].get_value()):
+                                    new_directories.append(path)
+                        db.commit()
+                        if changes and on_new_directory:
+                            for path in new_directories:
+                                on_new_directory(path)
+                    except Exception:
+                        db.rollback()
+                        raise
+                    finally:
+                        db.close()
+        except FileNotFoundError:
+            # The watched directory itself was removed or renamed, its parent watcher covers it
+            print(f"Stopped watching {dir_path} (no longer exists)")
+            return
+        except Exception as e:
+            print(f"❌ Watcher on {dir_path} failed: {e}, retrying in {WATCH_RETRY_SECONDS}s")
+            stop_event.wait(WATCH_RETRY_SECONDS)
+            # Events may have been missed while the watcher was down
+            db = SessionLocal()
+            try:
+                rescan_directory(db, share_name, dir_path, recursive=recursive)
+                db.commit()
+            except Exception as rescan_error:
+                db.rollback()
+                print(f"❌ Rescan of {dir_path} failed: {rescan_error}")
+            finally:
+                db.close()
+
+
+def get_data_share_roots():
+    svm_data = get_svm_data_volumes()
+    if not svm_data:
+        return []
+    ip_address = get_first_ip_address(svm_data)
+    roots = []
+    for share in svm_data.get('volumes', []):
+        share_path, share_name = access_CIFS_share(share, ip_address)
+        if share_path:
+            roots.append((share_name, normalize_path(share_path)))
+    return roots
+
+
+def initial_scan(share_name, share_root, force):
+    db = SessionLocal()
+    try:
+        has_entries = db.query(FileMetadata).filter(FileMetadata.share_name == share_name).first() is not None
+        if has_entries and not force:
+            return
+        print(f"🔍 Loading catalog for {share_name}")
+        found = rescan_directory(db, share_name, share_root)
+        db.commit()
+        print(f"✅ Catalog for {share_name}: {found} files")
+    finally:
+        db.close()
+
+
+def run_watchers(force_scan=False):
+    configure_smb()
+    stop_event = threading.Event()
+    threads = []
+
+    def start_watcher(share_name, dir_path, recursive):
+        on_new_directory = None
+        if not recursive:
+            on_new_directory = lambda path: start_watcher(share_name, path, True)
+        thread = threading.Thread(
+            target=watch_directory,
+            args=(share_name, dir_path, recursive, stop_event, on_new_directory),
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+
+    for share_name, share_root in get_data_share_roots():
+        initial_scan(share_name, share_root, force_scan)
+
+        # Files directly in the root, then one tree watcher per top-level directory so an
+        # overflow only costs a rescan of that directory
+        start_watcher(share_name, share_root, False)
+        for entry in smbclient.scandir(share_root):
+            if entry.is_dir():
+                start_watcher(share_name, normalize_path(ntpath.join(share_root, entry.name)), True)
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage Optimizer catalog watcher")
+    parser.add_argument("--initial-scan", action="store_true", help="Reload the catalog before watching")
+    args = parser.parse_args()
+    run_watchers(force_scan=args.initial_scan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from models import WorkTask, WorkTaskStatus
+
+
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", 120))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 5))
+# A failed task waits this long times its attempts before it is handed out again
+TASK_RETRY_DELAY_SECONDS = float(os.getenv("TASK_RETRY_DELAY_SECONDS", 30))
+
+SCAN_DIRECTORY = "scan_directory"
+ARCHIVE_FILES = "archive_files"
+
+# First key of the advisory locks on archive job files
+JOB_FILE_LOCK_SPACE = 31
+
+
+class TaskDeferred(Exception):
+    """
+    Raised by a handler that can't make progress yet (files locked by a previous owner).
+    The task is retried later without counting as a failed attempt.
+    """
+
+
+def enqueue_task(db: Session, kind: str, payload: dict, job_id: int = None, priority: int = 0):
+    """
+    Adds a task to the queue; the caller commits so tasks can be enqueued with other changes.
+    """
+    task = WorkTask(
+        kind=kind,
+        job_id=job_id,
+        payload=payload,
+        priority=priority,
+        status=WorkTaskStatus.pending
+    )
+    db.add(task)
+    return task
+
+
+def claim_task(db: Session, worker_id: str, kinds=None):
+    """
+    Claims the next pending task, or a running one whose lease has expired because its
+    worker crashed. SKIP LOCKED lets any number of workers poll without blocking each other.
+    """
+    while True:
+        now = datetime.utcnow()
+        query = db.query(WorkTask).filter(or_(
+            and_(
+                WorkTask.status == WorkTaskStatus.pending,
+                or_(WorkTask.not_before.is_(None), WorkTask.not_before <= now)
+            ),
+            and_(WorkTask.status == WorkTaskStatus.running, WorkTask.lease_expires_at < now)
+        ))
+        if kinds:
+            query = query.filter(WorkTask.kind.in_(kinds))
+
+        task = query.order_by(WorkTask.priority.desc(), WorkTask.id)\
+            .with_for_update(skip_locked=True)\
+            .first()
+        if not task:
+            db.commit()
+            return None
+        if task.attempts < TASK_MAX_ATTEMPTS:
+            break
+        task.status = WorkTaskStatus.failed
+        task.error = task.error or f"Gave up after {task.attempts} attempts"
+        db.commit()
+
+    if task.status == WorkTaskStatus.running:
+        print(f"♻️ Reclaiming task {task.id} from {task.worker_id} (lease expired)")
+
+    task.status = WorkTaskStatus.running
+    task.worker_id = worker_id
+    task.attempts += 1
+    task.heartbeat_at = now
+    task.lease_expires_at = now + timedelta(seconds=TASK_LEASE_SECONDS)
+    task.not_before = None
+    db.commit()
+    return task
+
+
+def renew_lease(task_id: int, worker_id: str):
+    """
+    Extends the lease of a task this worker still owns. Returns False if it was taken over.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        updated = db.query(WorkTask)\
+            .filter(WorkTask.id == task_id)\
+            .filter(WorkTask.worker_id == worker_id)\
+            .filter(WorkTask.status == WorkTaskStatus.running)\
+            .update({
+                WorkTask.heartbeat_at: now,
+                WorkTask.lease_expires_at: now + timedelta(seconds=TASK_LEASE_SECONDS)
+            }, synchronize_session=False)
+        db.commit()
+        return updated == 1
+    finally:
+        db.close()
+
+
+class LeaseHeartbeat:
+    """
+    Renews a task lease in the background for as long as the task is being processed.
+    renew(id, owner) can be swapped for leases on other rows, such as archive jobs.
+    """
+    def __init__(self, task_id: int, worker_id: str, interval: float = TASK_LEASE_SECONDS / 3, renew=renew_lease):
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.renew = renew
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.renew(self.task_id, self.worker_id):
+                    print(f"⚠️ Lost lease on task {self.task_id}")
+                    self.lost = True
+                    return
+            except Exception as e:
+                print(f"⚠️ Heartbeat for task {self.task_id} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _finish_task(db: Session, task_id: int, worker_id: str, values: dict):
+    """
+    Updates a task only while this worker still holds it. The row lock taken by the UPDATE
+    keeps claim_task() from reclaiming it until the caller's transaction ends.
+    """
+    return db.query(WorkTask)\
+        .filter(WorkTask.id == task_id)\
+        .filter(WorkTask.worker_id == worker_id)\
+        .filter(WorkTask.status == WorkTaskStatus.running)\
+        .update(values, synchronize_session=False) == 1
+
+
+def complete_task(db: Session, task: WorkTask, worker_id: str):
+    """
+    Marks the task done and commits it with everything else in the session. If the lease
+    was lost, the session is rolled back instead, so a reclaimed task's results (candidates,
+    child tasks) are only ever committed once. Returns whether the task was completed.
+    """
+    task_id = task.id
+    if not _finish_task(db, task_id, worker_id, {WorkTask.status: WorkTaskStatus.done, WorkTask.lease_expires_at: None}):
+        db.rollback()
+        print(f"⚠️ Task {task_id} was taken over by another worker, discarding this attempt")
+        return False
+    db.commit()
+    return True
+
+
+def fail_task(db: Session, task: WorkTask, worker_id: str, reason: str):
+    task_id = task.id
+    attempts = task.attempts
+    # Back to pending so another attempt (on any worker) picks it up after a backoff
+    status = WorkTaskStatus.failed if attempts >= TASK_MAX_ATTEMPTS else WorkTaskStatus.pending
+    not_before = datetime.utcnow() + timedelta(seconds=TASK_RETRY_DELAY_SECONDS * attempts)
+    if not _finish_task(db, task_id, worker_id, {
+        WorkTask.status: status, WorkTask.error: reason, WorkTask.lease_expires_at: None, WorkTask.not_before: not_before
+    }):
+        db.rollback()
+        return False
+    db.commit()
+    return True
+
+
+def defer_task(db: Session, task: WorkTask, worker_id: str, reason: str, delay: float = TASK_RETRY_DELAY_SECONDS):
+    """
+    Puts the task back to pending for a retry after delay seconds, giving back the attempt.
+    """
+    task_id = task.id
+    if not _finish_task(db, task_id, worker_id, {
+        WorkTask.status: WorkTaskStatus.pending,
+        WorkTask.attempts: WorkTask.attempts - 1,
+        WorkTask.error: reason,
+        WorkTask.lease_expires_at: None,
+        WorkTask.not_before: datetime.utcnow() + timedelta(seconds=delay)
+    }):
+        db.rollback()
+        return False
+    db.commit()
+    return True
+
+
+class JobFileClaims:
+    """
+    Session-level advisory locks on archive job files, held on a connection of their own
+    while a worker moves the files. A worker whose lease expired keeps its locks until it
+    stops, so the worker that reclaimed the task never moves the same file at the same
+    time; Postgres drops the locks of a worker that died.
+    """
+    def __init__(self):
+        self.connection = engine.connect()
+
+    def try_claim(self, job_file_id: int):
+        claimed = self.connection.execute(
+            text("SELECT pg_try_advisory_lock(:space, :id)"), {"space": JOB_FILE_LOCK_SPACE, "id": job_file_id}
+        ).scalar()
+        # The lock outlives the transaction, don't leave it open
+        self.connection.commit()
+        return bool(claimed)
+
+    def close(self):
+        try:
+            self.connection.execute(text("SELECT pg_advisory_unlock_all()"))
+            self.connection.commit()
+        finally:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def has_open_tasks(db: Session, job_id: int):
+    return db.query(WorkTask)\
+        .filter(WorkTask.job_id == job_id)\
+        .filter(WorkTask.status.in_([WorkTaskStatus.pending, WorkTaskStatus.running]))\
+        .first() is not None
@@ -0,0 +1,189 @@
+"""
+Archive worker: pulls directory-scan and file-move tasks from the Postgres work queue.
+
+Run any number of these next to the API, on one or many hosts:
+
+    python worker.py [--kinds scan_directory,archive_files]
+"""
+import argparse
+import os
+import socket
+import time
+
+from archive_jobs import add_job_candidates, advance_job_file, pack_small_files
+from database import SessionLocal
+from models import ArchiveFileState, ArchiveJob, ArchiveJobFile, ArchiveJobStatus
+from netapp_btc import filter_files, is_blacklisted, scan_directory
+from profiling import profiled_job
+from restore_history import apply_restore_history, record_skipped
+from transfer_scheduler import BULK, prioritized
+from work_queue import (
+    ARCHIVE_FILES,
+    SCAN_DIRECTORY,
+    JobFileClaims,
+    LeaseHeartbeat,
+    TaskDeferred,
+    claim_task,
+    complete_task,
+    defer_task,
+    enqueue_task,
+    fail_task,
+    has_open_tasks,
+)
+
+
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", 2))
+# Candidates found in one directory are moved in batches of this many files per task
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 100))
+
+
+def handle_scan_directory(db, task, job, heartbeat):
+    path = task.payload["path"]
+    subdirs, files = scan_directory(path)
+
+    filtered = filter_files({job.share_name: files}, job.filters or {}, job.blacklist or [], job.share_name)
+    skipped = []
+    job_files = add_job_candidates(db, job.id, apply_restore_history(db, filtered.get(job.share_name, []), skipped))
+    # Committed with the task, a retried scan of this directory doesn't count them again
+    record_skipped(skipped, job.id)
+    db.flush()
+
+    for start in range(0, len(job_files), ARCHIVE_BATCH_SIZE):
+        batch = job_files[start:start + ARCHIVE_BATCH_SIZE]
+        enqueue_task(db, ARCHIVE_FILES, {"job_file_ids": [job_file.id for job_file in batch]}, job_id=job.id)
+
+    for subdir in subdirs:
+        # Everything below a blacklisted directory would be filtered out anyway
+        if is_blacklisted(subdir, job.blacklist or []):
+            continue
+        enqueue_task(db, SCAN_DIRECTORY, {"path": subdir}, job_id=job.id)
+
+    if heartbeat.lost:
+        raise RuntimeError("Lease lost, another worker owns this task now")
+    print(f"📂 {path}: {len(job_files)} candidate(s), {len(subdirs)} subdirectories")
+
+
+@prioritized(BULK)
+def handle_archive_files(db, task, job, heartbeat):
+    job_files = db.query(ArchiveJobFile)\
+        .filter(ArchiveJobFile.id.in_(task.payload["job_file_ids"]))\
+        .filter(ArchiveJobFile.state.notin_([ArchiveFileState.logged, ArchiveFileState.failed]))\
+        .order_by(ArchiveJobFile.id)\
+        .all()
+
+    with JobFileClaims() as claims:
+        claimed = []
+        held_elsewhere = 0
+        for job_file in job_files:
+            if not claims.try_claim(job_file.id):
+                held_elsewhere += 1
+                continue
+            # A previous owner may have moved it on between the query and the claim
+            db.refresh(job_file)
+            if job_file.state not in (ArchiveFileState.logged, ArchiveFileState.failed):
+                claimed.append(job_file)
+
+        if job.pack_small_files:
+            pack_small_files(db, job, claimed)
+
+        for job_file in claimed:
+            if heartbeat.lost:
+                raise RuntimeError("Lease lost, another worker owns this task now")
+            # Every state change is committed, a retried task continues where this one stopped
+            advance_job_file(db, job_file)
+
+    if held_elsewhere:
+        # Retried later, the files are picked up once their previous worker lets go
+        raise TaskDeferred(f"{held_elsewhere} file(s) still being moved by a previous owner of this task")
+
+
+def finish_job_if_done(db, job_id):
+    if has_open_tasks(db, job_id):
+        return
+    job = db.query(ArchiveJob).filter(ArchiveJob.id == job_id).first()
+    if not job or job.status != ArchiveJobStatus.running:
+        return
+
+    # Files of tasks that gave up are never moved, the job isn't complete with them
+    unfinished = db.query(ArchiveJobFile)\
+        .filter(ArchiveJobFile.job_id == job_id)\
+        .filter(ArchiveJobFile.state.notin_([ArchiveFileState.logged, ArchiveFileState.failed]))\
+        .count()
+    if unfinished:
+        job.status = ArchiveJobStatus.failed
+        job.error = f"{unfinished} file(s) left unfinished by failed tasks"
+        db.commit()
+        print(f"❌ Archive job {job_id}: {job.error}")
+        return
+
+    job.status = ArchiveJobStatus.completed
+    db.commit()
+    print(f"✅ Archive job {job_id} completed")
+
+
+def process_task(db, task):
+    job = db.query(ArchiveJob).filter(ArchiveJob.id == task.job_id).first()
+    if not job:
+        fail_task(db, task, WORKER_ID, "Archive job not found")
+        return
+
+    with LeaseHeartbeat(task.id, WORKER_ID) as heartbeat, profiled_job(task.job_id):
+        try:
+            if task.kind == SCAN_DIRECTORY:
+                handle_scan_directory(db, task, job, heartbeat)
+            elif task.kind == ARCHIVE_FILES:
+                handle_archive_files(db, task, job, heartbeat)
+            else:
+                raise ValueError(f"Unknown task kind: {task.kind}")
+        except TaskDeferred as e:
+            db.rollback()
+            print(f"⏳ Task {task.id} ({task.kind}) deferred: {e}")
+            defer_task(db, task, WORKER_ID, str(e))
+            return
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Task {task.id} ({task.kind}) failed: {e}")
+            fail_task(db, task, WORKER_ID, str(e))
+            return
+
+        # Scan results and the task's completion are committed together, or not at all
+        if not complete_task(db, task, WORKER_ID):
+            return
+
+    finish_job_if_done(db, task.job_id)
+
+
+def run_worker(kinds=None, once=False):
+    print(f"👷 Worker {WORKER_ID} started" + (f" for {', '.join(kinds)}" if kinds else ""))
+    while True:
+        db = SessionLocal()
+        try:
+            task = claim_task(db, WORKER_ID, kinds)
+            if task:
+                process_task(db, task)
+        except Exception as e:
+            print(f"❌ Worker loop error: {e}")
+            db.rollback()
+            task = None
+        finally:
+            db.close()
+
+        if once and not task:
+            return
+        if not task:
+            time.sleep(WORKER_POLL_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage Optimizer archive worker")
+    parser.add_argument("--kinds", default=None, help="Comma separated task kinds to process (default: all)")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(",")] if args.kinds else None
+    run_worker(kinds, once=args.once)
+
+
+if __name__ == "__main__":
+    main()